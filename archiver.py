@@ -0,0 +1,224 @@
+import os
+import time
+import sqlite3
+import logging
+import argparse
+from datetime import datetime, timedelta
+from config import Config
+from time_utils import to_epoch
+
+# 可归档的表 -> 整数时间戳列
+ARCHIVE_TABLES = {
+    'inventory_history': 'operation_ts',
+    'audit_log': 'log_ts',
+}
+
+logger = logging.getLogger('archiver')
+
+
+def archive_source(conn, table, start_ts=None, end_ts=None):
+    """
+    获取查询所需的数据源：热库中的表，以及时间范围内涉及的归档库（按需附加到当前连接）
+    :param conn: 数据库连接
+    :param table: 表名（见 ARCHIVE_TABLES）
+    :param start_ts: 查询范围开始时间戳，None表示不限
+    :param end_ts: 查询范围结束时间戳，None表示不限
+    :return: 可直接用于 FROM 子句的表名或 UNION ALL 子查询
+    """
+    try:
+        rows = conn.execute('''
+        SELECT year, path FROM archive_catalog
+        WHERE table_name = ? AND (? IS NULL OR max_ts >= ?) AND (? IS NULL OR min_ts <= ?)
+        ORDER BY year
+        ''', (table, start_ts, start_ts, end_ts, end_ts)).fetchall()
+    except sqlite3.OperationalError:
+        # 尚未归档过
+        return table
+    if not rows:
+        return table
+
+    columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+    parts = [f"SELECT {', '.join(columns)} FROM main.{table}"]
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    for year, path in rows:
+        alias = f"archive_{year}"
+        if alias not in attached:
+            try:
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+            except sqlite3.Error as e:
+                logger.error(f"附加归档库失败 {path}: {e}")
+                continue
+        # 归档库可能是旧结构，缺少的列以NULL补齐
+        archived = {row[1] for row in conn.execute(f"PRAGMA {alias}.table_info({table})")}
+        select = ", ".join(col if col in archived else f"NULL AS {col}" for col in columns)
+        parts.append(f"SELECT {select} FROM {alias}.{table}")
+    return f"({' UNION ALL '.join(parts)})"
+
+
+class Archiver:
+    def __init__(self, db_path='inventory.db', archive_dir=None, batch_size=None):
+        """
+        冷数据归档：将早于截止时间的库存历史和审计日志分批移动到按年份划分的归档库
+        每批单独提交，不会长时间占用写锁
+        :param db_path: 数据库文件路径
+        :param archive_dir: 归档库目录，默认 Config.ARCHIVE_DIR
+        :param batch_size: 每批移动的记录数，默认 Config.ARCHIVE_BATCH_SIZE
+        """
+        from inventory_manager import InventoryManager
+
+        self.db_path = db_path
+        self.archive_dir = os.path.abspath(archive_dir or Config.ARCHIVE_DIR)
+        self.batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+        self.logger = logger
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        # 确保表结构已升级到最新
+        self.manager = InventoryManager(db_path)
+        self.conn = self.manager.conn
+        self.cursor = self.conn.cursor()
+        self._create_catalog()
+
+    def _create_catalog(self):
+        """归档目录表：记录每个归档库中各表的时间范围和记录数"""
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_catalog (
+            table_name TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            min_ts INTEGER,
+            max_ts INTEGER,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, year)
+        )
+        ''')
+        self.conn.commit()
+
+    def archive_path(self, year):
+        return os.path.join(self.archive_dir, f"inventory_archive_{year}.db")
+
+    def _attach(self, year, table):
+        """附加归档库，并按热库表结构创建归档表（已存在时补齐新增的列）"""
+        alias = f"archive_{year}"
+        attached = {row[1] for row in self.cursor.execute("PRAGMA database_list")}
+        if alias not in attached:
+            self.cursor.execute(f"ATTACH DATABASE ? AS {alias}", (self.archive_path(year),))
+
+        ts_column = ARCHIVE_TABLES[table]
+        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {alias}.{table} AS SELECT * FROM main.{table} WHERE 0")
+        existing = {row[1] for row in self.cursor.execute(f"PRAGMA {alias}.table_info({table})")}
+        for row in self.cursor.execute(f"PRAGMA main.table_info({table})").fetchall():
+            if row[1] not in existing:
+                self.cursor.execute(f"ALTER TABLE {alias}.{table} ADD COLUMN {row[1]} {row[2]}")
+        self.cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {alias}.idx_{table}_id ON {table}(id)")
+        self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_{table}_ts ON {table}({ts_column})")
+        self.conn.commit()
+        return alias
+
+    def archive_table(self, table, before, progress_callback=None):
+        """
+        归档指定表中早于截止时间的记录
+        :param table: 表名（见 ARCHIVE_TABLES）
+        :param before: 截止时间（datetime / date / 字符串 / 时间戳），早于该时间的记录被归档
+        :param progress_callback: 进度回调函数，参数为已归档记录数
+        :return: 归档的记录数
+        """
+        ts_column = ARCHIVE_TABLES[table]
+        cutoff = to_epoch(before)
+        year_expr = f"CAST(strftime('%Y', {ts_column}, 'unixepoch', 'localtime') AS INTEGER)"
+        columns = ", ".join(row[1] for row in self.cursor.execute(f"PRAGMA main.table_info({table})"))
+        moved = 0
+
+        while True:
+            self.cursor.execute(f'''
+            SELECT MIN(id), MAX(id) FROM (
+                SELECT id FROM main.{table} WHERE {ts_column} < ? ORDER BY id LIMIT ?
+            )
+            ''', (cutoff, self.batch_size))
+            low, high = self.cursor.fetchone()
+            if low is None:
+                break
+            batch_filter = f"id BETWEEN ? AND ? AND {ts_column} < ?"
+            params = (low, high, cutoff)
+
+            # 附加数据库不能在事务中进行，先附加本批涉及的所有年份
+            self.cursor.execute(f"SELECT DISTINCT {year_expr} FROM main.{table} WHERE {batch_filter}", params)
+            years = [row[0] for row in self.cursor.fetchall()]
+            aliases = {year: self._attach(year, table) for year in years}
+
+            try:
+                for year, alias in aliases.items():
+                    self.cursor.execute(f'''
+                    INSERT INTO {alias}.{table} ({columns})
+                    SELECT {columns} FROM main.{table} WHERE {batch_filter} AND {year_expr} = ?
+                    ''', params + (year,))
+                    self.cursor.execute(f'''
+                    INSERT INTO archive_catalog (table_name, year, path, min_ts, max_ts, row_count)
+                    SELECT ?, ?, ?, MIN({ts_column}), MAX({ts_column}), COUNT(*)
+                    FROM main.{table} WHERE {batch_filter} AND {year_expr} = ?
+                    ON CONFLICT (table_name, year) DO UPDATE SET
+                        path = excluded.path,
+                        min_ts = MIN(COALESCE(min_ts, excluded.min_ts), excluded.min_ts),
+                        max_ts = MAX(COALESCE(max_ts, excluded.max_ts), excluded.max_ts),
+                        row_count = row_count + excluded.row_count
+                    ''', (table, year, self.archive_path(year)) + params + (year,))
+                self.cursor.execute(f"DELETE FROM main.{table} WHERE {batch_filter}", params)
+                moved += self.cursor.rowcount
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+            if progress_callback:
+                progress_callback(moved)
+        return moved
+
+    def archive(self, before=None):
+        """
+        归档库存历史和审计日志
+        归档库存历史前先记录截止时间点的库存快照，之后的库存查询无需读取归档数据
+        :param before: 截止时间，默认保留最近 Config.ARCHIVE_KEEP_DAYS 天
+        :return: {表名: 归档的记录数}
+        """
+        before = before or (datetime.now() - timedelta(days=Config.ARCHIVE_KEEP_DAYS)).date()
+        cutoff = to_epoch(before)
+        started = time.perf_counter()
+
+        snapshot_id = self.manager.take_stock_snapshot('archive', as_of=cutoff - 1)
+        if snapshot_id is None:
+            raise RuntimeError("记录归档库存快照失败")
+
+        result = {table: self.archive_table(table, cutoff) for table in ARCHIVE_TABLES}
+        elapsed = time.perf_counter() - started
+        self.logger.info(f"归档完成（截止 {before}）: {result}，耗时 {elapsed:.1f} 秒")
+        self.manager.audit_logger.log_action(
+            Config.SCHEDULER_OPERATOR_ID, "归档历史数据",
+            details=f"截止: {before}, 库存历史: {result['inventory_history']}, "
+                    f"审计日志: {result['audit_log']}, 快照ID: {snapshot_id}",
+            ip_address="N/A")
+        return result
+
+    def close(self):
+        self.manager.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档旧的库存历史和审计日志")
+    parser.add_argument('--db', default='inventory.db', help="数据库文件路径")
+    parser.add_argument('--before', help="截止日期（YYYY-MM-DD），默认保留最近 Config.ARCHIVE_KEEP_DAYS 天")
+    parser.add_argument('--archive-dir', help="归档库目录")
+    parser.add_argument('--batch-size', type=int, help="每批移动的记录数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    with Archiver(args.db, args.archive_dir, args.batch_size) as archiver:
+        print(archiver.archive(args.before))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,38 @@
-import sqlite3
 import logging
 from datetime import datetime, timedelta
+from time_utils import now_epoch, to_epoch
+from archiver import archive_source
+from config import Config
+from sql_trace import connect
+from write_coordinator import get_coordinator
+from db_retry import run_with_retry
+from metrics import observe, AUDIT_WRITES, AUDIT_WRITE_SECONDS, SEARCH_SECONDS
+
+# 已完成表结构检查的数据库（每个进程只检查一次）
+_schema_ready = set()
 
 class AuditLogger:
-    def __init__(self, db_path='inventory.db'):
+    def __init__(self, db_path='inventory.db', read_only=False, conn=None):
         """
         初始化审计日志记录器
         :param db_path: 数据库文件路径
+        :param read_only: 是否以只读方式打开数据库（用于导出等后台任务）
+        :param conn: 使用已有的数据库连接（写入协调器内部使用）
         """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self.read_only = read_only
+        self.owns_conn = conn is None
+        self.conn = conn or connect(db_path, read_only)
         self.cursor = self.conn.cursor()
         self.logger = logging.getLogger('audit_logger')
+        self._coordinator = None
+        if Config.WRITE_COORDINATOR_ENABLED and not read_only and conn is None:
+            self._coordinator = get_coordinator(db_path)
         
         # 创建审计日志表（如果不存在）
-        self._create_table()
+        if not read_only and db_path not in _schema_ready:
+            self._create_table()
+            _schema_ready.add(db_path)
     
     def _create_table(self):
         """创建审计日志表"""
@@ -30,10 +48,32 @@ class AuditLogger:
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
             ''')
+            
+            # 整数时间戳列（UTC秒），timestamp 列由 CURRENT_TIMESTAMP 写入，本身就是UTC
+            self.cursor.execute("PRAGMA table_info(audit_log)")
+            if 'log_ts' not in [row[1] for row in self.cursor.fetchall()]:
+                self.cursor.execute("ALTER TABLE audit_log ADD COLUMN log_ts INTEGER")
+                self.cursor.execute('''
+                UPDATE audit_log SET log_ts = CAST(strftime('%s', timestamp) AS INTEGER)
+                WHERE log_ts IS NULL
+                ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_ts ON audit_log(log_ts)")
+            # 旧版本程序写入的记录没有整数时间戳，插入后按 timestamp 补齐，避免被范围查询漏掉
+            self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_audit_log_fill_ts
+            AFTER INSERT ON audit_log
+            WHEN NEW.log_ts IS NULL
+            BEGIN
+                UPDATE audit_log SET log_ts = CAST(strftime('%s', NEW.timestamp) AS INTEGER)
+                WHERE id = NEW.id;
+            END
+            ''')
             self.conn.commit()
         except Exception as e:
             self.logger.error(f"创建审计日志表失败: {e}")
+            self.conn.rollback()
     
+    @observe(AUDIT_WRITE_SECONDS, AUDIT_WRITES)
     def log_action(self, user_id, action, details=None, ip_address=None):
         """
         记录审计日志
@@ -43,26 +83,41 @@ class AuditLogger:
         :param ip_address: 操作IP地址
         :return: 日志记录ID，失败返回None
         """
-        try:
+        if self._coordinator:
+            try:
+                return self._coordinator.log_action(user_id, action, details, ip_address).result()
+            except Exception as e:
+                self.logger.error(f"记录审计日志失败: {e}")
+                return None
+        
+        def apply():
             self.cursor.execute('''
-            INSERT INTO audit_log (user_id, action, details, ip_address)
-            VALUES (?, ?, ?, ?)
-            ''', (user_id, action, details, ip_address))
+            INSERT INTO audit_log (user_id, action, details, ip_address, log_ts)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, action, details, ip_address, now_epoch()))
+            log_id = self.cursor.lastrowid
             self.conn.commit()
-            return self.cursor.lastrowid
+            return log_id
+        
+        try:
+            return run_with_retry(apply, self.conn, 'audit_logger')
         except Exception as e:
             self.logger.error(f"记录审计日志失败: {e}")
             return None
     
-    def get_audit_logs(self, user_id=None, action=None, start_date=None, end_date=None, 
-                      limit=100, offset=0):
+    def _build_log_query(self, user_id=None, action=None, start_date=None, end_date=None):
         """
-        获取审计日志
-        :return: 日志记录列表
+        构建审计日志查询语句
+        :param start_date: 开始时间（datetime / date / 本地时间字符串），按整数时间戳比较
+        :param end_date: 结束时间，只有日期时包含当天
+        :return: (查询语句, 参数列表)
         """
-        query = '''
+        # 查询范围涉及已归档的记录时，自动合并对应年份的归档库
+        source = archive_source(self.conn, 'audit_log',
+                                to_epoch(start_date), to_epoch(end_date, end_of_day=True))
+        query = f'''
         SELECT a.*, u.username 
-        FROM audit_log a
+        FROM {source} a
         JOIN users u ON a.user_id = u.id
         WHERE 1=1
         '''
@@ -77,18 +132,27 @@ class AuditLogger:
             params.append(f"%{action}%")
         
         if start_date:
-            query += " AND a.timestamp >= ?"
-            params.append(start_date)
+            query += " AND a.log_ts >= ?"
+            params.append(to_epoch(start_date))
         
         if end_date:
-            query += " AND a.timestamp <= ?"
-            params.append(end_date)
-        
-        query += " ORDER BY a.timestamp DESC"
-        query += " LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+            query += " AND a.log_ts <= ?"
+            params.append(to_epoch(end_date, end_of_day=True))
         
+        query += " ORDER BY a.log_ts DESC, a.id DESC"
+        return query, params
+    
+    @observe(SEARCH_SECONDS, kind='audit')
+    def get_audit_logs(self, user_id=None, action=None, start_date=None, end_date=None, 
+                      limit=100, offset=0):
+        """
+        获取审计日志
+        :return: 日志记录列表
+        """
         try:
+            query, params = self._build_log_query(user_id, action, start_date, end_date)
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
             self.cursor.execute(query, params)
             logs = self.cursor.fetchall()
             
@@ -100,28 +164,70 @@ class AuditLogger:
             self.logger.error(f"获取审计日志失败: {e}")
             return []
     
-    def clear_old_logs(self, days=365):
+    def count_audit_logs(self, user_id=None, action=None, start_date=None, end_date=None):
+        """
+        统计匹配的审计日志数量
+        :return: 日志数量，失败返回0
+        """
+        try:
+            query, params = self._build_log_query(user_id, action, start_date, end_date)
+            self.cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+            return self.cursor.fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"统计审计日志失败: {e}")
+            return 0
+    
+    def iter_audit_logs(self, user_id=None, action=None, start_date=None, end_date=None,
+                        chunk_size=1000):
         """
-        清理旧的审计日志
+        分批读取全部匹配的审计日志，内存占用与记录总数无关
+        :param chunk_size: 每次从数据库读取的记录数
+        :return: 逐条产出日志字典的生成器
+        """
+        query, params = self._build_log_query(user_id, action, start_date, end_date)
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            columns = [col[0] for col in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+    
+    def clear_old_logs(self, days=365, batch_size=None):
+        """
+        清理旧的审计日志（分批删除，批次之间释放写锁；需要保留历史时使用 archiver.py 归档）
         :param days: 保留天数，默认365天
+        :param batch_size: 每批删除的记录数，默认 Config.ARCHIVE_BATCH_SIZE
         :return: 删除的记录数
         """
+        batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+        deleted_count = 0
         try:
-            cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-            self.cursor.execute('''
-            DELETE FROM audit_log 
-            WHERE timestamp < ?
-            ''', (cutoff_date,))
-            deleted_count = self.cursor.rowcount
-            self.conn.commit()
+            cutoff = to_epoch((datetime.now() - timedelta(days=days)).date())
+            while True:
+                self.cursor.execute('''
+                DELETE FROM audit_log 
+                WHERE id IN (SELECT id FROM audit_log WHERE log_ts < ? LIMIT ?)
+                ''', (cutoff, batch_size))
+                self.conn.commit()
+                deleted_count += self.cursor.rowcount
+                if self.cursor.rowcount < batch_size:
+                    break
             return deleted_count
         except Exception as e:
             self.logger.error(f"清理审计日志失败: {e}")
-            return 0
+            self.conn.rollback()
+            return deleted_count
     
     def close(self):
-        """关闭数据库连接"""
-        self.conn.close()
+        """关闭数据库连接（共用的连接由创建者关闭）"""
+        if self.owns_conn:
+            self.conn.close()
     
     def __enter__(self):
         return self
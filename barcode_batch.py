@@ -0,0 +1,172 @@
+import os
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from pyzbar.pyzbar import decode
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+# 超过此尺寸的照片先缩小再识别（像素，长边）
+MAX_IMAGE_SIDE = 2000
+
+# 预处理重试时使用的缩放比例和旋转角度
+SCALES = (0.5, 2.0)
+ROTATIONS = (90, 45, -45)
+
+
+def _image_variants(image):
+    """
+    依次产生预处理后的图像：原图、灰度、增强对比度、缩放金字塔、旋转
+    越靠前的处理越便宜，识别成功后即可停止
+    """
+    yield image
+    gray = ImageOps.grayscale(image)
+    yield gray
+    contrast = ImageOps.autocontrast(gray, cutoff=2)
+    yield contrast
+    for scale in SCALES:
+        size = (int(contrast.width * scale), int(contrast.height * scale))
+        if min(size) >= 50 and max(size) <= MAX_IMAGE_SIDE * 2:
+            yield contrast.resize(size, Image.LANCZOS)
+    for angle in ROTATIONS:
+        yield contrast.rotate(angle, expand=True, fillcolor=255)
+
+
+def decode_image_file(image_path, exhaustive=False):
+    """
+    识别图片文件中的所有条形码，识别失败时依次尝试各种预处理
+    :param image_path: 图片文件路径
+    :param exhaustive: 是否尝试全部预处理并合并结果（默认识别成功即停止）
+    :return: 字典，包含 path、codes（条形码列表）、attempts（尝试次数）、elapsed（秒）、error
+    """
+    started = time.perf_counter()
+    result = {'path': image_path, 'codes': [], 'attempts': 0, 'elapsed': 0.0, 'error': None}
+    try:
+        with Image.open(image_path) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+        if max(image.size) > MAX_IMAGE_SIDE:
+            image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+
+        codes = {}
+        for variant in _image_variants(image):
+            result['attempts'] += 1
+            for obj in decode(variant):
+                codes.setdefault(obj.data.decode('utf-8'), obj.type)
+            if codes and not exhaustive:
+                break
+        result['codes'] = list(codes)
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+
+def find_images(directory, recursive=False):
+    """
+    查找目录中的图片文件
+    :param directory: 目录路径
+    :param recursive: 是否包含子目录
+    :return: 按文件名排序的图片路径列表
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files
+                     if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def decode_directory(directory, workers=None, recursive=False, exhaustive=False, progress_callback=None):
+    """
+    使用进程池并行识别目录中所有图片的条形码
+    :param directory: 图片目录
+    :param workers: 进程数，默认为CPU核心数
+    :param recursive: 是否包含子目录
+    :param exhaustive: 是否尝试全部预处理
+    :param progress_callback: 进度回调函数，参数为 (已完成数, 总数)
+    :return: 每张图片的识别结果列表（顺序与文件名顺序一致）
+    """
+    paths = find_images(directory, recursive)
+    if not paths:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * 8))
+    results = []
+    if workers == 1:
+        mapped = (decode_image_file(path, exhaustive) for path in paths)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        mapped = executor.map(decode_image_file, paths, [exhaustive] * len(paths), chunksize=chunksize)
+    try:
+        for result in mapped:
+            results.append(result)
+            if progress_callback:
+                progress_callback(len(results), len(paths))
+    finally:
+        if workers != 1:
+            executor.shutdown()
+    return results
+
+
+def match_products(results, db_path='inventory.db'):
+    """
+    将识别结果与商品条形码匹配（一次批量查询）
+    :param results: decode_directory 的返回值
+    :param db_path: 数据库文件路径
+    :return: {条形码: 商品信息字典}
+    """
+    from inventory_manager import InventoryManager
+
+    codes = [code for result in results for code in result['codes']]
+    with InventoryManager(db_path, read_only=True) as manager:
+        return manager.get_products_by_barcodes(codes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量识别图片中的条形码")
+    parser.add_argument('directory', help="图片目录")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="并行进程数（默认CPU核心数）")
+    parser.add_argument('-r', '--recursive', action='store_true', help="包含子目录")
+    parser.add_argument('--exhaustive', action='store_true', help="尝试全部预处理并合并结果")
+    parser.add_argument('--match', action='store_true', help="与商品库中的条形码匹配")
+    parser.add_argument('--db', default='inventory.db', help="数据库文件路径")
+    parser.add_argument('-o', '--output', help="将结果保存为 CSV 或 JSONL 文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    results = decode_directory(args.directory, args.workers, args.recursive, args.exhaustive)
+    elapsed = time.perf_counter() - started
+    products = match_products(results, args.db) if args.match else {}
+
+    rows = []
+    for result in results:
+        names = [products[code]['name'] for code in result['codes'] if code in products]
+        rows.append({
+            'path': result['path'],
+            'codes': ";".join(result['codes']),
+            'products': ";".join(names),
+            'attempts': result['attempts'],
+            'error': result['error'] or "",
+        })
+        status = result['error'] or (", ".join(result['codes']) or "未识别到条形码")
+        print(f"{result['path']}: {status}" + (f" -> {', '.join(names)}" if names else ""))
+
+    if args.output:
+        from exporters import write_rows
+        fmt = 'jsonl' if args.output.endswith('.jsonl') else 'csv'
+        write_rows(rows, args.output, fmt)
+
+    decoded = sum(1 for result in results if result['codes'])
+    rate = len(results) / elapsed if elapsed else 0
+    print(f"共 {len(results)} 张图片，识别成功 {decoded} 张，耗时 {elapsed:.1f} 秒（{rate:.1f} 张/秒）")
+    if args.match:
+        print(f"匹配到商品 {len(products)} 种")
+
+
+if __name__ == "__main__":
+    main()
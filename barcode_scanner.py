@@ -1,7 +1,260 @@
 import cv2
+import time
+import queue
+import threading
+from collections import Counter, deque, namedtuple
 from pyzbar.pyzbar import decode
 from PIL import Image
 import numpy as np
+from config import Config
+from barcode_batch import decode_image_file
+
+# 识别结果：条形码内容和在原始画面中的轮廓坐标
+DecodedBarcode = namedtuple('DecodedBarcode', ['data', 'polygon'])
+
+
+class ScanStats:
+    def __init__(self, window=100):
+        """
+        扫描流水线统计信息
+        :param window: 计算帧率和延迟时保留的最近样本数
+        """
+        self.started_at = time.perf_counter()
+        self.frames_captured = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.first_read_at = None
+        self._capture_times = deque(maxlen=window)
+        self._decode_latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def on_capture(self):
+        with self._lock:
+            self.frames_captured += 1
+            self._capture_times.append(time.perf_counter())
+
+    def on_drop(self):
+        with self._lock:
+            self.frames_dropped += 1
+
+    def on_decode(self, latency, found):
+        with self._lock:
+            self.frames_decoded += 1
+            self._decode_latencies.append(latency)
+            if found and self.first_read_at is None:
+                self.first_read_at = time.perf_counter()
+
+    def snapshot(self):
+        """
+        获取当前统计数据
+        :return: 字典，包含采集帧率、解码延迟（毫秒）和首次识别耗时（秒）
+        """
+        with self._lock:
+            times = list(self._capture_times)
+            latencies = sorted(self._decode_latencies)
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        return {
+            'capture_fps': round(fps, 1),
+            'frames_captured': self.frames_captured,
+            'frames_decoded': self.frames_decoded,
+            'frames_dropped': self.frames_dropped,
+            'decode_ms_avg': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            'decode_ms_p95': round(latencies[int((len(latencies) - 1) * 0.95)] * 1000, 1) if latencies else None,
+            'time_to_first_read': round(self.first_read_at - self.started_at, 3) if self.first_read_at else None,
+        }
+
+
+def decode_frame(gray, roi=None, max_width=None):
+    """
+    在灰度画面中识别条形码：先搜索中心区域，再搜索缩小后的整幅画面，最后搜索原始分辨率
+    :param gray: 灰度图像
+    :param roi: 中心搜索区域占画面的比例 (宽, 高)，None表示不使用
+    :param max_width: 整幅画面缩小后的最大宽度，None表示不缩小
+    :return: DecodedBarcode 列表（坐标为原始画面坐标）
+    """
+    height, width = gray.shape[:2]
+
+    # 1. 中心区域：条码通常位于画面中央，区域小、速度快
+    if roi:
+        roi_w, roi_h = int(width * roi[0]), int(height * roi[1])
+        x0, y0 = (width - roi_w) // 2, (height - roi_h) // 2
+        objs = decode(gray[y0:y0 + roi_h, x0:x0 + roi_w])
+        if objs:
+            return [DecodedBarcode(obj.data.decode('utf-8'),
+                                   [(p.x + x0, p.y + y0) for p in obj.polygon]) for obj in objs]
+
+    # 2. 缩小后的整幅画面
+    if max_width and width > max_width:
+        scale = max_width / width
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        objs = decode(small)
+        if objs:
+            return [DecodedBarcode(obj.data.decode('utf-8'),
+                                   [(p.x / scale, p.y / scale) for p in obj.polygon]) for obj in objs]
+
+    # 3. 原始分辨率
+    return [DecodedBarcode(obj.data.decode('utf-8'), [(p.x, p.y) for p in obj.polygon])
+            for obj in decode(gray)]
+
+
+class ScanPipeline:
+    def __init__(self, camera, queue_size=2, roi=None, max_width=None):
+        """
+        摄像头扫描流水线：采集线程只负责读帧，解码线程只处理最新的一帧，
+        解码速度不再限制画面帧率，过期的帧直接丢弃
+        :param camera: cv2.VideoCapture 对象
+        :param queue_size: 待解码帧队列长度
+        :param roi: 中心搜索区域比例，默认 Config.SCANNER_ROI
+        :param max_width: 解码前缩小画面的最大宽度，默认 Config.SCANNER_DECODE_WIDTH
+        """
+        self.camera = camera
+        self.roi = roi or Config.SCANNER_ROI
+        self.max_width = max_width or Config.SCANNER_DECODE_WIDTH
+        self.stats = ScanStats()
+        self.results = queue.Queue()
+        self.latest_frame = None
+        self.latest_barcodes = []
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="scan-capture", daemon=True),
+            threading.Thread(target=self._decode_loop, name="scan-decode", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            ret, frame = self.camera.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            self.stats.on_capture()
+            self.latest_frame = frame
+
+            # 队列已满时丢弃最旧的帧，保证解码的总是最新画面
+            try:
+                self._frames.put_nowait(frame)
+            except queue.Full:
+                try:
+                    self._frames.get_nowait()
+                    self.stats.on_drop()
+                except queue.Empty:
+                    pass
+                try:
+                    self._frames.put_nowait(frame)
+                except queue.Full:
+                    self.stats.on_drop()
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            try:
+                frame = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            started = time.perf_counter()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            barcodes = decode_frame(gray, self.roi, self.max_width)
+            self.stats.on_decode(time.perf_counter() - started, bool(barcodes))
+
+            self.latest_barcodes = barcodes
+            if barcodes:
+                self.results.put((time.time(), barcodes))
+
+
+def draw_barcodes(frame, barcodes):
+    """在画面上绘制识别到的条形码边框和内容"""
+    for barcode in barcodes:
+        points = barcode.polygon
+        if len(points) > 4:
+            hull = cv2.convexHull(np.array(points, dtype=np.float32))
+            hull = list(map(tuple, np.squeeze(hull)))
+        else:
+            hull = points
+        
+        # 绘制条形码边界
+        n = len(hull)
+        for j in range(0, n):
+            # 将点坐标转换为整数类型
+            p1 = (int(hull[j][0]), int(hull[j][1]))
+            p2 = (int(hull[(j + 1) % n][0]), int(hull[(j + 1) % n][1]))
+            cv2.line(frame, p1, p2, (0, 255, 0), 3)
+        
+        # 显示条形码数据
+        org = (int(hull[0][0]), int(hull[0][1] - 10))
+        cv2.putText(frame, barcode.data, org, 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+
+
+class ScanSession:
+    def __init__(self, dedup_seconds=None):
+        """
+        连续扫码会话：累计扫描到的条形码及数量
+        同一条码在上次计数后的去重时间窗口内被反复识别只计一次；
+        窗口从计数时开始计算，条码停留在画面中时每隔一个窗口累加一次
+        :param dedup_seconds: 去重时间窗口（秒），默认 Config.SCANNER_DEDUP_SECONDS
+        """
+        self.dedup_seconds = dedup_seconds if dedup_seconds is not None else Config.SCANNER_DEDUP_SECONDS
+        self.counts = Counter()
+        self.last_code = None
+        self._last_seen = {}
+
+    def add(self, codes, timestamp=None):
+        """
+        记录一次识别结果
+        :param codes: 本帧识别到的条形码列表
+        :param timestamp: 识别时间，默认当前时间
+        :return: 本次新计数的条形码列表
+        """
+        timestamp = timestamp or time.time()
+        accepted = []
+        for code in set(codes):
+            last_seen = self._last_seen.get(code)
+            if last_seen is not None and timestamp - last_seen < self.dedup_seconds:
+                continue
+            self._last_seen[code] = timestamp
+            self.counts[code] += 1
+            self.last_code = code
+            accepted.append(code)
+        return accepted
+
+    def undo_last(self):
+        """撤销最近一次计数"""
+        if self.last_code and self.counts[self.last_code] > 0:
+            self.counts[self.last_code] -= 1
+            if self.counts[self.last_code] == 0:
+                del self.counts[self.last_code]
+        self.last_code = None
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def resolve(self, barcode_index):
+        """
+        将条形码解析为商品
+        :param barcode_index: InventoryManager.get_barcode_index() 的返回值
+        :return: ({商品ID: 数量}, {未知条形码: 数量})
+        """
+        changes, unknown = Counter(), {}
+        for code, count in self.counts.items():
+            product = barcode_index.get(code)
+            if product:
+                changes[product['id']] += count
+            else:
+                unknown[code] = count
+        return dict(changes), unknown
+
 
 class BarcodeScanner:
     def __init__(self, camera_index=0):
@@ -13,79 +266,110 @@ class BarcodeScanner:
         self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
         self.scanning = False
+        self.last_stats = None
     
     def scan_barcode(self, timeout=30):
         """
         使用摄像头实时扫描条形码
+        采集和解码在后台线程中进行，本循环只负责显示画面和响应按键
         :param timeout: 超时时间（秒），默认30秒
         :return: 识别到的条形码字符串，超时返回None
         """
         self.scanning = True
         start_time = cv2.getTickCount()
+        pipeline = ScanPipeline(self.camera)
+        pipeline.start()
+        barcode = None
         
-        while self.scanning:
-            # 检查超时
-            elapsed_time = (cv2.getTickCount() - start_time) / cv2.getTickFrequency()
-            if elapsed_time > timeout:
-                break
-            
-            # 读取摄像头帧
-            ret, frame = self.camera.read()
-            if not ret:
-                continue
-            
-            # 转换为灰度图以提高识别效率
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # 解码条形码
-            decoded_objects = decode(gray)
-            
-            # 绘制识别结果
-            for obj in decoded_objects:
-                points = obj.polygon
-                if len(points) > 4:
-                    hull = cv2.convexHull(np.array([point for point in points], dtype=np.float32))
-                    hull = list(map(tuple, np.squeeze(hull)))
-                else:
-                    hull = points
+        try:
+            while self.scanning:
+                # 检查超时
+                elapsed_time = (cv2.getTickCount() - start_time) / cv2.getTickFrequency()
+                if elapsed_time > timeout:
+                    break
                 
-                # 绘制条形码边界
-                n = len(hull)
-                for j in range(0, n):
-                    # 将点坐标转换为整数类型
-                    p1 = (int(hull[j][0]), int(hull[j][1]))
-                    p2 = (int(hull[(j + 1) % n][0]), int(hull[(j + 1) % n][1]))
-                    cv2.line(frame, p1, p2, (0, 255, 0), 3)
+                # 如果检测到条形码，返回结果
+                try:
+                    _, barcodes = pipeline.results.get_nowait()
+                    barcode = barcodes[0].data
+                    break
+                except queue.Empty:
+                    pass
                 
-                # 显示条形码数据
-                barcode = obj.data.decode('utf-8')
-                # 将坐标转换为整数类型
-                org = (int(hull[0][0]), int(hull[0][1] - 10))
-                cv2.putText(frame, barcode, org, 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            
-            # 显示摄像头画面
-            cv2.imshow('Barcode Scanner - Press ESC to exit', frame)
-            
-            # 检测按键
-            key = cv2.waitKey(1) & 0xFF
-            if key == 27:  # ESC键
-                break
-            elif key == 32:  # 空格键暂停/继续
-                self.scanning = not self.scanning
-                if self.scanning:
-                    start_time = cv2.getTickCount()
-            
-            # 如果检测到条形码，返回结果
-            if decoded_objects:
-                barcode = decoded_objects[0].data.decode('utf-8')
-                self.release_camera()
-                cv2.destroyAllWindows()
-                return barcode
+                frame = pipeline.latest_frame
+                if frame is None:
+                    cv2.waitKey(10)
+                    continue
+                
+                # 绘制最近一次的识别结果并显示摄像头画面
+                frame = frame.copy()
+                draw_barcodes(frame, pipeline.latest_barcodes)
+                cv2.imshow('Barcode Scanner - Press ESC to exit', frame)
+                
+                # 检测按键
+                key = cv2.waitKey(1) & 0xFF
+                if key == 27:  # ESC键
+                    break
+                elif key == 32:  # 空格键暂停/继续
+                    self.scanning = not self.scanning
+                    if self.scanning:
+                        start_time = cv2.getTickCount()
+        finally:
+            pipeline.stop()
+            self.last_stats = pipeline.stats.snapshot()
+        
+        self.release_camera()
+        cv2.destroyAllWindows()
+        return barcode
+    
+    def scan_session(self, dedup_seconds=None, on_scan=None):
+        """
+        连续扫码模式：摄像头保持打开，累计扫描到的所有条形码，按ESC结束，退格键撤销上一次计数
+        :param dedup_seconds: 去重时间窗口（秒）
+        :param on_scan: 每次新计数时的回调函数，参数为 (条形码, 当前会话)
+        :return: ScanSession 对象
+        """
+        session = ScanSession(dedup_seconds)
+        pipeline = ScanPipeline(self.camera)
+        pipeline.start()
+        
+        try:
+            while True:
+                # 处理所有新的识别结果
+                while True:
+                    try:
+                        timestamp, barcodes = pipeline.results.get_nowait()
+                    except queue.Empty:
+                        break
+                    for code in session.add([barcode.data for barcode in barcodes], timestamp):
+                        if on_scan:
+                            on_scan(code, session)
+                
+                frame = pipeline.latest_frame
+                if frame is None:
+                    cv2.waitKey(10)
+                    continue
+                
+                frame = frame.copy()
+                draw_barcodes(frame, pipeline.latest_barcodes)
+                status = f"Total: {session.total()}  Codes: {len(session.counts)}"
+                if session.last_code:
+                    status += f"  Last: {session.last_code} x{session.counts[session.last_code]}"
+                cv2.putText(frame, status, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                cv2.imshow('Receiving - ESC to finish, Backspace to undo', frame)
+                
+                key = cv2.waitKey(1) & 0xFF
+                if key == 27:  # ESC键结束
+                    break
+                elif key == 8:  # 退格键撤销
+                    session.undo_last()
+        finally:
+            pipeline.stop()
+            self.last_stats = pipeline.stats.snapshot()
         
         self.release_camera()
         cv2.destroyAllWindows()
-        return None
+        return session
     
     def read_barcode_from_image(self, image_path):
         """
@@ -104,6 +388,14 @@ class BarcodeScanner:
             print(f"Error reading barcode from image: {e}")
             return None
     
+    def read_barcodes_from_image(self, image_path):
+        """
+        从图像文件中读取所有条形码（识别失败时自动尝试灰度、对比度、缩放、旋转等预处理）
+        :param image_path: 图像文件路径
+        :return: 识别到的条形码列表
+        """
+        return decode_image_file(image_path)['codes']
+    
     def release_camera(self):
         """释放摄像头资源"""
         if self.camera.isOpened():
@@ -120,7 +412,8 @@ if __name__ == "__main__":
     print("选择扫描模式:")
     print("1. 摄像头扫描")
     print("2. 图片文件扫描")
-    choice = input("请输入选项 (1/2): ")
+    print("3. 连续扫码")
+    choice = input("请输入选项 (1/2/3): ")
     
     if choice == '1':
         print("请将条形码对准摄像头...")
@@ -129,6 +422,7 @@ if __name__ == "__main__":
             print(f"识别到的条形码: {barcode}")
         else:
             print("未识别到条形码")
+        print(f"扫描统计: {scanner.last_stats}")
     elif choice == '2':
         file_path = input("请输入图片文件路径: ")
         barcode = scanner.read_barcode_from_image(file_path)
@@ -136,5 +430,8 @@ if __name__ == "__main__":
             print(f"识别到的条形码: {barcode}")
         else:
             print("未识别到条形码")
+    elif choice == '3':
+        session = scanner.scan_session(on_scan=lambda code, session: print(f"{code} x{session.counts[code]}"))
+        print(f"共扫描 {session.total()} 件: {dict(session.counts)}")
     else:
         print("无效选项")
\ No newline at end of file
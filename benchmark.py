@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import logging
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from sample_data import generate_database, copy_database
+
+# 测试规模：商品数量和库存历史记录数量
+SCALES = {
+    'small': {'products': 1000, 'history': 20000},
+    'medium': {'products': 10000, 'history': 200000},
+    'large': {'products': 50000, 'history': 1000000},
+}
+
+# 单项测试的最长耗时（秒），达到后不再重复
+TIME_BUDGET = 10
+
+
+class BenchmarkContext:
+    def __init__(self, db_path, output_dir, seed=42):
+        """
+        测试上下文：数据库、报表输出目录以及随机抽取的查询参数
+        :param db_path: 测试数据库路径（会被写入）
+        :param output_dir: 报表输出目录
+        :param seed: 随机种子
+        """
+        from inventory_manager import InventoryManager
+
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.rng = random.Random(seed)
+        self.manager = InventoryManager(db_path)
+        cursor = self.manager.conn.cursor()
+        self.product_ids = [row[0] for row in cursor.execute("SELECT id FROM products")]
+        self.barcodes = [row[0] for row in cursor.execute("SELECT barcode FROM products WHERE barcode IS NOT NULL")]
+        self.categories = self.manager.get_all_categories()
+        self.locations = self.manager.get_all_locations()
+        self.suppliers = [row[0] for row in cursor.execute("SELECT name FROM suppliers")]
+        self.name_terms = list({row[0][2:5] for row in cursor.execute("SELECT name FROM products LIMIT 500")})
+        self.recent_start = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        self.today = datetime.now().strftime('%Y-%m-%d')
+
+    def close(self):
+        self.manager.close()
+
+
+def _report_generator(ctx):
+    from report_generator import ReportGenerator
+    generator = ReportGenerator(ctx.output_dir, db_path=ctx.db_path, read_only=True)
+    generator.cache = None  # 测试生成耗时，不使用缓存
+    return generator
+
+
+def _in_out_trend(ctx):
+    ctx.manager.get_daily_movements(30)
+
+
+# 测试项：名称 -> (函数, 最多重复次数)
+BENCHMARKS = {
+    'search_products.name': (lambda ctx: ctx.manager.search_products(search_term=ctx.rng.choice(ctx.name_terms)), 20),
+    'search_products.category': (lambda ctx: ctx.manager.search_products(category=ctx.rng.choice(ctx.categories)), 20),
+    'search_products.location': (lambda ctx: ctx.manager.search_products(location=ctx.rng.choice(ctx.locations)), 20),
+    'search_products.supplier': (lambda ctx: ctx.manager.search_products(supplier=ctx.rng.choice(ctx.suppliers)[2:6]), 20),
+    'search_products.all': (lambda ctx: ctx.manager.search_products(), 5),
+    'get_product_by_barcode': (lambda ctx: ctx.manager.get_product_by_barcode(ctx.rng.choice(ctx.barcodes)), 200),
+    'get_all_categories': (lambda ctx: ctx.manager.get_all_categories(), 50),
+    'get_low_stock_products': (lambda ctx: ctx.manager.get_low_stock_products(), 10),
+    'update_stock': (lambda ctx: ctx.manager.update_stock(1, ctx.rng.choice(ctx.product_ids), 1, 'in', "benchmark"), 100),
+    'update_stock_batch.50': (lambda ctx: ctx.manager.update_stock_batch(
+        1, {pid: 1 for pid in ctx.rng.sample(ctx.product_ids, 50)}, 'in', "benchmark"), 20),
+    'get_inventory_history.30d': (lambda ctx: ctx.manager.get_inventory_history(
+        start_date=ctx.recent_start, end_date=ctx.today), 10),
+    'get_inventory_history.product': (lambda ctx: ctx.manager.get_inventory_history(
+        product_id=ctx.rng.choice(ctx.product_ids)), 50),
+    'count_inventory_history': (lambda ctx: ctx.manager.count_inventory_history(), 10),
+    'get_audit_logs.page': (lambda ctx: ctx.manager.audit_logger.get_audit_logs(limit=100), 50),
+    'get_audit_logs.30d': (lambda ctx: ctx.manager.audit_logger.get_audit_logs(
+        start_date=ctx.recent_start, end_date=ctx.today, limit=1000), 20),
+    'get_stock_as_of': (lambda ctx: ctx.manager.get_stock_as_of(
+        (datetime.now() - timedelta(days=ctx.rng.randint(1, 300))).date()), 10),
+    'chart.stock_levels': (lambda ctx: ctx.manager.get_top_stock_products(10), 20),
+    'chart.category_summary': (lambda ctx: ctx.manager.get_category_summary(), 20),
+    'chart.in_out_trend': (_in_out_trend, 20),
+    'report.inventory': (lambda ctx: _report_generator(ctx).generate_inventory_report(1), 3),
+    'report.transactions.30d': (lambda ctx: _report_generator(ctx).generate_transaction_report(
+        1, start_date=ctx.recent_start, end_date=ctx.today), 3),
+}
+
+
+def _summarize(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'min_ms': round(samples[0] * 1000, 3),
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def run_benchmark(ctx, func, repeat):
+    """
+    执行单项测试：先预热一次，再重复执行直到达到次数或时间上限
+    :return: 统计结果字典
+    """
+    func(ctx)
+    samples = []
+    deadline = time.perf_counter() + TIME_BUDGET
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        func(ctx)
+        samples.append(time.perf_counter() - started)
+    return _summarize(samples)
+
+
+def prepare_database(scale, cache_dir, seed=42):
+    """
+    准备指定规模的测试数据库：首次生成后缓存为模板，每次测试使用模板的副本
+    :return: 模板数据库路径
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    params = SCALES[scale]
+    template = os.path.join(cache_dir, f"{scale}_{params['products']}_{params['history']}_{seed}.db")
+    if not os.path.exists(template):
+        print(f"生成 {scale} 测试数据库: {params}")
+        generate_database(template, seed=seed, **params)
+    return template
+
+
+def run_suite(scales, cache_dir, only=None, seed=42):
+    """
+    在各个规模下执行全部测试
+    :param scales: 规模名称列表
+    :param cache_dir: 测试数据库模板缓存目录
+    :param only: 只执行名称以这些前缀开头的测试
+    :return: 测试结果字典
+    """
+    results = {'meta': _environment(), 'scales': {}}
+    for scale in scales:
+        template = prepare_database(scale, cache_dir, seed)
+        work_dir = tempfile.mkdtemp(prefix=f"benchmark_{scale}_")
+        try:
+            db_path = os.path.join(work_dir, 'inventory.db')
+            copy_database(template, db_path)
+            ctx = BenchmarkContext(db_path, os.path.join(work_dir, 'reports'), seed)
+            scale_results = {}
+            for name, (func, repeat) in BENCHMARKS.items():
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                try:
+                    scale_results[name] = run_benchmark(ctx, func, repeat)
+                except ImportError as e:
+                    # 报表等功能依赖可选的第三方库
+                    scale_results[name] = {'skipped': str(e)}
+                print(f"[{scale}] {name}: {_format_result(scale_results[name])}")
+            ctx.close()
+            results['scales'][scale] = {'params': SCALES[scale], 'results': scale_results}
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def _format_result(result):
+    if 'skipped' in result:
+        return f"跳过（{result['skipped']}）"
+    return f"中位数 {result['median_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, {result['runs']} 次"
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(baseline, current, threshold=10.0):
+    """
+    比较两次测试结果的中位数耗时
+    :param baseline: 基准结果
+    :param current: 本次结果
+    :param threshold: 变慢超过该百分比视为性能退化
+    :return: (比较结果行列表, 是否存在性能退化)
+    """
+    rows, regressed = [], False
+    for scale, data in current['scales'].items():
+        base_results = baseline['scales'].get(scale, {}).get('results', {})
+        for name, result in data['results'].items():
+            base = base_results.get(name)
+            if not base or 'median_ms' not in base or 'median_ms' not in result:
+                continue
+            change = (result['median_ms'] - base['median_ms']) / base['median_ms'] * 100 if base['median_ms'] else 0.0
+            status = "退化" if change > threshold else ("提升" if change < -threshold else "")
+            regressed = regressed or change > threshold
+            rows.append((scale, name, base['median_ms'], result['median_ms'], change, status))
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="库存管理性能基准测试")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="执行基准测试")
+    run_parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=list(SCALES))
+    run_parser.add_argument('--only', nargs='+', help="只执行名称以指定前缀开头的测试")
+    run_parser.add_argument('--output', '-o', help="结果文件（JSON），默认 benchmark_<时间>.json")
+    run_parser.add_argument('--cache-dir', default='.benchmark', help="测试数据库模板缓存目录")
+    run_parser.add_argument('--seed', type=int, default=42, help="随机种子")
+
+    compare_parser = subparsers.add_parser('compare', help="比较两次测试结果")
+    compare_parser.add_argument('baseline', help="基准结果文件")
+    compare_parser.add_argument('current', help="本次结果文件")
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="性能退化阈值（百分比）")
+    compare_parser.add_argument('--fail-on-regression', action='store_true', help="存在性能退化时返回非零退出码")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.command == 'run':
+        results = run_suite(args.scales, args.cache_dir, args.only, args.seed)
+        output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {output}")
+    else:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        rows, regressed = compare(baseline, current, args.threshold)
+        print(f"{'规模':<8}{'测试项':<34}{'基准(ms)':>12}{'本次(ms)':>12}{'变化':>10}")
+        for scale, name, base_ms, current_ms, change, status in rows:
+            print(f"{scale:<8}{name:<34}{base_ms:>12.2f}{current_ms:>12.2f}{change:>+9.1f}% {status}")
+        if regressed and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
-from PyQt5.QtWidgets import QSizePolicy
+from PyQt5.QtWidgets import QSizePolicy, QLabel
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from inventory_manager import InventoryManager
 import numpy as np
 import logging
@@ -11,6 +14,157 @@ plt.rcParams['font.family'] = 'SimHei'
 # 解决负号显示为方块的问题
 plt.rcParams['axes.unicode_minus'] = False
 
+
+def load_chart_data(chart_type, db_path='inventory.db', top_n=10, days=30):
+    """
+    查询图表所需的数据（不涉及任何界面对象，可在后台线程调用）
+    :param chart_type: 图表类型
+    :param db_path: 数据库文件路径
+    :param top_n: 库存TOP图显示的商品数量
+    :param days: 出入库趋势图的天数范围
+    :return: 图表数据字典
+    """
+    with InventoryManager(db_path, read_only=True) as manager:
+        if chart_type == "stock_levels":
+            return {'top_n': top_n, 'products': manager.get_top_stock_products(top_n)}
+        if chart_type in ("category_distribution", "stock_by_category"):
+            return {'categories': manager.get_category_summary()}
+        if chart_type == "in_out_trend":
+            return {'days': days, 'movements': manager.get_daily_movements(days)}
+    raise ValueError(f"未知的图表类型: {chart_type}")
+
+
+def _draw_empty(ax, message):
+    ax.text(0.5, 0.5, message,
+            horizontalalignment='center',
+            verticalalignment='center',
+            transform=ax.transAxes)
+
+
+def draw_chart(ax, chart_type, data):
+    """
+    将图表数据绘制到指定坐标轴
+    :param ax: matplotlib坐标轴
+    :param chart_type: 图表类型
+    :param data: load_chart_data 返回的数据
+    :return: 有数据返回True，否则返回False
+    """
+    ax.clear()
+
+    if chart_type == "stock_levels":
+        products = data['products']
+        if not products:
+            _draw_empty(ax, '没有商品数据')
+            return False
+
+        names = [p['name'] for p in products]
+        stocks = [p['stock'] for p in products]
+
+        # 创建水平条形图
+        y_pos = np.arange(len(names))
+        bars = ax.barh(y_pos, stocks, align='center', color='skyblue')
+        ax.set_yticks(y_pos)
+        ax.set_yticklabels(names)
+        ax.invert_yaxis()  # 从上到下显示
+        ax.set_xlabel('库存数量')
+        ax.set_title(f"商品库存TOP {data['top_n']}")
+
+        # 在条形图上添加数值标签
+        for bar in bars:
+            width = bar.get_width()
+            ax.text(width + max(stocks)*0.01, bar.get_y() + bar.get_height()/2,
+                    f'{int(width)}',
+                    va='center', ha='left')
+        return True
+
+    if chart_type == "category_distribution":
+        categories = data['categories']
+        if not categories:
+            _draw_empty(ax, '没有类别数据')
+            return False
+
+        labels = [item['category'] for item in categories]
+        counts = [item['product_count'] for item in categories]
+
+        # 创建饼图
+        wedges, texts, autotexts = ax.pie(
+            counts,
+            labels=labels,
+            autopct=lambda p: f'{p:.1f}% ({int(p * sum(counts) / 100)})',
+            startangle=90,
+            wedgeprops={'edgecolor': 'w', 'linewidth': 1}
+        )
+
+        ax.set_title('商品类别分布')
+        ax.axis('equal')  # 确保饼图是圆的
+
+        # 调整标签位置
+        for text in texts:
+            text.set_fontsize(8)
+        for autotext in autotexts:
+            autotext.set_fontsize(8)
+        return True
+
+    if chart_type == "stock_by_category":
+        categories = sorted(data['categories'], key=lambda x: x['total_stock'], reverse=True)
+        if not categories:
+            _draw_empty(ax, '没有类别数据')
+            return False
+
+        labels = [item['category'] for item in categories]
+        stocks = [item['total_stock'] for item in categories]
+
+        # 创建条形图
+        x_pos = np.arange(len(labels))
+        bars = ax.bar(x_pos, stocks, align='center', color='lightgreen')
+        ax.set_xticks(x_pos)
+        ax.set_xticklabels(labels, rotation=45, ha='right')
+        ax.set_ylabel('库存总量')
+        ax.set_title('按类别分组的库存总量')
+
+        # 在条形图上添加数值标签
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2, height + max(stocks)*0.01,
+                    f'{int(height)}',
+                    ha='center', va='bottom')
+        return True
+
+    if chart_type == "in_out_trend":
+        movements = data['movements']
+        if not movements:
+            _draw_empty(ax, '没有历史数据')
+            return False
+
+        sorted_dates = [m['day'] for m in movements]
+        in_values = [m['in_amount'] for m in movements]
+        out_values = [m['out_amount'] for m in movements]
+
+        # 创建折线图
+        x_pos = np.arange(len(sorted_dates))
+        ax.plot(x_pos, in_values, 'g-o', label='入库')
+        ax.plot(x_pos, out_values, 'r--s', label='出库')
+
+        ax.set_xticks(x_pos)
+        ax.set_xticklabels(sorted_dates, rotation=45, ha='right')
+        ax.set_ylabel('数量')
+        ax.set_title(f"近{data['days']}天出入库趋势")
+        ax.legend()
+        ax.grid(True, linestyle='--', alpha=0.7)
+
+        # 添加数据标签
+        for i, v in enumerate(in_values):
+            ax.text(i, v + max(in_values + out_values) * 0.02,
+                    str(v), color='green', ha='center')
+
+        for i, v in enumerate(out_values):
+            ax.text(i, v + max(in_values + out_values) * 0.02,
+                    str(v), color='red', ha='center')
+        return True
+
+    raise ValueError(f"未知的图表类型: {chart_type}")
+
+
 class InventoryChart(FigureCanvas):
     def __init__(self, parent=None, width=8, height=6, dpi=100):
         """
@@ -25,262 +179,235 @@ class InventoryChart(FigureCanvas):
         self.setParent(parent)
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.logger = logging.getLogger('inventory_chart')
-        
+
         # 默认图表
         self.ax = self.fig.add_subplot(111)
         self.plot_stock_levels()
-    
+
+    def _plot(self, chart_type, **options):
+        if draw_chart(self.ax, chart_type, load_chart_data(chart_type, **options)):
+            self.fig.tight_layout()
+        self.draw()
+
     def plot_stock_levels(self, top_n=10):
         """
         绘制库存TOP N商品
         :param top_n: 显示前N个商品
         """
         try:
-            self.ax.clear()
-            
-            with InventoryManager() as manager:
-                products = manager.search_products()
-                if not products:
-                    self.ax.text(0.5, 0.5, '没有商品数据', 
-                                horizontalalignment='center', 
-                                verticalalignment='center', 
-                                transform=self.ax.transAxes)
-                    self.draw()
-                    return
-                
-                # 按库存排序
-                sorted_products = sorted(products, key=lambda x: x['stock'], reverse=True)[:top_n]
-                
-                names = [p['name'] for p in sorted_products]
-                stocks = [p['stock'] for p in sorted_products]
-                
-                # 创建水平条形图
-                y_pos = np.arange(len(names))
-                bars = self.ax.barh(y_pos, stocks, align='center', color='skyblue')
-                self.ax.set_yticks(y_pos)
-                self.ax.set_yticklabels(names)
-                self.ax.invert_yaxis()  # 从上到下显示
-                self.ax.set_xlabel('库存数量')
-                self.ax.set_title(f'商品库存TOP {top_n}')
-                
-                # 在条形图上添加数值标签
-                for bar in bars:
-                    width = bar.get_width()
-                    self.ax.text(width + max(stocks)*0.01, bar.get_y() + bar.get_height()/2, 
-                                f'{int(width)}', 
-                                va='center', ha='left')
-            
-            self.fig.tight_layout()
-            self.draw()
+            self._plot("stock_levels", top_n=top_n)
         except Exception as e:
             self.logger.error(f"绘制库存水平图失败: {e}")
-    
+
     def plot_category_distribution(self):
         """
         绘制商品类别分布图
         """
         try:
-            self.ax.clear()
-            
-            with InventoryManager() as manager:
-                categories = manager.get_all_categories()
-                if not categories:
-                    self.ax.text(0.5, 0.5, '没有类别数据', 
-                                horizontalalignment='center', 
-                                verticalalignment='center', 
-                                transform=self.ax.transAxes)
-                    self.draw()
-                    return
-                
-                # 获取每个类别的商品数量
-                category_counts = {}
-                for category in categories:
-                    products = manager.search_products(category=category)
-                    category_counts[category] = len(products)
-                
-                # 排序
-                sorted_categories = sorted(category_counts.items(), key=lambda x: x[1], reverse=True)
-                
-                labels = [item[0] for item in sorted_categories]
-                counts = [item[1] for item in sorted_categories]
-                
-                # 创建饼图
-                wedges, texts, autotexts = self.ax.pie(
-                    counts, 
-                    labels=labels, 
-                    autopct=lambda p: f'{p:.1f}% ({int(p * sum(counts) / 100)})',
-                    startangle=90,
-                    wedgeprops={'edgecolor': 'w', 'linewidth': 1}
-                )
-                
-                self.ax.set_title('商品类别分布')
-                self.ax.axis('equal')  # 确保饼图是圆的
-                
-                # 调整标签位置
-                for text in texts:
-                    text.set_fontsize(8)
-                for autotext in autotexts:
-                    autotext.set_fontsize(8)
-            
-            self.fig.tight_layout()
-            self.draw()
+            self._plot("category_distribution")
         except Exception as e:
             self.logger.error(f"绘制类别分布图失败: {e}")
-    
+
     def plot_stock_value_by_category(self):
         """
         绘制按类别分组的库存价值图（假设每个商品价值相同）
         """
         try:
-            self.ax.clear()
-            
-            with InventoryManager() as manager:
-                categories = manager.get_all_categories()
-                if not categories:
-                    self.ax.text(0.5, 0.5, '没有类别数据', 
-                                horizontalalignment='center', 
-                                verticalalignment='center', 
-                                transform=self.ax.transAxes)
-                    self.draw()
-                    return
-                
-                # 获取每个类别的总库存
-                category_stock = {}
-                for category in categories:
-                    products = manager.search_products(category=category)
-                    total_stock = sum(p['stock'] for p in products)
-                    category_stock[category] = total_stock
-                
-                # 排序
-                sorted_categories = sorted(category_stock.items(), key=lambda x: x[1], reverse=True)
-                
-                labels = [item[0] for item in sorted_categories]
-                stocks = [item[1] for item in sorted_categories]
-                
-                # 创建条形图
-                x_pos = np.arange(len(labels))
-                bars = self.ax.bar(x_pos, stocks, align='center', color='lightgreen')
-                self.ax.set_xticks(x_pos)
-                self.ax.set_xticklabels(labels, rotation=45, ha='right')
-                self.ax.set_ylabel('库存总量')
-                self.ax.set_title('按类别分组的库存总量')
-                
-                # 在条形图上添加数值标签
-                for bar in bars:
-                    height = bar.get_height()
-                    self.ax.text(bar.get_x() + bar.get_width()/2, height + max(stocks)*0.01, 
-                                f'{int(height)}', 
-                                ha='center', va='bottom')
-            
-            self.fig.tight_layout()
-            self.draw()
+            self._plot("stock_by_category")
         except Exception as e:
             self.logger.error(f"绘制类别库存图失败: {e}")
-    
+
     def plot_in_out_trend(self, days=30):
         """
         绘制近期的出入库趋势图
         :param days: 天数范围
         """
         try:
-            self.ax.clear()
-            
-            with InventoryManager() as manager:
-                # 获取最近days天的出入库数据
-                # 注意：这里简化处理，实际应用中需要更复杂的日期处理
-                history = manager.get_inventory_history()
-                
-                if not history:
-                    self.ax.text(0.5, 0.5, '没有历史数据', 
-                                horizontalalignment='center', 
-                                verticalalignment='center', 
-                                transform=self.ax.transAxes)
-                    self.draw()
-                    return
-                
-                # 按日期分组
-                from collections import defaultdict
-                daily_data = defaultdict(lambda: {'in': 0, 'out': 0})
-                
-                for record in history:
-                    date = record['operation_time'].split()[0]  # 只取日期部分
-                    if record['operation_type'] == 'in':
-                        daily_data[date]['in'] += record['change_amount']
-                    else:
-                        daily_data[date]['out'] += record['change_amount']
-                
-                # 排序日期
-                sorted_dates = sorted(daily_data.keys())[-days:]
-                
-                in_values = [daily_data[date]['in'] for date in sorted_dates]
-                out_values = [daily_data[date]['out'] for date in sorted_dates]
-                
-                # 创建折线图
-                x_pos = np.arange(len(sorted_dates))
-                line_in, = self.ax.plot(x_pos, in_values, 'g-o', label='入库')
-                line_out, = self.ax.plot(x_pos, out_values, 'r--s', label='出库')
-                
-                self.ax.set_xticks(x_pos)
-                self.ax.set_xticklabels(sorted_dates, rotation=45, ha='right')
-                self.ax.set_ylabel('数量')
-                self.ax.set_title(f'近{days}天出入库趋势')
-                self.ax.legend()
-                self.ax.grid(True, linestyle='--', alpha=0.7)
-                
-                # 添加数据标签
-                for i, v in enumerate(in_values):
-                    self.ax.text(i, v + max(in_values + out_values) * 0.02, 
-                                str(v), color='green', ha='center')
-                
-                for i, v in enumerate(out_values):
-                    self.ax.text(i, v + max(in_values + out_values) * 0.02, 
-                                str(v), color='red', ha='center')
-            
-            self.fig.tight_layout()
-            self.draw()
+            self._plot("in_out_trend", days=days)
         except Exception as e:
             self.logger.error(f"绘制出入库趋势图失败: {e}")
 
+
+class ChartRenderWorker(QThread):
+    """在后台线程中查询数据并离屏渲染图表"""
+    rendered = pyqtSignal(int, QImage)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, token, chart_type, width, height, dpi=100, options=None):
+        """
+        :param token: 渲染请求编号，用于丢弃过期结果
+        :param chart_type: 图表类型
+        :param width: 输出图像宽度（像素）
+        :param height: 输出图像高度（像素）
+        :param dpi: 分辨率
+        :param options: 传递给 load_chart_data 的额外参数
+        """
+        super().__init__()
+        self.token = token
+        self.chart_type = chart_type
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.options = options or {}
+
+    def run(self):
+        try:
+            data = load_chart_data(self.chart_type, **self.options)
+            if self.isInterruptionRequested():
+                return
+
+            # 使用Agg画布离屏渲染，避免在子线程中触碰界面对象
+            fig = Figure(figsize=(self.width / self.dpi, self.height / self.dpi), dpi=self.dpi)
+            canvas = FigureCanvasAgg(fig)
+            ax = fig.add_subplot(111)
+            if draw_chart(ax, self.chart_type, data):
+                fig.tight_layout()
+            if self.isInterruptionRequested():
+                return
+            canvas.draw()
+
+            width, height = canvas.get_width_height()
+            image = QImage(bytes(canvas.buffer_rgba()), width, height, QImage.Format_RGBA8888).copy()
+            if not self.isInterruptionRequested():
+                self.rendered.emit(self.token, image)
+        except Exception as e:
+            self.failed.emit(self.token, str(e))
+
+
+class AsyncInventoryChart(QLabel):
+    """异步库存图表：后台生成图像后替换显示，界面不会因大数据量而卡顿"""
+
+    def __init__(self, parent=None, width=8, height=6, dpi=100):
+        """
+        :param parent: 父组件
+        :param width: 图表宽度（英寸）
+        :param height: 图表高度（英寸）
+        :param dpi: 分辨率
+        """
+        super().__init__(parent)
+        self.dpi = dpi
+        self.setMinimumSize(int(width * dpi / 2), int(height * dpi / 2))
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setAlignment(Qt.AlignCenter)
+        self.logger = logging.getLogger('inventory_chart')
+
+        self._token = 0
+        self._current_worker = None
+        self._workers = set()
+        self._pixmap = None
+
+    def request_chart(self, chart_type, **options):
+        """
+        请求生成图表，正在进行中的旧请求会被取消
+        :param chart_type: 图表类型
+        :param options: 传递给 load_chart_data 的额外参数
+        """
+        self.cancel()
+        self._token += 1
+
+        worker = ChartRenderWorker(self._token, chart_type,
+                                   max(self.width(), 200), max(self.height(), 150),
+                                   self.dpi, options)
+        worker.rendered.connect(self._on_rendered)
+        worker.failed.connect(self._on_failed)
+        worker.finished.connect(lambda w=worker: self._workers.discard(w))
+        self._workers.add(worker)
+        self._current_worker = worker
+
+        if self._pixmap is None:
+            self.setText("正在生成图表...")
+        worker.start()
+
+    def cancel(self):
+        """取消当前的渲染请求"""
+        if self._current_worker is not None:
+            self._current_worker.requestInterruption()
+            self._current_worker = None
+
+    def is_busy(self):
+        """是否有正在进行的渲染请求"""
+        return self._current_worker is not None
+
+    def _on_rendered(self, token, image):
+        if token != self._token:
+            return
+        self._current_worker = None
+        self._pixmap = QPixmap.fromImage(image)
+        self._show_pixmap()
+
+    def _on_failed(self, token, message):
+        if token != self._token:
+            return
+        self._current_worker = None
+        self.logger.error(f"生成图表失败: {message}")
+        self._pixmap = None
+        self.setText("图表生成失败")
+
+    def _show_pixmap(self):
+        if self._pixmap is not None:
+            self.setPixmap(self._pixmap.scaled(self.size(), Qt.KeepAspectRatio,
+                                               Qt.SmoothTransformation))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._show_pixmap()
+
+    def shutdown(self):
+        """
+        取消渲染并等待所有后台线程结束（窗口关闭、用户登出前调用）
+        子组件不会收到窗口的 closeEvent，需由所在页面显式调用
+        """
+        self.cancel()
+        for worker in list(self._workers):
+            worker.requestInterruption()
+            worker.wait()
+        self._workers.clear()
+
+    def closeEvent(self, event):
+        self.shutdown()
+        super().closeEvent(event)
+
+
 if __name__ == "__main__":
     # 测试代码（需要PyQt环境）
     import sys
     from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton
-    
+
     class TestWindow(QMainWindow):
         def __init__(self):
             super().__init__()
             self.setWindowTitle("库存图表测试")
             self.setGeometry(100, 100, 1000, 800)
-            
+
             central_widget = QWidget()
             self.setCentralWidget(central_widget)
             layout = QVBoxLayout(central_widget)
-            
+
             self.chart = InventoryChart(self, width=10, height=8)
             layout.addWidget(self.chart)
-            
+
             btn_layout = QVBoxLayout()
-            
+
             btn1 = QPushButton("显示库存TOP10")
             btn1.clicked.connect(lambda: self.chart.plot_stock_levels(10))
-            
+
             btn2 = QPushButton("显示类别分布")
             btn2.clicked.connect(self.chart.plot_category_distribution)
-            
+
             btn3 = QPushButton("显示类别库存")
             btn3.clicked.connect(self.chart.plot_stock_value_by_category)
-            
+
             btn4 = QPushButton("显示出入库趋势")
             btn4.clicked.connect(lambda: self.chart.plot_in_out_trend(14))
-            
+
             btn_layout.addWidget(btn1)
             btn_layout.addWidget(btn2)
             btn_layout.addWidget(btn3)
             btn_layout.addWidget(btn4)
-            
+
             layout.addLayout(btn_layout)
-    
+
     app = QApplication(sys.argv)
     window = TestWindow()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(app.exec_())
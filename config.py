@@ -6,6 +6,11 @@ class Config:
     # 路径配置
     IMAGE_DIR = "images"
     REPORT_DIR = "reports"
+    ARCHIVE_DIR = "archive"
+    
+    # 商品图片配置
+    THUMBNAIL_SIZES = (48, 200)  # 预先生成的缩略图边长（像素）：列表图标、预览
+    PIXMAP_CACHE_MB = 32  # 界面图片缓存容量上限（MB）
     
     # 默认用户角色
     ROLES = {
@@ -17,9 +22,42 @@ class Config:
     # 日志配置
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     LOG_FILE = "inventory_system.log"
+    SQL_TRACE_ENABLED = False  # 是否统计SQL执行耗时（也可设置环境变量 INVENTORY_SQL_TRACE=1），见 sql_trace.py
+    SQL_SLOW_QUERY_MS = 200  # 慢查询阈值（毫秒），超过时写入日志文件
+    
+    # 数据库锁等待与重试配置（见 db_retry.py）
+    DB_JOURNAL_MODE = "WAL"  # 日志模式：WAL下读操作不阻塞写入提交；数据库放在网络共享目录时改为 "DELETE"
+    DB_BUSY_TIMEOUT_MS = 2000  # 每次执行时等待其他连接释放锁的最长时间（毫秒）
+    DB_RETRY_ATTEMPTS = 4  # 锁等待超时后整个事务最多执行的次数
+    DB_RETRY_BASE_MS = 50  # 退避等待基数（毫秒），每次重试翻倍并随机抖动
+    DB_RETRY_MAX_MS = 1000  # 单次退避等待上限（毫秒）
+    
+    # 写入协调配置（见 write_coordinator.py）
+    WRITE_COORDINATOR_ENABLED = False  # 是否由单个写入线程串行执行写操作并合并提交
+    WRITE_BATCH_MAX = 100  # 每个事务最多合并的写操作数
+    WRITE_BATCH_DELAY_MS = 2  # 收到写操作后等待后续操作合并提交的最长时间（毫秒）
+    
+    # 运行指标导出配置（见 metrics.py）
+    METRICS_HTTP_PORT = None  # 本机HTTP端口，提供 /metrics（Prometheus格式），None表示不启动
+    METRICS_JSON_FILE = None  # 定期写入的指标JSON文件路径，None表示不写入
+    METRICS_JSON_INTERVAL = 60  # JSON文件写入间隔（秒）
+    METRICS_JSON_KEEP_DAYS = 7  # 按天轮转的JSON文件保留天数
+    
+    # 内存预算（MB），按场景名称前缀匹配，memory_profile.py --enforce 时检查峰值
+    MEMORY_BUDGET_MB = {
+        "data": 100,  # 查询结果（字典行）
+        "tab": 150,  # 标签页加载数据（表格项）
+        "chart": 80,
+        "report": 200,
+    }
     
     # 条形码扫描配置
     SCANNER_TIMEOUT = 30  # 秒
+    SCANNER_DECODE_WIDTH = 640  # 解码前将画面缩小到的最大宽度（像素）
+    SCANNER_ROI = (0.6, 0.5)  # 优先搜索的画面中心区域比例（宽, 高）
+    SCANNER_DEDUP_SECONDS = 1.5  # 连续扫码时同一条码的去重时间窗口（秒）
+    SCANNER_WEDGE_MAX_INTERVAL_MS = 30  # 扫码枪相邻按键的最大间隔（毫秒），超过视为人工输入
+    SCANNER_WEDGE_MIN_LENGTH = 6  # 扫码枪输入的条形码最短长度
     
     # 库存预警配置
     LOW_STOCK_COLOR = "#FF6347"  # Tomato
@@ -27,6 +65,28 @@ class Config:
     
     # 报表配置
     REPORT_TITLE = "智能商品库存管理系统报告"
+    REPORT_MAX_WORKERS = 2  # 后台并行生成报表的最大进程数
+    REPORT_EMBED_FONT = True  # 是否嵌入中文字体子集；False时使用阅读器自带字体，文件最小
+    REPORT_FONT_PATH = None  # 自定义中文字体文件路径
+    REPORT_CACHE_ENABLED = True  # 数据未变化时复用已生成的报表
+    REPORT_CACHE_MAX_MB = 200  # 报表缓存容量上限（MB）
+    
+    # 定时报表配置（在非营业时间自动生成，见 report_scheduler.py）
+    REPORT_SCHEDULE = [
+        {"name": "daily_inventory", "report_type": "inventory", "every": "daily",
+         "at": "02:00", "keep_days": 30},
+        {"name": "weekly_transactions", "report_type": "history", "every": "weekly",
+         "weekday": 0, "at": "03:00", "keep_days": 180},
+        # 每日库存快照（每月1日的快照记为月度快照并永久保留），用于查询历史时间点的库存
+        {"name": "stock_snapshot", "report_type": "snapshot", "every": "daily",
+         "at": "01:30", "keep_days": 62},
+    ]
+    REPORT_SCHEDULE_GRACE_HOURS = 2  # 错过执行时间超过该时长则跳过，不在营业时间补跑
+    SCHEDULER_OPERATOR_ID = 1  # 定时任务在审计日志中使用的用户ID
+    
+    # 冷数据归档配置（见 archiver.py）
+    ARCHIVE_KEEP_DAYS = 365  # 热库中保留的天数，更早的库存历史和审计日志移入按年份划分的归档库
+    ARCHIVE_BATCH_SIZE = 5000  # 每批移动/删除的记录数，批次之间释放写锁
     
     @staticmethod
     def get_role_name(role_code):
@@ -0,0 +1,124 @@
+import time
+import random
+import sqlite3
+import logging
+import threading
+from config import Config
+from metrics import record_db_error, DB_RETRIES
+
+logger = logging.getLogger('db_retry')
+
+
+def is_busy_error(error):
+    """判断异常是否为可重试的锁等待超时（database is locked / busy）"""
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+
+def backoff_delay(attempt, base_ms=None, max_ms=None):
+    """
+    计算第 attempt 次重试前的等待时间（指数退避，完全随机抖动，避免多个客户端同时重试）
+    :param attempt: 重试序号（从1开始）
+    :return: 等待秒数
+    """
+    base_ms = base_ms if base_ms is not None else Config.DB_RETRY_BASE_MS
+    max_ms = max_ms if max_ms is not None else Config.DB_RETRY_MAX_MS
+    return random.uniform(0, min(max_ms, base_ms * 2 ** (attempt - 1))) / 1000
+
+
+class RetryStats:
+    def __init__(self):
+        """按组件统计锁等待重试情况"""
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, component, retries, waited, result):
+        """
+        :param component: 组件名称
+        :param retries: 本次调用的重试次数
+        :param waited: 重试等待的总秒数
+        :param result: 'ok'（无需重试）/ 'recovered'（重试后成功）/ 'exhausted'（重试用尽）
+        """
+        with self._lock:
+            stats = self._stats.setdefault(component, {
+                'calls': 0, 'retries': 0, 'recovered': 0, 'exhausted': 0, 'wait_seconds': 0.0})
+            stats['calls'] += 1
+            stats['retries'] += retries
+            stats['wait_seconds'] += waited
+            if result != 'ok':
+                stats[result] += 1
+        if result != 'ok':
+            DB_RETRIES.inc(component=component, result=result)
+
+    def snapshot(self):
+        """获取统计快照：{组件: {calls, retries, recovered, exhausted, wait_seconds}}"""
+        with self._lock:
+            return {component: dict(stats, wait_seconds=round(stats['wait_seconds'], 3))
+                    for component, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# 进程内共享的重试统计
+retry_stats = RetryStats()
+
+
+def run_with_retry(func, conn, component, attempts=None):
+    """
+    执行一个完整的事务，遇到锁等待超时时回滚并按退避策略重试
+    func 内部的其他异常直接抛出，不重试
+    :param func: 执行事务的无参函数（需自行提交）
+    :param conn: 事务所用的数据库连接，重试前回滚
+    :param component: 组件名称（用于统计）
+    :param attempts: 最多执行次数，默认 Config.DB_RETRY_ATTEMPTS
+    :return: func 的返回值
+    """
+    attempts = attempts or Config.DB_RETRY_ATTEMPTS
+    waited = 0.0
+    for attempt in range(1, attempts + 1):
+        try:
+            result = func()
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e):
+                raise
+            record_db_error(component, e)
+            conn.rollback()
+            if attempt == attempts:
+                retry_stats.record(component, attempt - 1, waited, 'exhausted')
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{component} 数据库被锁定，{delay * 1000:.0f}毫秒后第 {attempt} 次重试")
+            time.sleep(delay)
+            waited += delay
+        else:
+            retry_stats.record(component, attempt - 1, waited, 'recovered' if attempt > 1 else 'ok')
+            return result
+
+
+def commit_with_retry(conn, component, attempts=None):
+    """
+    提交事务，遇到锁等待超时时事务仍然有效，等待后重新提交（不回滚已执行的语句）
+    :param conn: 数据库连接
+    :param component: 组件名称（用于统计）
+    :param attempts: 最多提交次数，默认 Config.DB_RETRY_ATTEMPTS
+    """
+    attempts = attempts or Config.DB_RETRY_ATTEMPTS
+    waited = 0.0
+    for attempt in range(1, attempts + 1):
+        try:
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e):
+                raise
+            record_db_error(component, e)
+            if attempt == attempts:
+                retry_stats.record(component, attempt - 1, waited, 'exhausted')
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{component} 提交时数据库被锁定，{delay * 1000:.0f}毫秒后第 {attempt} 次重试")
+            time.sleep(delay)
+            waited += delay
+        else:
+            retry_stats.record(component, attempt - 1, waited, 'recovered' if attempt > 1 else 'ok')
+            return
@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import zipfile
+import inspect
+import platform
+import functools
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from config import Config
+from db_retry import retry_stats
+import sql_trace
+
+# 每项操作保留的最近耗时记录数
+TIMING_HISTORY = 200
+
+# 诊断包中附带的日志文件末尾字节数
+LOG_TAIL_BYTES = 512 * 1024
+
+_lock = threading.Lock()
+_timings = {}
+_cache_stats = {}
+
+logger = logging.getLogger('diagnostics')
+
+
+def record_timing(category, name, seconds):
+    """
+    记录一次操作耗时
+    :param category: 分类（如 load_data、report）
+    :param name: 操作名称
+    :param seconds: 耗时（秒）
+    """
+    with _lock:
+        history = _timings.setdefault((category, name), deque(maxlen=TIMING_HISTORY))
+        history.append((time.time(), seconds))
+
+
+def timed(category):
+    """装饰器：记录方法的执行耗时，名称为方法的限定名（如 ProductTab.load_data）"""
+    def decorator(func):
+        # 作为Qt槽函数时信号会传入多余参数（如 clicked 的 checked），按原函数的参数个数截断
+        max_args = None if func.__code__.co_flags & inspect.CO_VARARGS else func.__code__.co_argcount
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args[:max_args], **kwargs)
+            finally:
+                record_timing(category, func.__qualname__, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def get_timings(category=None):
+    """
+    获取耗时统计
+    :param category: 只返回指定分类，None表示全部
+    :return: 统计字典列表，按最近一次耗时降序
+    """
+    with _lock:
+        items = [(key, list(history)) for key, history in _timings.items()
+                 if category is None or key[0] == category]
+    result = []
+    for (item_category, name), history in items:
+        durations = sorted(seconds for _, seconds in history)
+        result.append({
+            'category': item_category,
+            'name': name,
+            'count': len(durations),
+            'last_ms': round(history[-1][1] * 1000, 1),
+            'last_time': datetime.fromtimestamp(history[-1][0]).strftime('%Y-%m-%d %H:%M:%S'),
+            'median_ms': round(durations[len(durations) // 2] * 1000, 1),
+            'max_ms': round(durations[-1] * 1000, 1),
+        })
+    result.sort(key=lambda item: item['last_ms'], reverse=True)
+    return result
+
+
+def record_cache(name, hit):
+    """
+    记录一次缓存访问
+    :param name: 缓存名称
+    :param hit: 是否命中
+    """
+    with _lock:
+        _cache_stats.setdefault(name, Counter())['hit' if hit else 'miss'] += 1
+
+
+def get_cache_stats():
+    """
+    获取本进程中应用层缓存（条形码、图片等）的命中率
+    SQLite页缓存的命中统计未通过 Python sqlite3 模块提供，页缓存大小见 database_info
+    :return: 统计字典列表
+    """
+    with _lock:
+        items = [(name, dict(counts)) for name, counts in _cache_stats.items()]
+    result = []
+    for name, counts in sorted(items):
+        hits, misses = counts.get('hit', 0), counts.get('miss', 0)
+        result.append({
+            'name': name,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+        })
+    return result
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _dir_size(path):
+    total = count = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += _file_size(os.path.join(root, name))
+            count += 1
+    return total, count
+
+
+def database_info(db_path=None):
+    """
+    获取数据库文件和结构信息
+    :param db_path: 数据库文件路径，默认 Config.DB_PATH
+    :return: 信息字典，读取失败时包含 error
+    """
+    db_path = db_path or Config.DB_PATH
+    info = {
+        'path': os.path.abspath(db_path),
+        'size': _file_size(db_path),
+        'wal_size': _file_size(f"{db_path}-wal"),
+    }
+    try:
+        conn = sql_trace.connect(db_path, read_only=True)
+        try:
+            for pragma in ('page_size', 'page_count', 'freelist_count', 'journal_mode',
+                           'cache_size', 'mmap_size', 'user_version'):
+                info[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+            info['free_bytes'] = info['page_size'] * info['freelist_count']
+            # SQLite页缓存上限（每个连接）：负数表示KiB，正数表示页数
+            cache_size = info['cache_size']
+            info['page_cache_bytes'] = -cache_size * 1024 if cache_size < 0 else cache_size * info['page_size']
+            info['indexes'] = [
+                {'name': name, 'table': table, 'sql': sql}
+                for name, table, sql in conn.execute(
+                    "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index' ORDER BY tbl_name, name")
+            ]
+            info['analyzed'] = conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0] > 0
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"读取数据库信息失败: {e}")
+        info['error'] = str(e)
+    return info
+
+
+def slow_queries(top=20):
+    """
+    获取最慢的SQL语句（需要启用SQL跟踪，见 sql_trace.py）
+    :return: 语句统计列表，按最大耗时降序；未启用跟踪时返回空列表
+    """
+    if not sql_trace.is_enabled():
+        return []
+    return sql_trace.tracer.summary(top=top, sort='max_ms')
+
+
+def optimize_database(db_path=None):
+    """
+    更新查询优化器统计信息（ANALYZE + PRAGMA optimize）
+    大数据库上耗时较长，界面中需在后台线程调用
+    :param db_path: 数据库文件路径，默认 Config.DB_PATH
+    :return: 耗时（秒），失败返回None
+    """
+    db_path = db_path or Config.DB_PATH
+    started = time.perf_counter()
+    try:
+        conn = sql_trace.connect(db_path)
+        try:
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"优化数据库失败: {e}")
+        return None
+    elapsed = time.perf_counter() - started
+    logger.info(f"数据库优化完成，耗时 {elapsed:.2f} 秒")
+    return elapsed
+
+
+def collect(db_path=None):
+    """
+    收集全部诊断信息
+    :param db_path: 数据库文件路径，默认 Config.DB_PATH
+    :return: 诊断信息字典
+    """
+    report_cache_size, report_cache_files = _dir_size(os.path.join(Config.REPORT_DIR, '.cache'))
+    image_size, image_files = _dir_size(Config.IMAGE_DIR)
+    return {
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'frozen': bool(getattr(sys, 'frozen', False)),
+            'cpu_count': os.cpu_count(),
+        },
+        'database': database_info(db_path),
+        'caches': get_cache_stats(),
+        'storage': {
+            'report_cache_bytes': report_cache_size,
+            'report_cache_files': report_cache_files,
+            'image_bytes': image_size,
+            'image_files': image_files,
+        },
+        'sql_trace_enabled': sql_trace.is_enabled(),
+        'slow_queries': slow_queries(),
+        'db_retries': retry_stats.snapshot(),
+        'timings': get_timings(),
+    }
+
+
+def export_bundle(file_path, db_path=None):
+    """
+    导出诊断包（zip）：诊断信息、SQL统计、配置和日志文件末尾，不包含数据库内容
+    :param file_path: 诊断包路径
+    :param db_path: 数据库文件路径，默认 Config.DB_PATH
+    :return: 诊断包路径
+    """
+    config = {name: value for name, value in vars(Config).items()
+              if name.isupper() and isinstance(value, (str, int, float, bool, list, tuple, dict, type(None)))}
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr('diagnostics.json', json.dumps(collect(db_path), ensure_ascii=False, indent=2))
+        bundle.writestr('config.json', json.dumps(config, ensure_ascii=False, indent=2, default=str))
+        if sql_trace.is_enabled():
+            bundle.writestr('sql_summary.txt', sql_trace.tracer.format_summary(top=100))
+        if os.path.exists(Config.LOG_FILE):
+            with open(Config.LOG_FILE, 'rb') as f:
+                f.seek(max(0, _file_size(Config.LOG_FILE) - LOG_TAIL_BYTES))
+                bundle.writestr(os.path.basename(Config.LOG_FILE), f.read())
+        state_file = os.path.join(Config.REPORT_DIR, 'scheduled', 'schedule_state.json')
+        if os.path.exists(state_file):
+            bundle.write(state_file, 'schedule_state.json')
+    logger.info(f"诊断包已导出: {file_path}")
+    return file_path
+
+
+if __name__ == "__main__":
+    # 测试代码
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(collect(), ensure_ascii=False, indent=2))
@@ -0,0 +1,201 @@
+import os
+from datetime import datetime
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel,
+                             QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QGroupBox, QMessageBox, QFileDialog, QTabWidget)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from audit_logger import AuditLogger
+from config import Config
+import diagnostics
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class OptimizeWorker(QThread):
+    """在后台线程中更新查询优化器统计信息，完成后发送耗时（失败为None）"""
+    done = pyqtSignal(object)
+
+    def run(self):
+        self.done.emit(diagnostics.optimize_database())
+
+
+class DiagnosticsTab(QWidget):
+    def __init__(self, user_id):
+        """
+        性能诊断页（仅管理员可见）
+        :param user_id: 当前用户ID，优化数据库和导出诊断包时记录审计日志
+        """
+        super().__init__()
+        self.user_id = user_id
+        self.optimize_worker = None
+        self.setup_ui()
+        self.load_data()
+    
+    def setup_ui(self):
+        main_layout = QVBoxLayout()
+        
+        # 数据库概况
+        db_group = QGroupBox("数据库")
+        db_layout = QFormLayout()
+        self.db_labels = {}
+        for key, title in (("path", "文件路径"), ("size", "文件大小"), ("free", "空闲空间"),
+                           ("journal_mode", "日志模式"), ("wal", "WAL文件"), ("page_cache", "SQLite页缓存上限"),
+                           ("analyzed", "统计信息")):
+            label = QLabel()
+            label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+            self.db_labels[key] = label
+            db_layout.addRow(f"{title}:", label)
+        db_group.setLayout(db_layout)
+        
+        # 明细表格
+        self.detail_tabs = QTabWidget()
+        self.slow_table = self._create_table(["调用方法", "次数", "最大(ms)", "p95(ms)", "总计(ms)", "行数", "SQL"])
+        self.timing_table = self._create_table(["分类", "操作", "次数", "最近(ms)", "中位数(ms)", "最大(ms)", "最近时间"])
+        self.cache_table = self._create_table(["应用缓存", "命中", "未命中", "命中率"])
+        self.index_table = self._create_table(["索引", "表", "定义"])
+        self.retry_table = self._create_table(["组件", "调用次数", "重试次数", "重试后成功", "重试用尽", "等待(秒)"])
+        self.detail_tabs.addTab(self.slow_table, "慢查询")
+        self.detail_tabs.addTab(self.timing_table, "加载与报表耗时")
+        self.detail_tabs.addTab(self.cache_table, "应用缓存")
+        self.detail_tabs.addTab(self.index_table, "索引")
+        self.detail_tabs.addTab(self.retry_table, "锁等待重试")
+        
+        # 操作按钮
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.load_data)
+        
+        self.optimize_btn = QPushButton("优化数据库")
+        self.optimize_btn.setToolTip("更新查询优化器统计信息（ANALYZE / PRAGMA optimize）")
+        self.optimize_btn.clicked.connect(self.optimize_database)
+        
+        export_btn = QPushButton("导出诊断包")
+        export_btn.setStyleSheet("background-color: #2196F3; color: white;")
+        export_btn.clicked.connect(self.export_bundle)
+        
+        btn_layout = QHBoxLayout()
+        self.trace_label = QLabel()
+        btn_layout.addWidget(self.trace_label)
+        btn_layout.addStretch()
+        btn_layout.addWidget(refresh_btn)
+        btn_layout.addWidget(self.optimize_btn)
+        btn_layout.addWidget(export_btn)
+        
+        main_layout.addWidget(db_group)
+        main_layout.addWidget(self.detail_tabs)
+        main_layout.addLayout(btn_layout)
+        self.setLayout(main_layout)
+    
+    def _create_table(self, headers):
+        table = QTableWidget()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        return table
+    
+    def _fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem("" if value is None else str(value)))
+    
+    def load_data(self):
+        info = diagnostics.collect()
+        db = info['database']
+        self.db_labels["path"].setText(db['path'])
+        if 'error' in db:
+            self.db_labels["size"].setText(f"读取失败: {db['error']}")
+        else:
+            self.db_labels["size"].setText(f"{_format_size(db['size'])}（{db['page_count']} 页 × {db['page_size']} 字节）")
+            self.db_labels["free"].setText(f"{_format_size(db['free_bytes'])}（{db['freelist_count']} 页）")
+            self.db_labels["journal_mode"].setText(str(db['journal_mode']))
+            self.db_labels["page_cache"].setText(
+                f"{_format_size(db['page_cache_bytes'])}（每个连接，cache_size={db['cache_size']}，"
+                f"mmap_size={db['mmap_size']}）")
+            self.db_labels["analyzed"].setText("已收集" if db['analyzed'] else "未收集（建议执行优化数据库）")
+        if db.get('journal_mode', '').lower() != 'wal':
+            self.db_labels["wal"].setText("未启用WAL模式")
+        else:
+            self.db_labels["wal"].setText(_format_size(db['wal_size']) if db['wal_size'] else "0（已写回数据库文件）")
+        
+        if info['sql_trace_enabled']:
+            self.trace_label.setText(f"SQL跟踪已启用，慢查询阈值 {Config.SQL_SLOW_QUERY_MS} ms")
+        else:
+            self.trace_label.setText("SQL跟踪未启用（设置 Config.SQL_TRACE_ENABLED 后可查看慢查询）")
+        
+        self._fill_table(self.slow_table, [
+            (item['caller'], item['count'], item['max_ms'], item['p95_ms'], item['total_ms'], item['rows'], item['sql'])
+            for item in info['slow_queries']
+        ])
+        self._fill_table(self.timing_table, [
+            (item['category'], item['name'], item['count'], item['last_ms'], item['median_ms'], item['max_ms'],
+             item['last_time'])
+            for item in info['timings']
+        ])
+        self._fill_table(self.cache_table, [
+            (item['name'], item['hits'], item['misses'],
+             f"{item['hit_ratio']:.1%}" if item['hit_ratio'] is not None else "")
+            for item in info['caches']
+        ] + [
+            ("报表缓存（磁盘）", f"{info['storage']['report_cache_files']} 个文件",
+             _format_size(info['storage']['report_cache_bytes']), ""),
+            ("商品图片（磁盘）", f"{info['storage']['image_files']} 个文件",
+             _format_size(info['storage']['image_bytes']), ""),
+        ])
+        self._fill_table(self.index_table, [
+            (item['name'], item['table'], item['sql'] or "（自动创建）") for item in db.get('indexes', [])
+        ])
+        self._fill_table(self.retry_table, [
+            (component, stats['calls'], stats['retries'], stats['recovered'], stats['exhausted'],
+             stats['wait_seconds'])
+            for component, stats in sorted(info['db_retries'].items())
+        ])
+    
+    def optimize_database(self):
+        if self.optimize_worker is not None:
+            return
+        self.optimize_btn.setEnabled(False)
+        self.optimize_btn.setText("正在优化...")
+        self.optimize_worker = OptimizeWorker()
+        self.optimize_worker.done.connect(self.on_optimize_done)
+        self.optimize_worker.start()
+    
+    def on_optimize_done(self, elapsed):
+        self.optimize_worker.wait()
+        self.optimize_worker = None
+        self.optimize_btn.setEnabled(True)
+        self.optimize_btn.setText("优化数据库")
+        if elapsed is None:
+            QMessageBox.warning(self, "失败", "优化数据库失败，详情请查看日志")
+            return
+        with AuditLogger() as logger:
+            logger.log_action(self.user_id, "优化数据库", details=f"耗时: {elapsed:.2f}秒", ip_address="127.0.0.1")
+        QMessageBox.information(self, "成功", f"数据库优化完成，耗时 {elapsed:.2f} 秒")
+        self.load_data()
+    
+    def shutdown(self):
+        """等待正在进行的数据库优化结束（ANALYZE 无法中途取消）"""
+        if self.optimize_worker is not None:
+            self.optimize_worker.wait()
+    
+    def export_bundle(self):
+        default_name = f"diagnostics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出诊断包", os.path.join(Config.REPORT_DIR, default_name), "诊断包 (*.zip)"
+        )
+        if not file_path:
+            return
+        try:
+            diagnostics.export_bundle(file_path)
+        except Exception as e:
+            QMessageBox.warning(self, "失败", f"导出诊断包失败: {e}")
+            return
+        with AuditLogger() as logger:
+            logger.log_action(self.user_id, "导出诊断包", details=os.path.basename(file_path), ip_address="127.0.0.1")
+        QMessageBox.information(self, "成功", f"诊断包已导出: {file_path}")
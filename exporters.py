@@ -0,0 +1,201 @@
+import os
+import csv
+import gzip
+import json
+import logging
+import datetime
+from config import Config
+from inventory_manager import InventoryManager
+from audit_logger import AuditLogger
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX导出为可选功能
+    Workbook = None
+
+EXPORT_FORMATS = ('csv', 'xlsx', 'jsonl')
+
+# 每读取多少条记录回报一次进度
+PROGRESS_INTERVAL = 5000
+
+# 各导出文件的列（商品导出使用名称列，不导出内部的字典表ID）
+PRODUCT_EXPORT_COLUMNS = ('id', 'name', 'category', 'specification', 'supplier', 'location',
+                          'barcode', 'image_path', 'stock', 'min_stock')
+HISTORY_EXPORT_COLUMNS = ('id', 'product_id', 'product_name', 'change_amount', 'operation_type',
+                          'operator_id', 'operator_name', 'operation_time', 'operation_ts',
+                          'notes', 'idempotency_key')
+AUDIT_LOG_EXPORT_COLUMNS = ('id', 'user_id', 'username', 'action', 'timestamp', 'log_ts',
+                            'details', 'ip_address')
+
+
+def write_rows(rows, filepath, fmt, compress=False, progress_callback=None, total=0, columns=None):
+    """
+    将记录流式写入文件（先写临时文件，完成后原子替换，不会留下半成品）
+    :param rows: 记录字典的可迭代对象
+    :param filepath: 目标文件路径
+    :param fmt: 导出格式（csv / xlsx / jsonl）
+    :param compress: 是否使用gzip压缩（XLSX本身已压缩，忽略此参数）
+    :param progress_callback: 进度回调函数，参数为 (已写入记录数, 记录总数)
+    :param total: 记录总数（仅用于进度回调）
+    :param columns: 导出的列，指定时只导出这些列，没有记录也会写出表头；默认使用第一条记录的键
+    :return: 写入的记录数
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    if fmt == 'xlsx' and Workbook is None:
+        raise RuntimeError("导出XLSX需要安装 openpyxl")
+
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    try:
+        if fmt == 'xlsx':
+            count = _write_xlsx(rows, tmp_path, progress_callback, total, columns)
+        else:
+            opener = gzip.open if compress else open
+            # CSV带BOM，Excel可直接识别中文
+            encoding = 'utf-8-sig' if fmt == 'csv' else 'utf-8'
+            with opener(tmp_path, 'wt', encoding=encoding, newline='') as f:
+                writer = _write_csv if fmt == 'csv' else _write_jsonl
+                count = writer(rows, f, progress_callback, total, columns)
+        os.replace(tmp_path, filepath)
+        return count
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _report_progress(count, progress_callback, total):
+    if progress_callback and count % PROGRESS_INTERVAL == 0:
+        progress_callback(count, total)
+
+
+def _row_values(row, columns):
+    if columns is None:
+        return list(row.values())
+    return [row.get(column) for column in columns]
+
+
+def _write_csv(rows, f, progress_callback, total, columns):
+    writer = csv.writer(f)
+    if columns is not None:
+        writer.writerow(columns)
+    count = 0
+    for row in rows:
+        if count == 0 and columns is None:
+            writer.writerow(row.keys())
+        writer.writerow(_row_values(row, columns))
+        count += 1
+        _report_progress(count, progress_callback, total)
+    return count
+
+
+def _write_jsonl(rows, f, progress_callback, total, columns):
+    count = 0
+    for row in rows:
+        if columns is not None:
+            row = dict(zip(columns, _row_values(row, columns)))
+        f.write(json.dumps(row, ensure_ascii=False, default=str))
+        f.write('\n')
+        count += 1
+        _report_progress(count, progress_callback, total)
+    return count
+
+
+def _write_xlsx(rows, filepath, progress_callback, total, columns):
+    # write_only 模式逐行写出，不在内存中保留整张表
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    if columns is not None:
+        sheet.append(list(columns))
+    count = 0
+    for row in rows:
+        if count == 0 and columns is None:
+            sheet.append(list(row.keys()))
+        sheet.append(_row_values(row, columns))
+        count += 1
+        _report_progress(count, progress_callback, total)
+    workbook.save(filepath)
+    return count
+
+
+class DataExporter:
+    def __init__(self, output_dir=None, db_path='inventory.db', read_only=False):
+        """
+        数据导出器：将查询结果分批导出为 CSV / XLSX / JSONL
+        :param output_dir: 导出目录，默认 Config.REPORT_DIR
+        :param db_path: 数据库文件路径
+        :param read_only: 是否以只读方式访问数据库
+        """
+        self.output_dir = output_dir or Config.REPORT_DIR
+        self.db_path = db_path
+        self.read_only = read_only
+        self.logger = logging.getLogger('data_exporter')
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _export_path(self, prefix, fmt, compress):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        suffix = '.gz' if compress and fmt != 'xlsx' else ''
+        return os.path.join(self.output_dir, f"{prefix}_{timestamp}.{fmt}{suffix}")
+
+    def export_products(self, fmt='csv', compress=False, progress_callback=None, **filters):
+        """
+        导出商品数据
+        :param fmt: 导出格式
+        :param compress: 是否gzip压缩
+        :param progress_callback: 进度回调函数
+        :param filters: 与 InventoryManager.search_products 相同的筛选条件
+        :return: 导出文件路径
+        """
+        filepath = self._export_path("products", fmt, compress)
+        with InventoryManager(self.db_path, read_only=self.read_only) as manager:
+            total = manager.count_products(**filters)
+            rows = manager.iter_products(**filters)
+            count = write_rows(rows, filepath, fmt, compress, progress_callback, total,
+                               PRODUCT_EXPORT_COLUMNS)
+        if progress_callback:
+            progress_callback(count, total)
+        self.logger.info(f"导出商品数据 {count} 条: {filepath}")
+        return filepath
+
+    def export_inventory_history(self, fmt='csv', compress=False, progress_callback=None, **filters):
+        """
+        导出库存历史记录
+        :param filters: 与 InventoryManager.get_inventory_history 相同的筛选条件
+        :return: 导出文件路径
+        """
+        filepath = self._export_path("inventory_history", fmt, compress)
+        with InventoryManager(self.db_path, read_only=self.read_only) as manager:
+            total = manager.count_inventory_history(**filters)
+            rows = manager.iter_inventory_history(chunk_size=5000, **filters)
+            count = write_rows(rows, filepath, fmt, compress, progress_callback, total,
+                               HISTORY_EXPORT_COLUMNS)
+        if progress_callback:
+            progress_callback(count, total)
+        self.logger.info(f"导出库存历史 {count} 条: {filepath}")
+        return filepath
+
+    def export_audit_logs(self, fmt='csv', compress=False, progress_callback=None, **filters):
+        """
+        导出审计日志
+        :param filters: 与 AuditLogger.get_audit_logs 相同的筛选条件（不分页）
+        :return: 导出文件路径
+        """
+        filepath = self._export_path("audit_logs", fmt, compress)
+        with AuditLogger(self.db_path, read_only=self.read_only) as logger:
+            total = logger.count_audit_logs(**filters)
+            rows = logger.iter_audit_logs(chunk_size=5000, **filters)
+            count = write_rows(rows, filepath, fmt, compress, progress_callback, total,
+                               AUDIT_LOG_EXPORT_COLUMNS)
+        if progress_callback:
+            progress_callback(count, total)
+        self.logger.info(f"导出审计日志 {count} 条: {filepath}")
+        return filepath
+
+
+if __name__ == "__main__":
+    # 测试代码
+    logging.basicConfig(level=logging.INFO)
+
+    exporter = DataExporter()
+    print(exporter.export_products('csv'))
+    print(exporter.export_inventory_history('jsonl', compress=True))
+    print(exporter.export_audit_logs('csv', compress=True))
@@ -0,0 +1,156 @@
+import os
+import re
+import shutil
+import hashlib
+import logging
+from PIL import Image, ImageOps
+from config import Config
+from diagnostics import record_cache
+
+# 内容寻址文件名：sha256 十六进制
+_HASH_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ImageStore:
+    def __init__(self, root=None):
+        """
+        商品图片存储：原图按内容哈希命名，相同图片只保存一份，并预先生成多种尺寸的缩略图
+        目录结构：<root>/<哈希前两位>/<哈希>.<扩展名>，缩略图位于 <root>/thumbs/<尺寸>/
+        :param root: 存储根目录，默认 Config.IMAGE_DIR
+        """
+        self.root = root or Config.IMAGE_DIR
+        self.logger = logging.getLogger('image_store')
+
+    def add(self, source_path):
+        """
+        将图片加入存储（已存在相同内容的图片时直接复用）
+        :param source_path: 图片文件路径
+        :return: 存储后的图片路径（保存到商品的 image_path），不是有效图片或保存失败返回None
+        """
+        try:
+            # 先完整解码一次，非图片文件和损坏（如截断）的图片不加入存储
+            with Image.open(source_path) as image:
+                image.load()
+        except Exception as e:
+            self.logger.error(f"无法识别的图片文件 {source_path}: {e}")
+            return None
+        try:
+            digest = _file_sha256(source_path)
+            ext = os.path.splitext(source_path)[1].lower() or '.png'
+            target = os.path.join(self.root, digest[:2], digest + ext)
+            if not os.path.exists(target):
+                # 保存原始文件，不重新编码
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = f"{target}.{os.getpid()}.tmp"
+                shutil.copyfile(source_path, tmp_path)
+                os.replace(tmp_path, target)
+                self.logger.info(f"新增商品图片: {target}")
+            for size in Config.THUMBNAIL_SIZES:
+                if self.thumbnail_path(target, size) is None:
+                    return None
+            return target
+        except Exception as e:
+            self.logger.error(f"保存商品图片失败: {e}")
+            return None
+
+    def thumbnail_path(self, image_path, size):
+        """
+        获取缩略图路径，缩略图不存在时生成
+        :param image_path: 原图路径（旧数据中不在存储内的图片同样支持）
+        :param size: 缩略图边长（像素）
+        :return: 缩略图路径，原图不存在或无法读取时返回None
+        """
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        if not _HASH_NAME.match(stem):
+            # 旧图片按路径和修改时间命名缩略图，文件被替换后自动重新生成
+            try:
+                mtime = os.path.getmtime(image_path)
+            except OSError:
+                return None
+            stem = hashlib.sha1(f"{os.path.abspath(image_path)}|{mtime}".encode('utf-8')).hexdigest()
+
+        thumb = os.path.join(self.root, 'thumbs', str(size), f"{stem}.png")
+        if os.path.exists(thumb):
+            return thumb
+        try:
+            with Image.open(image_path) as image:
+                image.draft('RGB', (size, size))  # JPEG 直接按缩小尺寸解码
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((size, size), Image.LANCZOS)
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA')
+                os.makedirs(os.path.dirname(thumb), exist_ok=True)
+                tmp_path = f"{thumb}.{os.getpid()}.tmp"
+                image.save(tmp_path, 'PNG', optimize=True)
+                os.replace(tmp_path, thumb)
+            return thumb
+        except Exception as e:
+            self.logger.error(f"生成缩略图失败: {e}")
+            return None
+
+    def remove_unused(self, used_paths):
+        """
+        删除未被任何商品引用的图片及其缩略图
+        :param used_paths: 仍在使用的图片路径集合
+        :return: 删除的文件数
+        """
+        used = {os.path.splitext(os.path.basename(path))[0] for path in used_paths if path}
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                stem = os.path.splitext(name)[0]
+                if _HASH_NAME.match(stem) and stem not in used:
+                    os.remove(os.path.join(dirpath, name))
+                    removed += 1
+        return removed
+
+
+def _file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_default_store = None
+
+
+def load_pixmap(image_path, size):
+    """
+    加载商品图片缩略图（QPixmapCache 缓存，按最近使用淘汰）
+    :param image_path: 商品的 image_path
+    :param size: 缩略图边长（像素）
+    :return: QPixmap，图片不存在时返回空 QPixmap
+    """
+    from PyQt5.QtGui import QPixmap, QPixmapCache
+
+    global _default_store
+    if _default_store is None:
+        _default_store = ImageStore()
+        QPixmapCache.setCacheLimit(Config.PIXMAP_CACHE_MB * 1024)
+
+    pixmap = QPixmap()
+    if not image_path:
+        return pixmap
+    key = f"product-image:{size}:{image_path}"
+    found = QPixmapCache.find(key, pixmap)
+    record_cache('pixmap', found)
+    if found:
+        return pixmap
+
+    thumb = _default_store.thumbnail_path(image_path, size)
+    if thumb and pixmap.load(thumb):
+        QPixmapCache.insert(key, pixmap)
+    return pixmap
+
+
+if __name__ == "__main__":
+    # 测试代码
+    import sys
+    logging.basicConfig(level=logging.INFO)
+
+    store = ImageStore()
+    for path in sys.argv[1:]:
+        stored = store.add(path)
+        print(path, "->", stored, [store.thumbnail_path(stored, size) for size in Config.THUMBNAIL_SIZES])
@@ -1,23 +1,310 @@
+import uuid
 import sqlite3
 import logging
 from datetime import datetime
 from audit_logger import AuditLogger
+from time_utils import now_epoch, to_epoch
+from archiver import archive_source
+from config import Config
+from sql_trace import connect
+from write_coordinator import get_coordinator
+from db_retry import run_with_retry
+from diagnostics import record_cache
+from metrics import (observe, STOCK_MOVEMENTS, STOCK_MOVEMENT_SECONDS,
+                     SEARCH_SECONDS)
+
+# 已完成表结构检查的数据库（每个进程只检查一次）
+_schema_ready = set()
+
+# 条形码查询缓存：数据库路径 -> (商品表版本号, {条形码: 商品信息})
+_barcode_cache = {}
+
+# 商品字段 -> 字典表
+DIMENSION_TABLES = {'category': 'categories', 'location': 'locations', 'supplier': 'suppliers'}
+
+# 记录数据版本号的表，报表缓存等功能据此判断数据是否变化
+VERSIONED_TABLES = ('products', 'users', 'inventory_history')
 
 class InventoryManager:
-    def __init__(self, db_path='inventory.db'):
+    def __init__(self, db_path='inventory.db', read_only=False, conn=None):
         """
         初始化库存管理器
         :param db_path: 数据库文件路径
+        :param read_only: 是否以只读方式打开数据库（用于报表等后台任务）
+        :param conn: 使用已有的数据库连接（写入协调器内部使用）
         """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self.read_only = read_only
+        self.conn = conn or connect(db_path, read_only)
         self.cursor = self.conn.cursor()
         self.logger = logging.getLogger('inventory_manager')
-        self.audit_logger = AuditLogger(db_path)
+        self.audit_logger = AuditLogger(db_path, read_only=read_only, conn=conn)
+        # 启用写入协调时，写操作交给写入线程执行，读操作仍使用本连接
+        self._coordinator = None
+        if Config.WRITE_COORDINATOR_ENABLED and not read_only and conn is None:
+            self._coordinator = get_coordinator(db_path)
         
         # 启用外键约束
         self.cursor.execute("PRAGMA foreign_keys = ON")
         self.conn.commit()
+        
+        if not read_only and db_path not in _schema_ready:
+            self._create_tables()
+            _schema_ready.add(db_path)
+    
+    def _create_tables(self):
+        """创建辅助表和触发器（如果不存在）"""
+        self._set_journal_mode()
+        # 商品表重建会删除其上的触发器，需先于触发器创建
+        self._migrate_dimensions()
+        self._migrate_history_time()
+        try:
+            # 数据版本号：每次增删改都会递增
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            for table in VERSIONED_TABLES:
+                self.cursor.execute(
+                    "INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)",
+                    (table,))
+                # 新增的库存历史记录由最大ID体现，只需跟踪修改和删除
+                events = ('UPDATE', 'DELETE') if table == 'inventory_history' else ('INSERT', 'UPDATE', 'DELETE')
+                for event in events:
+                    self.cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                    END
+                    ''')
+            
+            # 库存快照：快照时刻的商品库存，以及已计入快照的最大库存历史ID
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_snapshots (
+                snapshot_id INTEGER PRIMARY KEY,
+                taken_ts INTEGER NOT NULL,
+                history_id INTEGER NOT NULL,
+                kind TEXT NOT NULL DEFAULT 'manual'
+            )
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_stock_snapshots_ts ON stock_snapshots(taken_ts)")
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+                snapshot_id INTEGER NOT NULL REFERENCES stock_snapshots(snapshot_id),
+                product_id INTEGER NOT NULL,
+                stock INTEGER NOT NULL,
+                PRIMARY KEY (snapshot_id, product_id)
+            ) WITHOUT ROWID
+            ''')
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"创建辅助表失败: {e}")
+            self.conn.rollback()
+    
+    def _set_journal_mode(self):
+        """
+        设置数据库日志模式（保存在数据库文件中，只需设置一次）
+        回滚日志模式下，报表、导出逐批读取期间持有共享锁，其他终端的写入无法提交
+        """
+        try:
+            self.conn.commit()
+            self.cursor.execute(f"PRAGMA journal_mode = {Config.DB_JOURNAL_MODE}")
+            mode = self.cursor.fetchone()[0]
+            if mode.upper() != Config.DB_JOURNAL_MODE.upper():
+                self.logger.warning(f"数据库日志模式设置为 {Config.DB_JOURNAL_MODE} 失败，当前为 {mode}")
+        except Exception as e:
+            self.logger.error(f"设置数据库日志模式失败: {e}")
+    
+    def _migrate_dimensions(self):
+        """
+        将商品的类别、库存位置、供应商文本拆分到字典表，商品表只保存整数ID
+        读取统一通过 product_details 视图，字段名与原商品表一致
+        """
+        try:
+            for table in DIMENSION_TABLES.values():
+                self.cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT UNIQUE NOT NULL
+                )
+                ''')
+            self.conn.commit()
+            
+            self.cursor.execute("PRAGMA table_info(products)")
+            if 'category' in [row[1] for row in self.cursor.fetchall()]:
+                self._rebuild_products_table()
+            
+            for column in DIMENSION_TABLES:
+                self.cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_products_{column} ON products({column}_id)")
+            # 类别、库存位置为空的商品不引用字典表，视图中仍以空字符串返回（与原商品表一致）
+            self.cursor.execute("DROP VIEW IF EXISTS product_details")
+            self.cursor.execute('''
+            CREATE VIEW product_details AS
+            SELECT p.id, p.name, COALESCE(c.name, '') AS category, p.specification, s.name AS supplier,
+                   COALESCE(l.name, '') AS location, p.barcode, p.image_path, p.stock, p.min_stock,
+                   p.category_id, p.supplier_id, p.location_id
+            FROM products p
+            LEFT JOIN categories c ON c.id = p.category_id
+            LEFT JOIN suppliers s ON s.id = p.supplier_id
+            LEFT JOIN locations l ON l.id = p.location_id
+            ''')
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"升级商品表结构失败: {e}")
+            self.conn.rollback()
+    
+    def _rebuild_products_table(self):
+        """重建商品表：回填字典表后按新结构复制数据（SQLite 不支持直接修改列）"""
+        self.conn.commit()
+        self.cursor.execute("PRAGMA foreign_keys = OFF")
+        try:
+            self.cursor.execute("BEGIN")
+            for column, table in DIMENSION_TABLES.items():
+                self.cursor.execute(f'''
+                INSERT OR IGNORE INTO {table} (name)
+                SELECT DISTINCT {column} FROM products WHERE {column} IS NOT NULL AND {column} != ''
+                ''')
+            
+            self.cursor.execute('''
+            CREATE TABLE products_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                category_id INTEGER REFERENCES categories(id),
+                specification TEXT,
+                supplier_id INTEGER REFERENCES suppliers(id),
+                location_id INTEGER REFERENCES locations(id),
+                barcode TEXT UNIQUE,
+                image_path TEXT,
+                stock INTEGER DEFAULT 0,
+                min_stock INTEGER DEFAULT 5
+            )
+            ''')
+            self.cursor.execute('''
+            INSERT INTO products_new (id, name, category_id, specification, supplier_id,
+                                      location_id, barcode, image_path, stock, min_stock)
+            SELECT p.id, p.name, c.id, p.specification, s.id, l.id,
+                   p.barcode, p.image_path, p.stock, p.min_stock
+            FROM products p
+            LEFT JOIN categories c ON c.name = p.category
+            LEFT JOIN suppliers s ON s.name = p.supplier
+            LEFT JOIN locations l ON l.name = p.location
+            ''')
+            migrated = self.cursor.rowcount
+            self.cursor.execute("DROP VIEW IF EXISTS product_details")
+            self.cursor.execute("DROP TABLE products")
+            self.cursor.execute("ALTER TABLE products_new RENAME TO products")
+            
+            # 只检查新商品表（其他表中可能存在与本次迁移无关的历史数据问题）
+            self.cursor.execute("PRAGMA foreign_key_check(products)")
+            if self.cursor.fetchall():
+                raise sqlite3.IntegrityError("外键检查失败")
+            self.conn.commit()
+            self.logger.info(f"商品表已升级为字典编码结构，共迁移 {migrated} 条商品")
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.cursor.execute("PRAGMA foreign_keys = ON")
+    
+    def _migrate_history_time(self):
+        """
+        为库存历史增加整数时间戳列（UTC秒）并建立索引，范围查询不再比较文本时间
+        已有记录的 operation_time 为本地时间，回填时转换为UTC
+        """
+        try:
+            self.cursor.execute("PRAGMA table_info(inventory_history)")
+            if 'operation_ts' not in [row[1] for row in self.cursor.fetchall()]:
+                self.cursor.execute("ALTER TABLE inventory_history ADD COLUMN operation_ts INTEGER")
+                self.cursor.execute('''
+                UPDATE inventory_history
+                SET operation_ts = CAST(strftime('%s', operation_time, 'utc') AS INTEGER)
+                WHERE operation_ts IS NULL
+                ''')
+                self.logger.info(f"已回填库存历史时间戳 {self.cursor.rowcount} 条")
+            # 旧版本程序写入的记录没有整数时间戳，插入后按 operation_time 补齐，避免被范围查询漏掉
+            self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_inventory_history_fill_ts
+            AFTER INSERT ON inventory_history
+            WHEN NEW.operation_ts IS NULL
+            BEGIN
+                UPDATE inventory_history
+                SET operation_ts = CAST(strftime('%s', NEW.operation_time, 'utc') AS INTEGER)
+                WHERE id = NEW.id;
+            END
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_ts ON inventory_history(operation_ts)")
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_product_ts ON inventory_history(product_id, operation_ts)")
+            
+            # 幂等标识：重试或重复提交的库存操作只生效一次
+            self.cursor.execute("PRAGMA table_info(inventory_history)")
+            if 'idempotency_key' not in [row[1] for row in self.cursor.fetchall()]:
+                self.cursor.execute("ALTER TABLE inventory_history ADD COLUMN idempotency_key TEXT")
+            self.cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_history_idempotency_key
+            ON inventory_history(idempotency_key) WHERE idempotency_key IS NOT NULL
+            ''')
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"升级库存历史表结构失败: {e}")
+            self.conn.rollback()
+    
+    def _dimension_id(self, column, name):
+        """
+        获取类别/库存位置/供应商名称对应的ID，不存在时新增
+        :param column: 字段名（category / location / supplier）
+        :param name: 名称
+        :return: ID，名称为空时返回None
+        """
+        if not name:
+            return None
+        table = DIMENSION_TABLES[column]
+        # 先插入再查询，多个终端同时新增同一名称时不会违反唯一约束
+        self.cursor.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+        self.cursor.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+        return self.cursor.fetchone()[0]
+    
+    def _encode_dimensions(self, fields):
+        """将字段字典中的类别/库存位置/供应商名称替换为对应的ID字段"""
+        encoded = dict(fields)
+        for column in DIMENSION_TABLES:
+            if column in encoded:
+                encoded[f"{column}_id"] = self._dimension_id(column, encoded.pop(column))
+        return encoded
+    
+    def get_data_versions(self):
+        """
+        获取数据版本信息
+        :return: 字典，包含各表的版本号和最大库存历史ID；不支持时返回None
+        """
+        try:
+            self.cursor.execute("SELECT table_name, version FROM data_versions")
+            versions = dict(self.cursor.fetchall())
+            self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_history")
+            versions['max_history_id'] = self.cursor.fetchone()[0]
+            return versions
+        except Exception as e:
+            self.logger.error(f"获取数据版本失败: {e}")
+            return None
+    
+    def _coordinated(self, method, failure, *args, **kwargs):
+        """
+        通过写入协调器执行写操作并等待提交
+        :param method: 方法名
+        :param failure: 执行失败时的返回值
+        :return: 方法的返回值
+        """
+        try:
+            return self._coordinator.submit('inventory', method, *args, **kwargs).result()
+        except Exception as e:
+            self.logger.error(f"写操作 {method} 执行失败: {e}")
+            return failure
     
     def add_product(self, operator_id, name, category, specification, supplier, location, 
                    barcode=None, image_path=None, min_stock=5):
@@ -25,26 +312,38 @@ class InventoryManager:
         添加新商品
         :return: 添加成功返回商品ID，失败返回None
         """
-        try:
+        if self._coordinator:
+            return self._coordinated('add_product', None, operator_id, name, category, specification,
+                                     supplier, location, barcode, image_path, min_stock)
+        
+        def apply():
             self.cursor.execute('''
-            INSERT INTO products (name, category, specification, supplier, location, 
+            INSERT INTO products (name, category_id, specification, supplier_id, location_id,
                                 barcode, image_path, min_stock)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (name, category, specification, supplier, location, 
+            ''', (name, self._dimension_id('category', category), specification,
+                 self._dimension_id('supplier', supplier), self._dimension_id('location', location),
                  barcode, image_path, min_stock))
-            self.conn.commit()
             product_id = self.cursor.lastrowid
+            self.conn.commit()
+            return product_id
+        
+        try:
+            # 锁等待超时时整个事务（包括新增的类别等字典项）回滚后重试
+            product_id = run_with_retry(apply, self.conn, 'inventory_manager')
             self.audit_logger.log_action(operator_id, f"添加商品，商品ID: {product_id}", 
                                          details=f"商品名称: {name}, 类别: {category}", 
                                          ip_address="N/A")
             return product_id
         except sqlite3.IntegrityError as e:
             self.logger.error(f"添加商品失败: {e}")
+            self.conn.rollback()
             if "UNIQUE constraint failed: products.barcode" in str(e):
                 return "barcode_exists"
             return None
         except Exception as e:
             self.logger.error(f"添加商品失败: {e}")
+            self.conn.rollback()
             return None
     
     def update_product(self, operator_id, product_id, **kwargs):
@@ -56,15 +355,18 @@ class InventoryManager:
         """
         if not kwargs:
             return False
-        
-        set_clause = ", ".join([f"{key} = ?" for key in kwargs.keys()])
-        values = list(kwargs.values())
-        values.append(product_id)
+        if self._coordinator:
+            return self._coordinated('update_product', False, operator_id, product_id, **kwargs)
         
         try:
             # 获取更新前的商品信息用于审计日志
             old_product = self.get_product_by_id(product_id)
             
+            fields = self._encode_dimensions(kwargs)
+            set_clause = ", ".join([f"{key} = ?" for key in fields.keys()])
+            values = list(fields.values())
+            values.append(product_id)
+            
             self.cursor.execute(f'''
             UPDATE products 
             SET {set_clause}
@@ -91,6 +393,7 @@ class InventoryManager:
             return success
         except Exception as e:
             self.logger.error(f"更新商品失败: {e}")
+            self.conn.rollback()
             return False
     
     def delete_product(self, operator_id, product_id):
@@ -99,6 +402,8 @@ class InventoryManager:
         :param product_id: 商品ID
         :return: 删除成功返回True，失败返回False
         """
+        if self._coordinator:
+            return self._coordinated('delete_product', False, operator_id, product_id)
         try:
             # 先删除相关库存历史记录
             self.cursor.execute('''
@@ -129,7 +434,7 @@ class InventoryManager:
         """
         try:
             self.cursor.execute('''
-            SELECT * FROM products 
+            SELECT * FROM product_details 
             WHERE id = ?
             ''', (product_id,))
             product = self.cursor.fetchone()
@@ -142,21 +447,79 @@ class InventoryManager:
             self.logger.error(f"获取商品信息失败: {e}")
             return None
     
-    def search_products(self, search_term=None, category=None, barcode=None, 
-                       supplier=None, location=None, min_stock=None):
+    @observe(SEARCH_SECONDS, kind='barcode')
+    def get_product_by_barcode(self, barcode):
         """
-        搜索商品
-        :return: 匹配的商品列表
+        根据条形码获取商品信息（精确匹配，使用条形码唯一索引）
+        查询结果按数据库缓存，商品表版本号变化时自动失效
+        :return: 商品信息字典，未找到返回None
         """
-        query = "SELECT * FROM products WHERE 1=1"
+        try:
+            self.cursor.execute("SELECT version FROM data_versions WHERE table_name = 'products'")
+            row = self.cursor.fetchone()
+            version = row[0] if row else None
+        except sqlite3.Error:
+            version = None
+        
+        cache = _barcode_cache.get(self.db_path)
+        if version is None or cache is None or cache[0] != version:
+            cache = (version, {})
+            if version is not None:
+                _barcode_cache[self.db_path] = cache
+        record_cache('barcode', barcode in cache[1])
+        if barcode in cache[1]:
+            product = cache[1][barcode]
+            return dict(product) if product else None
+        
+        try:
+            self.cursor.execute("SELECT * FROM product_details WHERE barcode = ?", (barcode,))
+            row = self.cursor.fetchone()
+            product = dict(zip([col[0] for col in self.cursor.description], row)) if row else None
+            cache[1][barcode] = product
+            return dict(product) if product else None
+        except Exception as e:
+            self.logger.error(f"根据条形码获取商品失败: {e}")
+            return None
+    
+    def get_products_by_barcodes(self, barcodes, chunk_size=900):
+        """
+        根据条形码批量获取商品信息
+        :param barcodes: 条形码列表
+        :param chunk_size: 每条查询语句的参数个数（SQLite限制单条语句最多999个参数）
+        :return: {条形码: 商品信息字典}，未匹配的条形码不包含在结果中
+        """
+        barcodes = list(dict.fromkeys(code for code in barcodes if code))
+        products = {}
+        try:
+            for start in range(0, len(barcodes), chunk_size):
+                chunk = barcodes[start:start + chunk_size]
+                placeholders = ", ".join("?" * len(chunk))
+                self.cursor.execute(f"SELECT * FROM product_details WHERE barcode IN ({placeholders})", chunk)
+                columns = [col[0] for col in self.cursor.description]
+                for row in self.cursor.fetchall():
+                    product = dict(zip(columns, row))
+                    products[product['barcode']] = product
+            return products
+        except Exception as e:
+            self.logger.error(f"批量获取商品信息失败: {e}")
+            return {}
+    
+    def _build_product_query(self, search_term=None, category=None, barcode=None,
+                             supplier=None, location=None, min_stock=None):
+        """
+        构建商品查询语句
+        :return: (查询语句, 参数列表)
+        """
+        query = "SELECT * FROM product_details WHERE 1=1"
         params = []
         
         if search_term:
             query += " AND (name LIKE ? OR specification LIKE ?)"
             params.extend([f"%{search_term}%", f"%{search_term}%"])
         
+        # 类别、位置、供应商先在字典表中查找ID，再按整数ID过滤商品
         if category:
-            query += " AND category = ?"
+            query += " AND category_id = (SELECT id FROM categories WHERE name = ?)"
             params.append(category)
         
         if barcode:
@@ -164,16 +527,28 @@ class InventoryManager:
             params.append(barcode)
         
         if supplier:
-            query += " AND supplier LIKE ?"
+            query += " AND supplier_id IN (SELECT id FROM suppliers WHERE name LIKE ?)"
             params.append(f"%{supplier}%")
         
         if location:
-            query += " AND location = ?"
+            query += " AND location_id = (SELECT id FROM locations WHERE name = ?)"
             params.append(location)
         
         if min_stock is not None:
             query += " AND stock <= min_stock"
         
+        return query, params
+    
+    @observe(SEARCH_SECONDS, kind='products')
+    def search_products(self, search_term=None, category=None, barcode=None, 
+                       supplier=None, location=None, min_stock=None):
+        """
+        搜索商品
+        :return: 匹配的商品列表
+        """
+        query, params = self._build_product_query(search_term, category, barcode,
+                                                  supplier, location, min_stock)
+        
         try:
             self.cursor.execute(query, params)
             products = self.cursor.fetchall()
@@ -186,7 +561,46 @@ class InventoryManager:
             self.logger.error(f"搜索商品失败: {e}")
             return []
     
-    def update_stock(self, operator_id, product_id, change_amount, operation_type, notes=None):
+    def count_products(self, search_term=None, category=None, barcode=None,
+                       supplier=None, location=None, min_stock=None):
+        """
+        统计匹配的商品数量
+        :return: 商品数量，失败返回0
+        """
+        try:
+            query, params = self._build_product_query(search_term, category, barcode,
+                                                      supplier, location, min_stock)
+            self.cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+            return self.cursor.fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"统计商品数量失败: {e}")
+            return 0
+    
+    def iter_products(self, search_term=None, category=None, barcode=None,
+                      supplier=None, location=None, min_stock=None, chunk_size=1000):
+        """
+        分批读取商品，内存占用与商品总数无关
+        :param chunk_size: 每次从数据库读取的记录数
+        :return: 逐条产出商品字典的生成器
+        """
+        query, params = self._build_product_query(search_term, category, barcode,
+                                                  supplier, location, min_stock)
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query + " ORDER BY id", params)
+            columns = [col[0] for col in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+    
+    @observe(STOCK_MOVEMENT_SECONDS, STOCK_MOVEMENTS, {'type': 'operation_type'}, mode='single')
+    def update_stock(self, operator_id, product_id, change_amount, operation_type, notes=None,
+                     idempotency_key=None):
         """
         更新库存数量
         :param product_id: 商品ID
@@ -194,7 +608,8 @@ class InventoryManager:
         :param operation_type: 操作类型 ('in'入库 / 'out'出库)
         :param operator_id: 操作员ID
         :param notes: 备注信息
-        :return: 操作成功返回True，失败返回False
+        :param idempotency_key: 操作标识，同一标识的操作只生效一次（界面重复提交时传入同一标识），默认自动生成
+        :return: 操作成功（或该操作此前已生效）返回True，失败返回False
         """
         if operation_type not in ('in', 'out'):
             self.logger.error(f"无效的操作类型: {operation_type}")
@@ -203,8 +618,15 @@ class InventoryManager:
         if change_amount <= 0:
             self.logger.error("变动数量必须大于0")
             return False
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+        if self._coordinator:
+            return self._coordinated('update_stock', False, operator_id, product_id,
+                                     change_amount, operation_type, notes, idempotency_key)
         
-        try:
+        def apply():
+            if self._already_applied(idempotency_key):
+                return 'duplicate'
+            
             # 更新库存数量
             self.cursor.execute('''
             UPDATE products 
@@ -222,33 +644,136 @@ class InventoryManager:
                 return False
             
             # 记录库存历史
+            now = datetime.now()
             self.cursor.execute('''
             INSERT INTO inventory_history (product_id, change_amount, operation_type, 
-                                          operator_id, operation_time, notes)
-            VALUES (?, ?, ?, ?, ?, ?)
+                                          operator_id, operation_time, operation_ts, notes,
+                                          idempotency_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (product_id, change_amount, operation_type, operator_id, 
-                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'), notes))
+                 now.strftime('%Y-%m-%d %H:%M:%S'), int(now.timestamp()), notes, idempotency_key))
             
             self.conn.commit()
-            action = f"{'入库' if operation_type == 'in' else '出库'} 商品，商品ID: {product_id}, 变动数量: {change_amount}"
-            self.audit_logger.log_action(operator_id, action, details=notes, ip_address="N/A")
             return True
+        
+        try:
+            result = run_with_retry(apply, self.conn, 'inventory_manager')
+            if result == 'duplicate':
+                return True
+            if result:
+                action = f"{'入库' if operation_type == 'in' else '出库'} 商品，商品ID: {product_id}, 变动数量: {change_amount}"
+                self.audit_logger.log_action(operator_id, action, details=notes, ip_address="N/A")
+            return result
         except Exception as e:
             self.logger.error(f"更新库存失败: {e}")
             self.conn.rollback()
             return False
     
-    def get_inventory_history(self, product_id=None, operator_id=None, 
+    @observe(STOCK_MOVEMENT_SECONDS, STOCK_MOVEMENTS, {'type': 'operation_type'}, mode='batch')
+    def update_stock_batch(self, operator_id, changes, operation_type, notes=None, idempotency_key=None):
+        """
+        批量更新库存（单个事务，全部成功或全部回滚，只记录一条审计日志）
+        :param operator_id: 操作员ID
+        :param changes: {商品ID: 变动数量}
+        :param operation_type: 操作类型 ('in'入库 / 'out'出库)
+        :param notes: 备注信息
+        :param idempotency_key: 操作标识，同一标识的批量操作只生效一次，默认自动生成
+        :return: 操作成功（或该操作此前已生效）返回True，失败返回False
+        """
+        if operation_type not in ('in', 'out'):
+            self.logger.error(f"无效的操作类型: {operation_type}")
+            return False
+        
+        if not changes or any(amount <= 0 for amount in changes.values()):
+            self.logger.error("变动数量必须大于0")
+            return False
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+        if self._coordinator:
+            return self._coordinated('update_stock_batch', False, operator_id, changes,
+                                     operation_type, notes, idempotency_key)
+        
+        sign = 1 if operation_type == 'in' else -1
+        
+        def apply():
+            # 每条历史记录的标识为 "批量标识:商品ID"，检查第一条即可
+            if self._already_applied(f"{idempotency_key}:{next(iter(changes))}"):
+                return 'duplicate'
+            
+            now = datetime.now()
+            operation_time, operation_ts = now.strftime('%Y-%m-%d %H:%M:%S'), int(now.timestamp())
+            self.cursor.executemany(
+                'UPDATE products SET stock = stock + ? WHERE id = ?',
+                [(sign * amount, product_id) for product_id, amount in changes.items()])
+            if self.cursor.rowcount != len(changes):
+                self.conn.rollback()
+                self.logger.error("批量更新库存失败: 部分商品不存在")
+                return False
+            
+            if operation_type == 'out':
+                placeholders = ", ".join("?" * len(changes))
+                self.cursor.execute(
+                    f"SELECT COUNT(*) FROM products WHERE id IN ({placeholders}) AND stock < 0",
+                    list(changes))
+                if self.cursor.fetchone()[0]:
+                    self.conn.rollback()
+                    self.logger.error("库存数量不能为负数")
+                    return False
+            
+            self.cursor.executemany('''
+            INSERT INTO inventory_history (product_id, change_amount, operation_type, 
+                                          operator_id, operation_time, operation_ts, notes,
+                                          idempotency_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(product_id, amount, operation_type, operator_id, operation_time, operation_ts, notes,
+                   f"{idempotency_key}:{product_id}")
+                  for product_id, amount in changes.items()])
+            
+            self.conn.commit()
+            return True
+        
+        try:
+            result = run_with_retry(apply, self.conn, 'inventory_manager')
+            if result == 'duplicate':
+                return True
+            if result:
+                action = (f"批量{'入库' if operation_type == 'in' else '出库'}，"
+                          f"商品数: {len(changes)}, 总数量: {sum(changes.values())}")
+                self.audit_logger.log_action(operator_id, action, details=notes, ip_address="N/A")
+            return result
+        except Exception as e:
+            self.logger.error(f"批量更新库存失败: {e}")
+            self.conn.rollback()
+            return False
+    
+    def _already_applied(self, idempotency_key):
+        """
+        检查指定标识的库存操作是否已经生效（重试或重复提交时跳过）
+        :param idempotency_key: 操作标识
+        """
+        self.cursor.execute("SELECT 1 FROM inventory_history WHERE idempotency_key = ?", (idempotency_key,))
+        if self.cursor.fetchone() is None:
+            return False
+        self.logger.info(f"库存操作 {idempotency_key} 已生效，忽略重复提交")
+        return True
+    
+    def _build_history_query(self, select, product_id=None, operator_id=None,
                              start_date=None, end_date=None, operation_type=None):
         """
-        获取库存历史记录
-        :return: 库存历史记录列表
+        构建库存历史查询语句
+        :param select: SELECT 子句中的字段列表
+        :param start_date: 开始时间（datetime / date / 字符串），按整数时间戳比较
+        :param end_date: 结束时间，只有日期时包含当天
+        :return: (查询语句, 参数列表)
         """
-        query = '''
-        SELECT h.*, p.name as product_name, u.username as operator_name 
-        FROM inventory_history h
-        JOIN products p ON h.product_id = p.id
-        JOIN users u ON h.operator_id = u.id
+        # 查询范围涉及已归档的记录时，自动合并对应年份的归档库
+        source = archive_source(self.conn, 'inventory_history',
+                                to_epoch(start_date), to_epoch(end_date, end_of_day=True))
+        # CROSS JOIN 固定以库存历史为外层表：收集统计信息后优化器可能改为遍历全部商品再逐个查找历史
+        query = f'''
+        SELECT {select}
+        FROM {source} h
+        CROSS JOIN products p ON h.product_id = p.id
+        CROSS JOIN users u ON h.operator_id = u.id
         WHERE 1=1
         '''
         params = []
@@ -266,16 +791,27 @@ class InventoryManager:
             params.append(operation_type)
         
         if start_date:
-            query += " AND h.operation_time >= ?"
-            params.append(start_date)
+            query += " AND h.operation_ts >= ?"
+            params.append(to_epoch(start_date))
         
         if end_date:
-            query += " AND h.operation_time <= ?"
-            params.append(end_date)
-        
-        query += " ORDER BY h.operation_time DESC"
+            query += " AND h.operation_ts <= ?"
+            params.append(to_epoch(end_date, end_of_day=True))
         
+        return query, params
+    
+    @observe(SEARCH_SECONDS, kind='history')
+    def get_inventory_history(self, product_id=None, operator_id=None, 
+                             start_date=None, end_date=None, operation_type=None):
+        """
+        获取库存历史记录
+        :return: 库存历史记录列表
+        """
         try:
+            query, params = self._build_history_query(
+                "h.*, p.name as product_name, u.username as operator_name",
+                product_id, operator_id, start_date, end_date, operation_type)
+            query += " ORDER BY h.operation_ts DESC, h.id DESC"
             self.cursor.execute(query, params)
             history = self.cursor.fetchall()
             
@@ -287,6 +823,64 @@ class InventoryManager:
             self.logger.error(f"获取库存历史失败: {e}")
             return []
     
+    def count_inventory_history(self, product_id=None, operator_id=None,
+                                start_date=None, end_date=None, operation_type=None):
+        """
+        统计库存历史记录数量
+        :return: 记录数量，失败返回0
+        """
+        try:
+            query, params = self._build_history_query(
+                "COUNT(*)", product_id, operator_id, start_date, end_date, operation_type)
+            self.cursor.execute(query, params)
+            return self.cursor.fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"统计库存历史失败: {e}")
+            return 0
+    
+    def iter_inventory_history(self, product_id=None, operator_id=None,
+                               start_date=None, end_date=None, operation_type=None,
+                               chunk_size=500):
+        """
+        分批读取库存历史记录，内存占用与记录总数无关
+        :param chunk_size: 每次从数据库读取的记录数
+        :return: 逐条产出库存历史记录字典的生成器
+        """
+        query, params = self._build_history_query(
+            "h.*, p.name as product_name, u.username as operator_name",
+            product_id, operator_id, start_date, end_date, operation_type)
+        query += " ORDER BY h.operation_ts DESC, h.id DESC"
+        
+        # 使用独立游标，避免与其他查询互相干扰
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            columns = [col[0] for col in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+    
+    def get_barcode_index(self):
+        """
+        获取条形码索引，用于连续扫码时在内存中快速查找商品
+        :return: {条形码: 商品信息字典}
+        """
+        try:
+            self.cursor.execute('''
+            SELECT id, name, barcode, stock FROM products
+            WHERE barcode IS NOT NULL AND barcode != ''
+            ''')
+            return {barcode: {'id': product_id, 'name': name, 'stock': stock}
+                    for product_id, name, barcode, stock in self.cursor.fetchall()}
+        except Exception as e:
+            self.logger.error(f"获取条形码索引失败: {e}")
+            return {}
+    
     def get_low_stock_products(self):
         """
         获取低库存商品
@@ -294,7 +888,7 @@ class InventoryManager:
         """
         try:
             self.cursor.execute('''
-            SELECT * FROM products 
+            SELECT * FROM product_details 
             WHERE stock <= min_stock
             ''')
             products = self.cursor.fetchall()
@@ -314,7 +908,9 @@ class InventoryManager:
         """
         try:
             self.cursor.execute('''
-            SELECT DISTINCT category FROM products
+            SELECT name FROM categories c
+            WHERE EXISTS (SELECT 1 FROM products p WHERE p.category_id = c.id)
+            ORDER BY name
             ''')
             return [row[0] for row in self.cursor.fetchall()]
         except Exception as e:
@@ -328,13 +924,222 @@ class InventoryManager:
         """
         try:
             self.cursor.execute('''
-            SELECT DISTINCT location FROM products
+            SELECT name FROM locations l
+            WHERE EXISTS (SELECT 1 FROM products p WHERE p.location_id = l.id)
+            ORDER BY name
             ''')
             return [row[0] for row in self.cursor.fetchall()]
         except Exception as e:
             self.logger.error(f"获取库存位置失败: {e}")
             return []
-    
+
+    def get_top_stock_products(self, top_n=10):
+        """
+        获取库存数量最多的商品
+        :param top_n: 返回的商品数量
+        :return: 商品列表（仅包含名称和库存）
+        """
+        try:
+            self.cursor.execute('''
+            SELECT name, stock FROM products
+            ORDER BY stock DESC
+            LIMIT ?
+            ''', (top_n,))
+            return [{'name': row[0], 'stock': row[1]} for row in self.cursor.fetchall()]
+        except Exception as e:
+            self.logger.error(f"获取库存TOP商品失败: {e}")
+            return []
+
+    def get_category_summary(self):
+        """
+        按类别汇总商品数量和库存总量
+        :return: 类别汇总列表，按商品数量降序
+        """
+        try:
+            self.cursor.execute('''
+            SELECT c.name AS category, s.product_count, s.total_stock
+            FROM (
+                SELECT category_id, COUNT(*) AS product_count, COALESCE(SUM(stock), 0) AS total_stock
+                FROM products
+                GROUP BY category_id
+            ) s
+            LEFT JOIN categories c ON c.id = s.category_id
+            ORDER BY s.product_count DESC
+            ''')
+            columns = [col[0] for col in self.cursor.description]
+            return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        except Exception as e:
+            self.logger.error(f"获取类别汇总失败: {e}")
+            return []
+
+    def take_stock_snapshot(self, kind='manual', as_of=None):
+        """
+        记录当前所有商品的库存快照（直接复制 products.stock，不回放库存历史）
+        :param kind: 快照类型（daily / monthly / archive / manual），清理旧快照时使用
+        :param as_of: 过去的时间点，指定时按 get_stock_as_of 计算该时刻的库存（用于归档）
+        :return: 快照ID，失败返回None
+        """
+        if as_of is not None:
+            return self._record_past_snapshot(kind, to_epoch(as_of))
+        try:
+            # 立即获取写锁，保证库存数量与历史记录水位一致
+            self.conn.commit()
+            self.cursor.execute("BEGIN IMMEDIATE")
+            self.cursor.execute('''
+            INSERT INTO stock_snapshots (taken_ts, history_id, kind)
+            SELECT ?, COALESCE(MAX(id), 0), ? FROM inventory_history
+            ''', (now_epoch(), kind))
+            snapshot_id = self.cursor.lastrowid
+            self.cursor.execute('''
+            INSERT INTO stock_snapshot_items (snapshot_id, product_id, stock)
+            SELECT ?, id, stock FROM products
+            ''', (snapshot_id,))
+            self.conn.commit()
+            self.logger.info(f"已记录库存快照 {snapshot_id}，商品数: {self.cursor.rowcount}")
+            return snapshot_id
+        except Exception as e:
+            self.logger.error(f"记录库存快照失败: {e}")
+            self.conn.rollback()
+            return None
+
+    def _record_past_snapshot(self, kind, as_of_ts):
+        stock = self.get_stock_as_of(as_of_ts)
+        if stock is None:
+            return None
+        try:
+            source = archive_source(self.conn, 'inventory_history', end_ts=as_of_ts)
+            self.cursor.execute(
+                f"SELECT COALESCE(MAX(id), 0) FROM {source} WHERE operation_ts <= ?", (as_of_ts,))
+            history_id = self.cursor.fetchone()[0]
+            self.cursor.execute(
+                "INSERT INTO stock_snapshots (taken_ts, history_id, kind) VALUES (?, ?, ?)",
+                (as_of_ts, history_id, kind))
+            snapshot_id = self.cursor.lastrowid
+            self.cursor.executemany(
+                "INSERT INTO stock_snapshot_items (snapshot_id, product_id, stock) VALUES (?, ?, ?)",
+                [(snapshot_id, product_id, amount) for product_id, amount in stock.items()])
+            self.conn.commit()
+            return snapshot_id
+        except Exception as e:
+            self.logger.error(f"记录库存快照失败: {e}")
+            self.conn.rollback()
+            return None
+
+    def prune_stock_snapshots(self, keep_days):
+        """
+        删除超过保留天数的每日快照（月度和手动快照永久保留）
+        :param keep_days: 每日快照保留天数
+        :return: 删除的快照数
+        """
+        try:
+            cutoff = now_epoch() - keep_days * 86400
+            self.cursor.execute('''
+            DELETE FROM stock_snapshot_items WHERE snapshot_id IN (
+                SELECT snapshot_id FROM stock_snapshots WHERE kind = 'daily' AND taken_ts < ?
+            )
+            ''', (cutoff,))
+            self.cursor.execute(
+                "DELETE FROM stock_snapshots WHERE kind = 'daily' AND taken_ts < ?", (cutoff,))
+            removed = self.cursor.rowcount
+            self.conn.commit()
+            return removed
+        except Exception as e:
+            self.logger.error(f"清理库存快照失败: {e}")
+            self.conn.rollback()
+            return 0
+
+    def get_stock_as_of(self, as_of, product_ids=None):
+        """
+        查询指定时间点的库存数量
+        从时间上最近的快照（或当前库存）出发，只回放两者之间的库存历史
+        :param as_of: 时间点（datetime / date / 字符串），只有日期时取当天结束时的库存
+        :param product_ids: 商品ID列表，默认全部商品
+        :return: {商品ID: 库存数量}，失败返回None
+        """
+        as_of_ts = to_epoch(as_of, end_of_day=True)
+        product_filter, filter_params = "", []
+        if product_ids:
+            product_filter = f" AND product_id IN ({', '.join('?' * len(product_ids))})"
+            filter_params = list(product_ids)
+        
+        try:
+            self.cursor.execute('''
+            SELECT snapshot_id, taken_ts, history_id FROM stock_snapshots
+            WHERE taken_ts <= ? ORDER BY taken_ts DESC LIMIT 1
+            ''', (as_of_ts,))
+            before = self.cursor.fetchone()
+            self.cursor.execute('''
+            SELECT snapshot_id, taken_ts, history_id FROM stock_snapshots
+            WHERE taken_ts > ? ORDER BY taken_ts LIMIT 1
+            ''', (as_of_ts,))
+            after = self.cursor.fetchone()
+            
+            signed = "CASE WHEN operation_type = 'in' THEN change_amount ELSE -change_amount END"
+            if before and (after is None or as_of_ts - before[1] <= after[1] - as_of_ts):
+                # 向后回放：快照之后、时间点之前的变动
+                base_query = "SELECT product_id, stock FROM stock_snapshot_items WHERE snapshot_id = ?"
+                base_params = [before[0]]
+                source = archive_source(self.conn, 'inventory_history', before[1], as_of_ts)
+                delta_query = f'''
+                SELECT product_id, SUM({signed}) FROM {source}
+                WHERE id > ? AND operation_ts <= ?{product_filter} GROUP BY product_id
+                '''
+                delta_params = [before[2], as_of_ts]
+            else:
+                # 向前回退：从之后的快照（没有则从当前库存）减去时间点之后的变动
+                if after:
+                    base_query = "SELECT product_id, stock FROM stock_snapshot_items WHERE snapshot_id = ?"
+                    base_params = [after[0]]
+                    watermark = " AND id <= ?"
+                    delta_params = [as_of_ts, after[2]]
+                else:
+                    base_query = "SELECT id AS product_id, stock FROM products WHERE 1=1"
+                    base_params = []
+                    watermark = ""
+                    delta_params = [as_of_ts]
+                source = archive_source(self.conn, 'inventory_history', as_of_ts, after[1] if after else None)
+                delta_query = f'''
+                SELECT product_id, -SUM({signed}) FROM {source}
+                WHERE operation_ts > ?{watermark}{product_filter} GROUP BY product_id
+                '''
+            
+            if product_ids:
+                base_query = f"SELECT * FROM ({base_query}) WHERE 1=1{product_filter}"
+            # 起点库存和变动合并为一条语句读取，避免两次读取之间有新的出入库提交导致结果不一致
+            self.cursor.execute(f'''
+            SELECT product_id, SUM(stock) FROM (
+                {base_query}
+                UNION ALL
+                {delta_query}
+            ) GROUP BY product_id
+            ''', base_params + filter_params + delta_params + filter_params)
+            return dict(self.cursor.fetchall())
+        except Exception as e:
+            self.logger.error(f"查询历史库存失败: {e}")
+            return None
+
+    def get_daily_movements(self, days=30):
+        """
+        按日期汇总出入库数量
+        :param days: 返回最近有记录的天数
+        :return: 每日汇总列表，按日期升序
+        """
+        try:
+            self.cursor.execute('''
+            SELECT substr(operation_time, 1, 10) AS day,
+                   SUM(CASE WHEN operation_type = 'in' THEN change_amount ELSE 0 END) AS in_amount,
+                   SUM(CASE WHEN operation_type = 'out' THEN change_amount ELSE 0 END) AS out_amount
+            FROM inventory_history
+            GROUP BY day
+            ORDER BY day DESC
+            LIMIT ?
+            ''', (days,))
+            columns = [col[0] for col in self.cursor.description]
+            return [dict(zip(columns, row)) for row in reversed(self.cursor.fetchall())]
+        except Exception as e:
+            self.logger.error(f"获取每日出入库汇总失败: {e}")
+            return []
+
     def close(self):
         """关闭数据库连接"""
         self.conn.close()
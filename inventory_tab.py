@@ -1,14 +1,17 @@
 import sys
+import uuid
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, 
-                             QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
+                             QLineEdit, QPushButton, QTableWidget,
                              QMessageBox, QComboBox, QHeaderView, QGroupBox)
-from PyQt5.QtGui import QIcon, QColor
+from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIntValidator
 from inventory_manager import InventoryManager
-from config import Config
+from scanner_input import ScannerInputFilter, ProductPickerMixin
+from barcode_scanner import BarcodeScanner
+from diagnostics import timed
 
-class InventoryTab(QWidget):
+class InventoryTab(ProductPickerMixin, QWidget):
     def __init__(self, operator_id):
         super().__init__()
         self.operator_id = operator_id
@@ -28,6 +31,9 @@ class InventoryTab(QWidget):
         # 搜索输入
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("输入商品名称或条形码")
+        # 扫码枪输入直接定位商品，不走名称搜索
+        self.scanner_filter = ScannerInputFilter(self.search_input)
+        self.scanner_filter.barcode_scanned.connect(self.select_product_by_barcode)
         
         # 类别下拉框
         self.category_combo = QComboBox()
@@ -81,6 +87,12 @@ class InventoryTab(QWidget):
         operation_layout.addRow("备注:", self.notes_input)
         operation_layout.addRow(self.operate_btn)
         
+        # 连续扫码收货
+        receive_btn = QPushButton("扫码收货")
+        receive_btn.setIcon(QIcon("resources/barcode.png"))
+        receive_btn.clicked.connect(self.receive_by_scan)
+        operation_layout.addRow(receive_btn)
+        
         operation_group.setLayout(operation_layout)
         
         main_layout.addWidget(search_group)
@@ -92,6 +104,7 @@ class InventoryTab(QWidget):
         # 加载初始数据
         self.load_products()
     
+    @timed('load_data')
     def load_products(self):
         search_term = self.search_input.text().strip()
         category = self.category_combo.currentText() if self.category_combo.currentIndex() > 0 else ""
@@ -105,21 +118,7 @@ class InventoryTab(QWidget):
             self.table.setRowCount(len(products))
             
             for row, product in enumerate(products):
-                # 状态判断
-                status = "正常" if product['stock'] > product['min_stock'] else "低库存"
-                status_color = Config.NORMAL_STOCK_COLOR if status == "正常" else Config.LOW_STOCK_COLOR
-                
-                # 填充数据
-                self.table.setItem(row, 0, QTableWidgetItem(str(product['id'])))
-                self.table.setItem(row, 1, QTableWidgetItem(product['name']))
-                self.table.setItem(row, 2, QTableWidgetItem(product['category']))
-                self.table.setItem(row, 3, QTableWidgetItem(product['location']))
-                self.table.setItem(row, 4, QTableWidgetItem(str(product['stock'])))
-                self.table.setItem(row, 5, QTableWidgetItem(str(product['min_stock'])))
-                
-                status_item = QTableWidgetItem(status)
-                status_item.setForeground(QColor(status_color))
-                self.table.setItem(row, 6, status_item)
+                self.fill_row(row, product)
     
     def product_selected(self, row, column):
         product_id = int(self.table.item(row, 0).text())
@@ -127,6 +126,8 @@ class InventoryTab(QWidget):
         current_stock = self.table.item(row, 4).text()
         
         self.selected_product_id = product_id
+        # 同一次操作重复点击提交时使用相同的标识，库存只变动一次
+        self.operation_key = uuid.uuid4().hex
         self.product_name_label.setText(product_name)
         self.current_stock_label.setText(current_stock)
         self.operate_btn.setEnabled(True)
@@ -153,7 +154,8 @@ class InventoryTab(QWidget):
                 self.selected_product_id,
                 quantity,
                 operation_type,
-                notes
+                notes,
+                idempotency_key=self.operation_key
             )
             
             if success:
@@ -170,4 +172,40 @@ class InventoryTab(QWidget):
         self.quantity_input.clear()
         self.notes_input.clear()
         self.operate_btn.setEnabled(False)
-        delattr(self, 'selected_product_id')
\ No newline at end of file
+        delattr(self, 'selected_product_id')
+    
+    def receive_by_scan(self):
+        """连续扫码收货：扫描结束后一次性批量入库"""
+        scanner = BarcodeScanner()
+        session = scanner.scan_session()
+        if not session.counts:
+            QMessageBox.information(self, "提示", "未扫描到条形码")
+            return
+        
+        with InventoryManager() as manager:
+            barcode_index = manager.get_barcode_index()
+            changes, unknown = session.resolve(barcode_index)
+            if not changes:
+                QMessageBox.warning(self, "失败", "扫描到的条形码均未匹配到商品")
+                return
+            
+            # 汇总确认信息
+            names = {product['id']: product['name'] for product in barcode_index.values()}
+            lines = [f"{names[product_id]} × {amount}" for product_id, amount in changes.items()]
+            if len(lines) > 20:
+                lines = lines[:20] + [f"……等共 {len(changes)} 种商品"]
+            message = f"共扫描 {session.total()} 件，将入库以下商品：\n" + "\n".join(lines)
+            if unknown:
+                message += f"\n\n未匹配的条形码（不入库）：{', '.join(unknown)}"
+            
+            reply = QMessageBox.question(self, "确认入库", message,
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+            
+            notes = self.notes_input.text().strip() or "扫码收货"
+            if manager.update_stock_batch(self.operator_id, changes, 'in', notes):
+                QMessageBox.information(self, "成功", f"已入库 {sum(changes.values())} 件商品")
+                self.load_products()
+            else:
+                QMessageBox.warning(self, "失败", "批量入库时出错")
\ No newline at end of file
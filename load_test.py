@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import random
+import shutil
+import sqlite3
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# 默认操作比例：操作名 -> 权重
+DEFAULT_MIX = {
+    'stock_in': 30,
+    'stock_out': 20,
+    'search': 35,
+    'history': 10,
+    'report': 5,
+}
+
+
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        """统计各线程记录的数据库错误（管理类在内部捕获异常，只能从日志中识别）"""
+        super().__init__(logging.ERROR)
+        self.counts = defaultdict(Counter)
+
+    def emit(self, record):
+        message = record.getMessage()
+        if 'locked' in message or 'busy' in message:
+            kind = 'busy'
+        elif '库存数量不能为负数' in message:
+            kind = 'rejected'
+        else:
+            kind = 'error'
+        self.counts[record.thread][kind] += 1
+
+    def take(self):
+        """取出并清零当前线程的计数"""
+        return self.counts.pop(threading.get_ident(), Counter())
+
+
+_error_counter = None
+
+
+def _install_error_counter():
+    global _error_counter
+    if _error_counter is None:
+        _error_counter = ErrorCounter()
+        root = logging.getLogger()
+        root.handlers = [_error_counter]
+        root.setLevel(logging.ERROR)
+    return _error_counter
+
+
+def parse_mix(text):
+    """
+    解析操作比例，例如 "stock_in=30,search=60,report=10"
+    :return: 操作名 -> 权重
+    """
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"未知的操作: {name}")
+        mix[name] = int(weight)
+    return mix
+
+
+def run_clerk(clerk_id, db_path, run_tag, mix, duration, start_at, hot_products, think_ms, seed):
+    """
+    模拟一个收银/仓库终端，在指定时间内按比例执行操作
+    :param clerk_id: 终端编号
+    :param db_path: 数据库文件路径
+    :param run_tag: 本次测试写入库存历史备注的标记
+    :param mix: 操作比例
+    :param duration: 持续时间（秒）
+    :param start_at: 统一开始时间（time.time()），保证各终端同时开始
+    :param hot_products: 参与出入库的商品ID列表
+    :param think_ms: 两次操作之间的间隔（毫秒）
+    :param seed: 随机种子
+    :return: 该终端的统计结果
+    """
+    from inventory_manager import InventoryManager
+    from db_retry import retry_stats
+
+    counter = _install_error_counter()
+    rng = random.Random(seed + clerk_id)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    manager = InventoryManager(db_path)
+    operator_ids = [row[0] for row in manager.conn.execute("SELECT id FROM users")]
+    categories = manager.get_all_categories()
+    terms = [row[0][2:4] for row in manager.conn.execute("SELECT name FROM products LIMIT 200")]
+    history_start = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    counter.take()
+
+    latencies = defaultdict(list)
+    outcomes = defaultdict(Counter)
+    net_changes = Counter()
+    notes = f"{run_tag} clerk-{clerk_id}"
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + duration
+    while time.time() < deadline:
+        op = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        if op in ('stock_in', 'stock_out'):
+            product_id = rng.choice(hot_products)
+            amount = rng.randint(1, 3)
+            operation_type = 'in' if op == 'stock_in' else 'out'
+            ok = manager.update_stock(rng.choice(operator_ids), product_id, amount, operation_type, notes)
+            if ok:
+                net_changes[product_id] += amount if operation_type == 'in' else -amount
+        elif op == 'search':
+            if rng.random() < 0.5:
+                ok = manager.search_products(search_term=rng.choice(terms)) is not None
+            else:
+                ok = manager.search_products(category=rng.choice(categories)) is not None
+        elif op == 'history':
+            ok = manager.get_inventory_history(product_id=rng.choice(hot_products)) is not None
+        else:
+            # 报表任务在后台进程中以只读连接读取数据
+            with InventoryManager(db_path, read_only=True) as reader:
+                rows = sum(1 for _ in reader.iter_inventory_history(start_date=history_start))
+                ok = bool(reader.get_category_summary()) or rows >= 0
+        latencies[op].append(time.perf_counter() - started)
+
+        errors = counter.take()
+        if errors['busy']:
+            outcomes[op]['busy'] += 1
+        elif errors['rejected']:
+            outcomes[op]['rejected'] += 1
+        elif not ok or errors['error']:
+            outcomes[op]['error'] += 1
+        else:
+            outcomes[op]['ok'] += 1
+
+        if think_ms:
+            time.sleep(rng.uniform(0, 2 * think_ms) / 1000)
+
+    manager.close()
+    return {
+        'clerk_id': clerk_id,
+        'latencies': dict(latencies),
+        'outcomes': {op: dict(counts) for op, counts in outcomes.items()},
+        'net_changes': dict(net_changes),
+        'retries': retry_stats.snapshot(),
+    }
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+
+    def pick(q):
+        return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 3)
+
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def check_consistency(db_path, run_tag, initial_stock, net_changes, writes_ok):
+    """
+    检查丢失的更新：实际库存应等于初始库存加上所有成功写入的变动
+    :return: 一致性检查结果
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        product_ids = list(initial_stock)
+        placeholders = ",".join("?" * len(product_ids))
+        actual = dict(conn.execute(f"SELECT id, stock FROM products WHERE id IN ({placeholders})", product_ids))
+        history_rows = conn.execute("SELECT COUNT(*) FROM inventory_history WHERE notes LIKE ?",
+                                    (f"{run_tag} %",)).fetchone()[0]
+    finally:
+        conn.close()
+
+    mismatched = {}
+    for product_id, stock in initial_stock.items():
+        expected = stock + net_changes.get(product_id, 0)
+        if actual.get(product_id) != expected:
+            mismatched[product_id] = {'expected': expected, 'actual': actual.get(product_id)}
+    return {
+        'lost_updates': len(mismatched),
+        'stock_drift': sum(abs(item['actual'] - item['expected']) for item in mismatched.values()),
+        'mismatched_products': dict(list(mismatched.items())[:20]),
+        'successful_writes': writes_ok,
+        'history_rows': history_rows,
+        'history_mismatch': history_rows - writes_ok,
+    }
+
+
+def run_load_test(db_path, clerks=4, duration=30, mix=None, use_threads=False,
+                  hot=50, think_ms=0, seed=42):
+    """
+    执行并发负载测试
+    :param db_path: 数据库文件路径（会被写入）
+    :param clerks: 并发终端数量
+    :param duration: 持续时间（秒）
+    :param mix: 操作比例，默认 DEFAULT_MIX
+    :param use_threads: 使用线程代替进程模拟终端
+    :param hot: 参与出入库的热点商品数量，越少冲突越多
+    :param think_ms: 每次操作之间的平均间隔（毫秒）
+    :param seed: 随机种子
+    :return: 测试结果字典
+    """
+    from inventory_manager import InventoryManager
+    from db_retry import retry_stats
+
+    mix = mix or DEFAULT_MIX
+    # 先在主进程中完成表结构升级，避免各终端同时升级
+    with InventoryManager(db_path) as manager:
+        rows = manager.conn.execute("SELECT id, stock FROM products ORDER BY RANDOM() LIMIT ?", (hot,)).fetchall()
+    initial_stock = dict(rows)
+    hot_products = list(initial_stock)
+    if not hot_products:
+        raise ValueError("数据库中没有商品")
+
+    run_tag = f"load-test {datetime.now().strftime('%Y%m%d%H%M%S')}"
+    retry_stats.reset()
+    start_at = time.time() + 1.0 + clerks * 0.05
+    executor_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with executor_class(max_workers=clerks) as executor:
+        futures = [executor.submit(run_clerk, clerk_id, db_path, run_tag, mix, duration, start_at,
+                                   hot_products, think_ms, seed)
+                   for clerk_id in range(clerks)]
+        results = [future.result() for future in futures]
+    elapsed = time.time() - start_at
+
+    latencies = defaultdict(list)
+    outcomes = defaultdict(Counter)
+    net_changes = Counter()
+    for result in results:
+        for op, samples in result['latencies'].items():
+            latencies[op].extend(samples)
+        for op, counts in result['outcomes'].items():
+            outcomes[op].update(counts)
+        net_changes.update(result['net_changes'])
+
+    # 线程模式下各终端共用本进程的重试统计，进程模式下各终端分别统计
+    retries = Counter()
+    for snapshot in [retry_stats.snapshot()] if use_threads else [result['retries'] for result in results]:
+        for stats in snapshot.values():
+            retries.update({key: stats[key] for key in ('retries', 'recovered', 'exhausted')})
+
+    total_ops = sum(len(samples) for samples in latencies.values())
+    writes_ok = outcomes['stock_in']['ok'] + outcomes['stock_out']['ok']
+    return {
+        'meta': {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'db_path': db_path,
+            'clerks': clerks,
+            'mode': 'threads' if use_threads else 'processes',
+            'duration': round(elapsed, 2),
+            'mix': mix,
+            'hot_products': len(hot_products),
+            'think_ms': think_ms,
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'throughput': round(total_ops / elapsed, 1) if elapsed > 0 else 0.0,
+        'write_throughput': round(writes_ok / elapsed, 1) if elapsed > 0 else 0.0,
+        'operations': {
+            op: dict(_percentiles(samples), **{key: outcomes[op].get(key, 0)
+                                                for key in ('ok', 'busy', 'rejected', 'error')})
+            for op, samples in latencies.items()
+        },
+        'busy': sum(counts['busy'] for counts in outcomes.values()),
+        'retries': {key: retries[key] for key in ('retries', 'recovered', 'exhausted')},
+        'consistency': check_consistency(db_path, run_tag, initial_stock, net_changes, writes_ok),
+    }
+
+
+def print_report(result):
+    meta = result['meta']
+    print(f"终端数: {meta['clerks']}（{meta['mode']}），持续 {meta['duration']} 秒，热点商品 {meta['hot_products']} 个")
+    print(f"吞吐量: {result['throughput']} 次/秒，写入: {result['write_throughput']} 次/秒，"
+          f"数据库忙: {result['busy']} 次")
+    retries = result['retries']
+    print(f"锁等待重试: {retries['retries']} 次，重试后成功 {retries['recovered']} 次，"
+          f"重试用尽 {retries['exhausted']} 次")
+    print(f"{'操作':<12}{'次数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}"
+          f"{'忙':>6}{'拒绝':>6}{'错误':>6}")
+    for op, stats in sorted(result['operations'].items()):
+        print(f"{op:<12}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}"
+              f"{stats['busy']:>6}{stats['rejected']:>6}{stats['error']:>6}")
+    consistency = result['consistency']
+    print(f"丢失更新: {consistency['lost_updates']} 个商品（库存偏差 {consistency['stock_drift']}），"
+          f"成功写入 {consistency['successful_writes']} 次，历史记录 {consistency['history_rows']} 条")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多终端并发负载测试")
+    parser.add_argument('--db', help="数据库文件（默认复制一份副本测试，不修改原文件）")
+    parser.add_argument('--in-place', action='store_true', help="直接在 --db 指定的文件上测试")
+    parser.add_argument('--products', type=int, default=1000, help="未指定 --db 时生成的商品数量")
+    parser.add_argument('--history', type=int, default=20000, help="未指定 --db 时生成的库存历史数量")
+    parser.add_argument('--clerks', '-n', type=int, default=4, help="并发终端数量")
+    parser.add_argument('--duration', '-d', type=float, default=30, help="持续时间（秒）")
+    parser.add_argument('--mix', type=parse_mix, help="操作比例，如 stock_in=30,stock_out=20,search=50")
+    parser.add_argument('--threads', action='store_true', help="使用线程代替进程")
+    parser.add_argument('--hot', type=int, default=50, help="参与出入库的热点商品数量")
+    parser.add_argument('--think-ms', type=float, default=0, help="每次操作之间的平均间隔（毫秒）")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--output', '-o', help="结果文件（JSON）")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    try:
+        if args.db and args.in_place:
+            db_path = args.db
+        else:
+            db_path = os.path.join(work_dir, 'inventory.db')
+            if args.db:
+                from sample_data import copy_database
+                copy_database(args.db, db_path)
+            else:
+                from sample_data import generate_database
+                generate_database(db_path, products=args.products, history=args.history, seed=args.seed)
+
+        result = run_load_test(db_path, args.clerks, args.duration, args.mix, args.threads,
+                               args.hot, args.think_ms, args.seed)
+        print_report(result)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"结果已保存: {args.output}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
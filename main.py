@@ -1,11 +1,16 @@
 # main.py
 import sys
 import os
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from ui.login_window import LoginWindow
 from database import init_database, get_db_path  # 导入初始化函数和路径获取函数
+from metrics import start_exporters
 
 if __name__ == "__main__":
+    # 打包后的程序需要支持报表子进程
+    multiprocessing.freeze_support()
+    
     # 获取数据库路径
     db_path = get_db_path()
     
@@ -16,6 +21,9 @@ if __name__ == "__main__":
     else:
         print(f"数据库已存在: {db_path}")
     
+    # 按配置启动运行指标导出（HTTP端口 / JSON文件）
+    start_exporters()
+    
     app = QApplication(sys.argv)
     window = LoginWindow()
     window.show()
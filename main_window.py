@@ -9,6 +9,7 @@ from ui.inventory_tab import InventoryTab
 from ui.report_tab import ReportTab
 from ui.search_tab import SearchTab
 from ui.outbound_tab import OutboundTab
+from ui.diagnostics_tab import DiagnosticsTab
 from audit_logger import AuditLogger
 from functools import partial
 from config import Config   
@@ -53,7 +54,10 @@ class MainWindow(QMainWindow):
             self.inventory_tab = InventoryTab(self.user_id)
             self.tabs.addTab(self.product_tab, "商品管理")
             self.tabs.addTab(self.inventory_tab, "库存操作")
-            self.tabs.addTab(ReportTab(), "报表管理")
+            self.report_tab = ReportTab()
+            self.tabs.addTab(self.report_tab, "报表管理")
+            self.diagnostics_tab = DiagnosticsTab(self.user_id)
+            self.tabs.addTab(self.diagnostics_tab, "性能诊断")
         elif self.role == 'store_keeper':
             self.product_tab = ProductTab(self.user_id)
             self.inventory_tab = InventoryTab(self.user_id)
@@ -112,15 +116,8 @@ class MainWindow(QMainWindow):
     def generate_report(self):
         """生成报告"""
         if self.role == 'admin':
-            # 获取报表标签页并生成报告
-            report_tab = None
-            for i in range(self.tabs.count()):
-                if isinstance(self.tabs.widget(i), ReportTab):
-                    report_tab = self.tabs.widget(i)
-                    break
-            
-            if report_tab:
-                report_tab.generate_report()
+            # 提交到报表标签页的后台任务队列，不阻塞界面
+            self.report_tab.generate_report()
     
     def show_about(self):
         """显示关于信息"""
@@ -152,6 +149,11 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, event):
         """窗口关闭事件"""
+        # 停止后台报表任务，等待数据库优化结束
+        if self.role == 'admin':
+            self.report_tab.shutdown()
+            self.diagnostics_tab.shutdown()
+        
         # 记录登出日志
         with AuditLogger() as logger:
             logger.log_action(
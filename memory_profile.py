@@ -0,0 +1,284 @@
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import platform
+import importlib
+import tracemalloc
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计进程常驻内存
+    resource = None
+
+# 分析场景：名称 -> (类型, 参数)
+# 标签页通过 main_window 相同的模块路径导入，需要 PyQt5；图表需要 matplotlib
+# 标签页参数为 (模块, 类名, 构造参数, 加载数据的方法)
+SCENARIOS = {
+    'data.search_products': ('data', 'search_products'),
+    'data.inventory_history': ('data', 'get_inventory_history'),
+    'tab.ProductTab.load_data': ('tab', ('ui.product_tab', 'ProductTab', (1,), 'load_data')),
+    'tab.InventoryTab.load_products': ('tab', ('ui.inventory_tab', 'InventoryTab', (1,), 'load_products')),
+    'tab.SearchTab.load_data': ('tab', ('ui.search_tab', 'SearchTab', (), 'load_data')),
+    'tab.OutboundTab.load_data': ('tab', ('ui.outbound_tab', 'OutboundTab', (1,), 'load_data')),
+    'tab.ReportTab.refresh_chart': ('tab', ('ui.report_tab', 'ReportTab', (), 'refresh_chart')),
+    'chart.stock_levels': ('chart', 'stock_levels'),
+    'chart.category_distribution': ('chart', 'category_distribution'),
+    'chart.in_out_trend': ('chart', 'in_out_trend'),
+    'report.inventory': ('report', 'generate_inventory_report'),
+    'report.transactions': ('report', 'generate_transaction_report'),
+}
+
+
+class ScenarioSkipped(Exception):
+    """运行环境缺少场景所需的可选依赖"""
+
+
+def _rss_mb():
+    """进程迄今为止的最大常驻内存（MB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为KB
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _prepare(kind, target, work_dir):
+    """
+    创建场景所需的对象（不计入内存统计）
+    :return: 被测函数（无参数，返回值在释放前计入保留内存）
+    """
+    db_path = os.path.join(work_dir, 'inventory.db')
+    if kind == 'data':
+        from inventory_manager import InventoryManager
+        manager = InventoryManager(db_path)
+        return lambda: getattr(manager, target)()
+
+    if kind == 'tab':
+        module_name, class_name, args, method = target
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        try:
+            from PyQt5.QtWidgets import QApplication
+            tab_class = getattr(importlib.import_module(module_name), class_name)
+        except ImportError as e:
+            raise ScenarioSkipped(str(e))
+        _prepare.app = QApplication.instance() or QApplication([])
+        # 标签页在构造时已加载一次数据，先清空表格（报表页等待首次图表渲染结束），再单独测量
+        tab = tab_class(*args)
+        chart = getattr(tab, 'chart', None)
+        if chart is not None:
+            chart.shutdown()
+        else:
+            tab.table.setRowCount(0)
+        gc.collect()
+        load = getattr(tab, method)
+
+        def run():
+            load()
+            # 图表在后台线程渲染，等待渲染结果送回界面线程
+            while chart is not None and chart.is_busy():
+                _prepare.app.processEvents()
+                time.sleep(0.01)
+            return tab
+        return run
+
+    if kind == 'chart':
+        try:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from charts import load_chart_data, draw_chart
+        except ImportError as e:
+            raise ScenarioSkipped(str(e))
+
+        def render():
+            figure = Figure(figsize=(10, 6), dpi=100)
+            canvas = FigureCanvasAgg(figure)
+            draw_chart(figure.add_subplot(111), target, load_chart_data(target, db_path))
+            canvas.draw()
+            return canvas.buffer_rgba()
+        return render
+
+    if kind == 'report':
+        try:
+            from report_generator import ReportGenerator
+        except ImportError as e:
+            raise ScenarioSkipped(str(e))
+        generator = ReportGenerator(os.path.join(work_dir, 'reports'), db_path=db_path, read_only=True)
+        generator.cache = None  # 测量生成过程，不使用缓存
+        return lambda: getattr(generator, target)(Config.SCHEDULER_OPERATOR_ID)
+
+    raise ValueError(f"未知的场景类型: {kind}")
+
+
+def _top_sites(snapshot, baseline, limit):
+    stats = snapshot.compare_to(baseline, 'traceback')
+    sites = []
+    for stat in stats[:limit]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[-1] if stat.traceback else None
+        sites.append({
+            'site': f"{frame.filename}:{frame.lineno}" if frame else "?",
+            'size_kb': round(stat.size_diff / 1024, 1),
+            'count': stat.count_diff,
+            'traceback': [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+        })
+    return sites
+
+
+def profile_scenario(name, template, frames=5, top=10):
+    """
+    在独立子进程中测量单个场景的内存
+    :param name: 场景名称
+    :param template: 测试数据库模板路径
+    :param frames: 记录的调用栈深度
+    :param top: 每个场景输出的分配位置数量
+    :return: 测量结果字典
+    """
+    logging.basicConfig(level=logging.WARNING)
+    kind, target = SCENARIOS[name]
+    work_dir = tempfile.mkdtemp(prefix="memory_profile_")
+    cwd = os.getcwd()
+    try:
+        from sample_data import copy_database
+        copy_database(template, os.path.join(work_dir, 'inventory.db'))
+        # 标签页使用默认数据库路径
+        os.chdir(work_dir)
+        try:
+            func = _prepare(kind, target, work_dir)
+        except ScenarioSkipped as e:
+            return {'scenario': name, 'skipped': str(e)}
+
+        rss_before = _rss_mb()
+        gc.collect()
+        tracemalloc.start(frames)
+        baseline = tracemalloc.take_snapshot()
+        base_current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        held_current, peak = tracemalloc.get_traced_memory()
+        held_snapshot = tracemalloc.take_snapshot()
+        del result
+        gc.collect()
+        retained_current, _ = tracemalloc.get_traced_memory()
+        retained_snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        return {
+            'scenario': name,
+            'peak_mb': round((peak - base_current) / 1024 / 1024, 2),
+            'held_mb': round((held_current - base_current) / 1024 / 1024, 2),
+            'retained_mb': round((retained_current - base_current) / 1024 / 1024, 2),
+            'rss_before_mb': rss_before,
+            'rss_peak_mb': _rss_mb(),
+            # 跟踪内存分配会使执行明显变慢（报表生成约慢十倍），耗时仅供参考
+            'traced_seconds': round(elapsed, 2),
+            'top_held': _top_sites(held_snapshot, baseline, top),
+            'top_retained': _top_sites(retained_snapshot, baseline, top),
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _budget(name):
+    """按场景名称的最长前缀查找内存预算（MB）"""
+    parts = name.split('.')
+    for length in range(len(parts), 0, -1):
+        budget = Config.MEMORY_BUDGET_MB.get('.'.join(parts[:length]))
+        if budget is not None:
+            return budget
+    return None
+
+
+def run_profile(sizes, scenarios, cache_dir, frames=5, top=10, seed=42):
+    """
+    在各个商品规模下测量全部场景（每个场景使用独立子进程，互不影响）
+    :param sizes: [(商品数量, 库存历史数量)]
+    :param scenarios: 场景名称列表
+    :param cache_dir: 测试数据库缓存目录
+    :return: 测量结果字典
+    """
+    from sample_data import generate_database
+
+    os.makedirs(cache_dir, exist_ok=True)
+    results = {
+        'meta': {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'frames': frames,
+        },
+        'runs': [],
+    }
+    for products, history in sizes:
+        template = os.path.abspath(os.path.join(cache_dir, f"memory_{products}_{history}_{seed}.db"))
+        if not os.path.exists(template):
+            print(f"生成测试数据库: 商品 {products}, 库存历史 {history}")
+            generate_database(template, products=products, history=history, seed=seed)
+        for name in scenarios:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(profile_scenario, name, template, frames, top).result()
+            result.update({'products': products, 'history': history})
+            if 'skipped' not in result:
+                result['budget_mb'] = _budget(name)
+                result['over_budget'] = result['budget_mb'] is not None and result['peak_mb'] > result['budget_mb']
+            results['runs'].append(result)
+            _print_result(result)
+    return results
+
+
+def _print_result(result):
+    label = f"[商品 {result['products']}] {result['scenario']}"
+    if 'skipped' in result:
+        print(f"{label}: 跳过（{result['skipped']}）")
+        return
+    budget = f"，预算 {result['budget_mb']} MB" if result['budget_mb'] is not None else ""
+    flag = " 超出预算" if result['over_budget'] else ""
+    print(f"{label}: 峰值 {result['peak_mb']} MB，持有 {result['held_mb']} MB，"
+          f"释放后保留 {result['retained_mb']} MB{budget}{flag}")
+    for site in result['top_held'][:3]:
+        print(f"    {site['size_kb']:>10.1f} KB  {site['count']:>8} 个  {site['site']}")
+
+
+def _parse_size(text):
+    products, _, history = text.partition(':')
+    return int(products), int(history) if history else int(products) * 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大商品量下的内存占用分析（tracemalloc）")
+    parser.add_argument('--sizes', nargs='+', type=_parse_size, default=[(10000, 200000)],
+                        help="商品数量[:库存历史数量]，默认 10000:200000")
+    parser.add_argument('--scenarios', nargs='+', help="只分析名称以指定前缀开头的场景")
+    parser.add_argument('--frames', type=int, default=5, help="记录的调用栈深度")
+    parser.add_argument('--top', type=int, default=10, help="每个场景输出的分配位置数量")
+    parser.add_argument('--cache-dir', default='.benchmark', help="测试数据库缓存目录")
+    parser.add_argument('--output', '-o', help="结果文件（JSON），默认 memory_<时间>.json")
+    parser.add_argument('--enforce', action='store_true', help="存在超出 Config.MEMORY_BUDGET_MB 的场景时返回非零退出码")
+    args = parser.parse_args()
+
+    scenarios = [name for name in SCENARIOS
+                 if not args.scenarios or any(name.startswith(prefix) for prefix in args.scenarios)]
+    results = run_profile(args.sizes, scenarios, args.cache_dir, args.frames, args.top)
+    output = args.output or f"memory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+    if args.enforce and any(run.get('over_budget') for run in results['runs']):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
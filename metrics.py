@@ -0,0 +1,341 @@
+import os
+import json
+import time
+import bisect
+import inspect
+import logging
+import sqlite3
+import functools
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import Config
+
+# 默认耗时分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger('metrics')
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"标签不匹配: 需要 {labelnames}，实际 {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        计数器（只增不减）
+        :param name: 指标名称
+        :param documentation: 说明
+        :param labelnames: 标签名称
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labelnames, key)), 'value': value}
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        直方图：按分桶统计耗时分布
+        :param name: 指标名称
+        :param documentation: 说明
+        :param labelnames: 标签名称
+        :param buckets: 分桶上限（升序）
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数（最后一个为 +Inf）, 总和, 次数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labelnames, key)), 'count': state[2], 'sum': round(state[1], 6),
+                     'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], state[0]))}
+                    for key, state in sorted(self._values.items())]
+
+
+class Registry:
+    def __init__(self):
+        """指标注册表"""
+        self.metrics = []
+        self.started_at = time.time()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render_prometheus(self):
+        """生成 Prometheus 文本格式"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """生成可序列化为JSON的快照"""
+        return {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'metrics': {metric.name: metric.snapshot() for metric in self.metrics},
+        }
+
+
+REGISTRY = Registry()
+
+STOCK_MOVEMENTS = REGISTRY.register(Counter(
+    'inventory_stock_movements_total', "出入库操作次数", ('mode', 'type', 'result')))
+STOCK_MOVEMENT_SECONDS = REGISTRY.register(Histogram(
+    'inventory_stock_movement_seconds', "出入库操作耗时（秒）", ('mode', 'type')))
+SEARCH_SECONDS = REGISTRY.register(Histogram(
+    'inventory_search_seconds', "查询耗时（秒）", ('kind',)))
+REPORTS = REGISTRY.register(Counter(
+    'inventory_report_generations_total', "报表生成次数", ('report_type', 'result')))
+REPORT_SECONDS = REGISTRY.register(Histogram(
+    'inventory_report_generation_seconds', "报表生成耗时（秒）", ('report_type',)))
+REPORT_CACHE_HITS = REGISTRY.register(Counter(
+    'inventory_report_cache_hits_total', "报表缓存命中次数"))
+AUDIT_WRITES = REGISTRY.register(Counter(
+    'inventory_audit_writes_total', "审计日志写入次数", ('result',)))
+AUDIT_WRITE_SECONDS = REGISTRY.register(Histogram(
+    'inventory_audit_write_seconds', "审计日志写入耗时（秒）"))
+DB_BUSY = REGISTRY.register(Counter(
+    'inventory_db_busy_total', "数据库被锁定（SQLITE_BUSY）的次数", ('component',)))
+DB_RETRIES = REGISTRY.register(Counter(
+    'inventory_db_retries_total', "锁等待重试结果（recovered 重试后成功 / exhausted 重试用尽）",
+    ('component', 'result')))
+WRITE_BATCH_SIZE = REGISTRY.register(Histogram(
+    'inventory_write_batch_size', "每次合并提交的写操作数", buckets=(1, 2, 5, 10, 20, 50, 100, 200)))
+
+
+def observe(histogram, counter=None, label_args=None, **labels):
+    """
+    装饰器：记录函数耗时，并按返回值（真/假）或异常统计成功/失败次数
+    :param histogram: 耗时直方图
+    :param counter: 次数计数器（带 result 标签），None表示不计数
+    :param label_args: 从函数参数取值的标签：标签名 -> 参数名
+    :param labels: 固定标签
+    """
+    label_args = label_args or {}
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            values = dict(labels)
+            if label_args:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                values.update({name: bound.arguments[arg] for name, arg in label_args.items()})
+            started = time.perf_counter()
+            result = 'failed'
+            try:
+                value = func(*args, **kwargs)
+                result = 'ok' if value else 'failed'
+                return value
+            finally:
+                histogram.observe(time.perf_counter() - started, **values)
+                if counter is not None:
+                    counter.inc(result=result, **values)
+        return wrapper
+    return decorator
+
+
+def record_db_error(component, error):
+    """
+    统计数据库错误中的锁等待超时（database is locked / busy）
+    :param component: 组件名称
+    :param error: 捕获的异常
+    """
+    if isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error)):
+        DB_BUSY.inc(component=component)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = REGISTRY.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body = json.dumps(REGISTRY.snapshot(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求频繁，不写入日志
+        pass
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """
+    在后台线程中提供 /metrics（Prometheus文本格式）和 /metrics.json
+    :param port: 端口
+    :param host: 监听地址，默认只允许本机访问
+    :return: HTTP服务对象，启动失败返回None
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"启动指标HTTP服务失败: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"指标HTTP服务已启动: http://{host}:{port}/metrics")
+    return server
+
+
+class JsonMetricsWriter:
+    def __init__(self, file_path, interval=60, keep_days=7):
+        """
+        定期将指标快照写入JSON文件，日期变化时将前一天的文件改名为 <文件名>.<日期>
+        :param file_path: JSON文件路径
+        :param interval: 写入间隔（秒）
+        :param keep_days: 保留的历史文件天数
+        """
+        self.file_path = file_path
+        self.interval = interval
+        self.keep_days = keep_days
+        self._stop = threading.Event()
+        self._thread = None
+        self._date = None
+
+    def write(self):
+        """写入一次快照（先写临时文件再替换，读取方不会看到半个文件）"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self._date and self._date != today and os.path.exists(self.file_path):
+            self._rotate(self._date)
+        self._date = today
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(REGISTRY.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.file_path)
+
+    def _rotate(self, date):
+        os.replace(self.file_path, f"{self.file_path}.{date}")
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        prefix = os.path.basename(self.file_path) + "."
+        rotated = sorted(name for name in os.listdir(directory)
+                         if name.startswith(prefix) and not name.endswith('.tmp'))
+        for name in rotated[:max(0, len(rotated) - self.keep_days)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                logger.error(f"删除过期指标文件失败: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                logger.error(f"写入指标文件失败: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-json", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止定期写入，并写入最后一次快照"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.write()
+
+
+def start_exporters():
+    """
+    按配置启动指标导出（Config.METRICS_HTTP_PORT / Config.METRICS_JSON_FILE）
+    :return: (HTTP服务, JSON写入器)，未启用的为None
+    """
+    server = start_http_server(Config.METRICS_HTTP_PORT) if Config.METRICS_HTTP_PORT else None
+    writer = None
+    if Config.METRICS_JSON_FILE:
+        writer = JsonMetricsWriter(Config.METRICS_JSON_FILE, Config.METRICS_JSON_INTERVAL,
+                                   Config.METRICS_JSON_KEEP_DAYS).start()
+    return server, writer
+
+
+if __name__ == "__main__":
+    # 测试代码：提供HTTP服务，可用 curl http://127.0.0.1:9464/metrics 查看
+    logging.basicConfig(level=logging.INFO)
+    # 以脚本方式运行时，管理类使用的是 metrics 模块中的注册表
+    import metrics
+    from inventory_manager import InventoryManager
+
+    with InventoryManager() as manager:
+        manager.search_products()
+        manager.get_inventory_history()
+    metrics.start_http_server(Config.METRICS_HTTP_PORT or 9464)
+    print(metrics.REGISTRY.render_prometheus())
+    threading.Event().wait()
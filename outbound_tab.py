@@ -1,12 +1,14 @@
+import uuid
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, 
-                             QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
+                             QLineEdit, QPushButton, QTableWidget,
                              QComboBox, QHeaderView, QGroupBox, QMessageBox)
-from PyQt5.QtGui import QColor, QIcon, QIntValidator
+from PyQt5.QtGui import QIcon, QIntValidator
 from PyQt5.QtCore import Qt
 from inventory_manager import InventoryManager
-from config import Config
+from scanner_input import ScannerInputFilter, ProductPickerMixin
+from diagnostics import timed
 
-class OutboundTab(QWidget):
+class OutboundTab(ProductPickerMixin, QWidget):
     def __init__(self, user_id):
         super().__init__()
         self.user_id = user_id
@@ -21,6 +23,9 @@ class OutboundTab(QWidget):
         
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("输入商品名称或条形码")
+        # 扫码枪输入直接定位商品，不走名称搜索
+        self.scanner_filter = ScannerInputFilter(self.search_input)
+        self.scanner_filter.barcode_scanned.connect(self.select_product_by_barcode)
         search_btn = QPushButton("搜索")
         search_btn.clicked.connect(self.load_data)
         
@@ -75,6 +80,7 @@ class OutboundTab(QWidget):
         
         self.setLayout(main_layout)
     
+    @timed('load_data')
     def load_data(self):
         search_term = self.search_input.text().strip()
         
@@ -84,21 +90,7 @@ class OutboundTab(QWidget):
             self.table.setRowCount(len(products))
             
             for row, product in enumerate(products):
-                # 状态判断
-                status = "正常" if product['stock'] > product['min_stock'] else "低库存"
-                status_color = Config.NORMAL_STOCK_COLOR if status == "正常" else Config.LOW_STOCK_COLOR
-                
-                # 填充数据
-                self.table.setItem(row, 0, QTableWidgetItem(str(product['id'])))
-                self.table.setItem(row, 1, QTableWidgetItem(product['name']))
-                self.table.setItem(row, 2, QTableWidgetItem(product['category']))
-                self.table.setItem(row, 3, QTableWidgetItem(product['location']))
-                self.table.setItem(row, 4, QTableWidgetItem(str(product['stock'])))
-                self.table.setItem(row, 5, QTableWidgetItem(str(product['min_stock'])))
-                
-                status_item = QTableWidgetItem(status)
-                status_item.setForeground(QColor(status_color))
-                self.table.setItem(row, 6, status_item)
+                self.fill_row(row, product)
     
     def product_selected(self, row, column):
         product_id = int(self.table.item(row, 0).text())
@@ -106,6 +98,8 @@ class OutboundTab(QWidget):
         current_stock = self.table.item(row, 4).text()
         
         self.selected_product_id = product_id
+        # 同一次操作重复点击提交时使用相同的标识，库存只变动一次
+        self.operation_key = uuid.uuid4().hex
         self.product_name_label.setText(product_name)
         self.current_stock_label.setText(current_stock)
         self.outbound_btn.setEnabled(True)
@@ -138,7 +132,8 @@ class OutboundTab(QWidget):
                 self.selected_product_id,  # 商品ID
                 quantity,  # 出库数量
                 "out",  # 操作类型
-                full_notes  # 备注
+                full_notes,  # 备注
+                idempotency_key=self.operation_key
             )
             
             if success:
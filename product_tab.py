@@ -1,14 +1,15 @@
-import os
 import sys
 from functools import partial
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, 
                              QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
                              QMessageBox, QFileDialog, QComboBox, QHeaderView, QTabWidget)
-from PyQt5.QtGui import QPixmap, QImage, QIcon, QColor
+from PyQt5.QtGui import QIcon, QColor
 from PyQt5.QtCore import Qt, QSize
 from inventory_manager import InventoryManager
 from barcode_scanner import BarcodeScanner
+from image_store import ImageStore, load_pixmap
 from config import Config
+from diagnostics import timed
 
 class ProductTab(QWidget):
     def __init__(self, operator_id):
@@ -128,6 +129,7 @@ class ProductTab(QWidget):
         self.table.setHorizontalHeaderLabels(["ID", "商品名称", "类别", "库存位置", "当前库存", "最低库存", "状态", "操作"])
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setIconSize(QSize(48, 48))
         
         layout.addLayout(search_layout)
         layout.addWidget(self.table)
@@ -139,9 +141,13 @@ class ProductTab(QWidget):
             self, "选择商品图片", "", "图片文件 (*.png *.jpg *.jpeg)"
         )
         if file_path:
-            pixmap = QPixmap(file_path)
-            self.image_label.setPixmap(pixmap.scaled(200, 200, Qt.KeepAspectRatio))
-            self.current_image_path = file_path
+            # 先加入图片存储，预览使用生成好的缩略图
+            image_path = ImageStore().add(file_path)
+            if image_path is None:
+                QMessageBox.warning(self, "错误", "无法读取该图片")
+                return
+            self.image_label.setPixmap(load_pixmap(image_path, 200))
+            self.current_image_path = image_path
     
     def scan_barcode(self):
         scanner = BarcodeScanner()
@@ -169,17 +175,8 @@ class ProductTab(QWidget):
         except ValueError:
             min_stock = 5
         
-        # 处理图片路径
-        image_path = None
-        if self.current_image_path:
-            # 保存图片到images目录
-            os.makedirs(Config.IMAGE_DIR, exist_ok=True)
-            filename = f"{name}_{barcode if barcode else 'no_barcode'}.png"
-            image_path = os.path.join(Config.IMAGE_DIR, filename)
-            
-            # 复制图片到目标路径
-            pixmap = QPixmap(self.current_image_path)
-            pixmap.save(image_path)
+        # 图片在上传时已保存到图片存储
+        image_path = self.current_image_path
         
         # 添加商品到数据库
         with InventoryManager() as manager:
@@ -209,6 +206,7 @@ class ProductTab(QWidget):
         self.image_label.setText("无图片")
         self.current_image_path = None
     
+    @timed('load_data')
     def load_data(self):
         search_term = self.search_input.text().strip()
         
@@ -224,7 +222,10 @@ class ProductTab(QWidget):
                 
                 # 填充数据
                 self.table.setItem(row, 0, QTableWidgetItem(str(product['id'])))
-                self.table.setItem(row, 1, QTableWidgetItem(product['name']))
+                name_item = QTableWidgetItem(product['name'])
+                if product['image_path']:
+                    name_item.setIcon(QIcon(load_pixmap(product['image_path'], 48)))
+                self.table.setItem(row, 1, name_item)
                 self.table.setItem(row, 2, QTableWidgetItem(product['category']))
                 self.table.setItem(row, 3, QTableWidgetItem(product['location']))
                 self.table.setItem(row, 4, QTableWidgetItem(str(product['stock'])))
@@ -278,6 +279,21 @@ class ProductTab(QWidget):
         form_layout.addRow("条形码:", barcode_input)
         form_layout.addRow("最低库存:", min_stock_input)
         
+        # 商品图片
+        image_label = QLabel("无图片")
+        image_label.setFixedSize(200, 200)
+        image_label.setAlignment(Qt.AlignCenter)
+        image_label.setStyleSheet("border: 1px solid gray;")
+        if product['image_path']:
+            pixmap = load_pixmap(product['image_path'], 200)
+            if not pixmap.isNull():
+                image_label.setPixmap(pixmap)
+        
+        change_image_btn = QPushButton("更换图片")
+        change_image_btn.clicked.connect(lambda: self.change_product_image(dialog, image_label))
+        form_layout.addRow("图片:", image_label)
+        form_layout.addRow(change_image_btn)
+        
         save_btn = QPushButton("保存")
         save_btn.clicked.connect(lambda: self.save_edited_product(
             product['id'],
@@ -288,7 +304,8 @@ class ProductTab(QWidget):
             location_input.text().strip(),
             barcode_input.text().strip(),
             min_stock_input.text().strip(),
-            dialog
+            dialog,
+            getattr(dialog, 'new_image_path', None)
         ))
         
         cancel_btn = QPushButton("取消")
@@ -304,7 +321,20 @@ class ProductTab(QWidget):
         dialog.setLayout(layout)
         dialog.show()
     
-    def save_edited_product(self, product_id, name, category, spec, supplier, location, barcode, min_stock, dialog):
+    def change_product_image(self, dialog, image_label):
+        file_path, _ = QFileDialog.getOpenFileName(
+            dialog, "选择商品图片", "", "图片文件 (*.png *.jpg *.jpeg)"
+        )
+        if file_path:
+            image_path = ImageStore().add(file_path)
+            if image_path is None:
+                QMessageBox.warning(dialog, "错误", "无法读取该图片")
+                return
+            image_label.setPixmap(load_pixmap(image_path, 200))
+            dialog.new_image_path = image_path
+    
+    def save_edited_product(self, product_id, name, category, spec, supplier, location, barcode, min_stock, dialog,
+                            image_path=None):
         # 验证必填字段
         if not name or not category or not location:
             QMessageBox.warning(self, "输入错误", "商品名称、类别和库存位置是必填项")
@@ -327,6 +357,8 @@ class ProductTab(QWidget):
                 'barcode': barcode,
                 'min_stock': min_stock
             }
+            if image_path:
+                update_fields['image_path'] = image_path
             
             # 移除未更改的字段
             current_product = manager.get_product_by_id(product_id)
@@ -0,0 +1,172 @@
+import os
+import re
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+import itertools
+
+# 各查询方法可用的筛选条件（取值只需让条件生效，查询计划与具体值无关）
+# 以及：筛选条件 -> 主表上应使用索引的列
+QUERY_METHODS = {
+    'search_products': {
+        'target': 'inventory',
+        'alias': 'p',
+        'filters': {'search_term': '感冒', 'category': '保健品', 'barcode': '6900000000000',
+                    'supplier': '华润', 'location': 'A区', 'min_stock': 1},
+        'indexed': {'barcode': 'barcode', 'category': 'category_id',
+                    'location': 'location_id', 'supplier': 'supplier_id'},
+    },
+    'get_inventory_history': {
+        'target': 'inventory',
+        'alias': 'h',
+        'filters': {'product_id': 1, 'operator_id': 1, 'operation_type': 'in',
+                    'start_date': '2025-01-01', 'end_date': '2025-01-31'},
+        'indexed': {'product_id': 'product_id', 'start_date': 'operation_ts', 'end_date': 'operation_ts'},
+    },
+    'count_inventory_history': {
+        'target': 'inventory',
+        'alias': 'h',
+        'filters': {'product_id': 1, 'operator_id': 1, 'operation_type': 'in',
+                    'start_date': '2025-01-01', 'end_date': '2025-01-31'},
+        'indexed': {'product_id': 'product_id', 'start_date': 'operation_ts', 'end_date': 'operation_ts'},
+    },
+    'get_audit_logs': {
+        'target': 'audit',
+        'alias': 'a',
+        'filters': {'user_id': 1, 'action': '入库', 'start_date': '2025-01-01', 'end_date': '2025-01-31'},
+        'indexed': {'start_date': 'log_ts', 'end_date': 'log_ts'},
+    },
+}
+
+
+class PlanCursor:
+    def __init__(self, cursor):
+        """
+        替换管理类游标：以 EXPLAIN QUERY PLAN 代替实际执行，并记录各语句的查询计划
+        :param cursor: 原游标
+        """
+        self._cursor = cursor
+        self.plans = []
+
+    def execute(self, sql, parameters=()):
+        explain = f"EXPLAIN QUERY PLAN {sql}"
+        self.plans.append([row[3] for row in self._cursor.execute(explain, parameters).fetchall()])
+        # 再执行一次，调用方仍可正常读取结果
+        return self._cursor.execute(explain, parameters)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def check_plan(plan, alias, expected_columns):
+    """
+    检查查询计划
+    :param plan: EXPLAIN QUERY PLAN 的 detail 列表
+    :param alias: 主表别名
+    :param expected_columns: 应通过索引查找的列，为空表示允许全表扫描
+    :return: 问题描述列表
+    """
+    problems = [f"使用临时B树: {detail}" for detail in plan if 'TEMP B-TREE' in detail]
+    if not expected_columns:
+        return problems
+
+    main_steps = [detail for detail in plan if re.match(rf'(SCAN|SEARCH) {alias}\b', detail)]
+    if not main_steps:
+        problems.append(f"未找到主表 {alias} 的访问步骤")
+    for detail in main_steps:
+        used = re.search(r'\((\w+)[=<>]', detail)
+        if not detail.startswith('SEARCH') or not used or used.group(1) not in expected_columns:
+            problems.append(f"未使用 {'/'.join(sorted(expected_columns))} 上的索引: {detail}")
+    return problems
+
+
+def run_checks(db_path, methods=None):
+    """
+    枚举各查询方法的全部筛选条件组合并检查查询计划
+    :param db_path: 数据库文件路径（会执行表结构升级）
+    :param methods: 只检查指定的方法，默认全部
+    :return: 检查结果列表
+    """
+    from inventory_manager import InventoryManager
+
+    results = []
+    with InventoryManager(db_path) as manager:
+        targets = {'inventory': manager, 'audit': manager.audit_logger}
+        for method_name, spec in QUERY_METHODS.items():
+            if methods and method_name not in methods:
+                continue
+            target = targets[spec['target']]
+            names = list(spec['filters'])
+            for size in range(len(names) + 1):
+                for combo in itertools.combinations(names, size):
+                    filters = {name: spec['filters'][name] for name in combo}
+                    original = target.cursor
+                    target.cursor = PlanCursor(original)
+                    try:
+                        getattr(target, method_name)(**filters)
+                        plan = target.cursor.plans[-1] if target.cursor.plans else []
+                    finally:
+                        target.cursor = original
+                    expected = {spec['indexed'][name] for name in combo if name in spec['indexed']}
+                    results.append({
+                        'method': method_name,
+                        'filters': combo,
+                        'plan': plan,
+                        'problems': check_plan(plan, spec['alias'], expected),
+                    })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询计划回归检查：筛选条件应命中索引，排序不应使用临时B树")
+    parser.add_argument('--db', help="检查指定数据库的副本（默认生成测试数据库）")
+    parser.add_argument('--methods', nargs='+', choices=list(QUERY_METHODS), help="只检查指定的方法")
+    parser.add_argument('--analyze', choices=['both', 'yes', 'no'], default='both',
+                        help="是否在收集统计信息（ANALYZE）后检查，默认两种情况都检查")
+    parser.add_argument('--verbose', '-v', action='store_true', help="输出所有查询计划")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    work_dir = tempfile.mkdtemp(prefix="query_plan_")
+    try:
+        db_path = os.path.join(work_dir, 'inventory.db')
+        if args.db:
+            from sample_data import copy_database
+            copy_database(args.db, db_path)
+        else:
+            from sample_data import generate_database
+            generate_database(db_path, products=2000, history=20000)
+
+        modes = {'both': [False, True], 'yes': [True], 'no': [False]}[args.analyze]
+        failures = total = 0
+        for analyzed in modes:
+            if analyzed:
+                import sqlite3
+                conn = sqlite3.connect(db_path)
+                conn.execute("ANALYZE")
+                conn.commit()
+                conn.close()
+            label = "ANALYZE后" if analyzed else "无统计信息"
+            for result in run_checks(db_path, args.methods):
+                total += 1
+                filters = ", ".join(result['filters']) or "无筛选"
+                if result['problems']:
+                    failures += 1
+                    print(f"[失败][{label}] {result['method']}({filters})")
+                    for problem in result['problems']:
+                        print(f"    {problem}")
+                elif args.verbose:
+                    print(f"[通过][{label}] {result['method']}({filters})")
+                if args.verbose or result['problems']:
+                    for detail in result['plan']:
+                        print(f"        {detail}")
+        print(f"共检查 {total} 个查询，失败 {failures} 个")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
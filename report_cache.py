@@ -0,0 +1,154 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+from config import Config
+
+# 报表版式变化时递增，使旧缓存失效
+REPORT_LAYOUT_VERSION = 1
+
+
+def make_fingerprint(report_type, data_versions, **params):
+    """
+    根据报表类型、数据版本和报表参数计算指纹
+    :param report_type: 报表类型
+    :param data_versions: InventoryManager.get_data_versions() 的返回值
+    :param params: 影响报表内容的其他参数（操作员、日期范围等）
+    :return: 指纹字符串，数据版本不可用时返回None
+    """
+    if not data_versions:
+        return None
+    parts = [f"layout={REPORT_LAYOUT_VERSION}", f"type={report_type}",
+             f"embed_font={Config.REPORT_EMBED_FONT}"]
+    parts += [f"{key}={data_versions[key]}" for key in sorted(data_versions)]
+    parts += [f"{key}={params[key]}" for key in sorted(params)]
+    return hashlib.sha1("|".join(parts).encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        报表缓存：数据未变化时直接复用已生成的PDF
+        缓存文件以指纹命名，超出容量时淘汰最久未用的文件
+        写入缓存时与生成的报表共用硬链接；命中缓存时复制为新文件，新报表的修改时间为复用时间，
+        不会因缓存文件较旧而被定时报表的过期清理提前删除
+        最近使用时间记录在单独的 .used 标记文件上，不修改共享文件的修改时间
+        :param cache_dir: 缓存目录，默认 Config.REPORT_DIR/.cache
+        :param max_bytes: 缓存容量上限（字节），默认 Config.REPORT_CACHE_MAX_MB
+        """
+        self.cache_dir = cache_dir or os.path.join(Config.REPORT_DIR, '.cache')
+        self.max_bytes = max_bytes if max_bytes is not None else Config.REPORT_CACHE_MAX_MB * 1024 * 1024
+        self.logger = logging.getLogger('report_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, fingerprint):
+        return os.path.join(self.cache_dir, f"{fingerprint}.pdf")
+
+    def _touch(self, fingerprint):
+        """记录缓存的最近使用时间"""
+        stamp = os.path.join(self.cache_dir, f"{fingerprint}.used")
+        with open(stamp, 'a'):
+            pass
+        os.utime(stamp)
+
+    def fetch(self, fingerprint, target_path):
+        """
+        将缓存的报表复制到目标路径，目标文件的修改时间为当前时间
+        :return: 命中缓存返回True
+        """
+        if not fingerprint:
+            return False
+        entry = self._entry_path(fingerprint)
+        try:
+            shutil.copyfile(entry, target_path)
+            self._touch(fingerprint)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            self.logger.error(f"读取报表缓存失败: {e}")
+            return False
+
+    def store(self, fingerprint, source_path):
+        """
+        将新生成的报表加入缓存
+        :param fingerprint: 报表指纹
+        :param source_path: 报表文件路径
+        """
+        if not fingerprint:
+            return
+        entry = self._entry_path(fingerprint)
+        tmp_path = f"{entry}.{os.getpid()}.tmp"
+        try:
+            _link_or_copy(source_path, tmp_path)
+            os.replace(tmp_path, entry)
+            self._touch(fingerprint)
+            self.evict()
+        except Exception as e:
+            self.logger.error(f"写入报表缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        """
+        淘汰最久未使用的缓存，直到总大小不超过上限
+        :return: 删除的文件数
+        """
+        names = set(os.listdir(self.cache_dir))
+        entries = []
+        for name in names:
+            if not name.endswith('.pdf'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stamp = f"{path[:-4]}.used"
+            try:
+                size = os.path.getsize(path)
+                used = os.path.getmtime(stamp if os.path.basename(stamp) in names else path)
+            except FileNotFoundError:
+                continue
+            entries.append((used, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+            _remove_quietly(f"{path[:-4]}.used")
+
+        # 清理缓存文件已不存在的标记文件
+        for name in names:
+            if name.endswith('.used') and f"{name[:-5]}.pdf" not in names:
+                _remove_quietly(os.path.join(self.cache_dir, name))
+        return removed
+
+    def clear(self):
+        """清空缓存"""
+        for name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, name))
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _link_or_copy(source, target):
+    """创建硬链接，文件系统不支持时复制文件"""
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        raise
+    except OSError:
+        shutil.copy2(source, target)
+        # 复制会保留源文件的修改时间，更新为当前时间，避免报表目录按修改时间清理时被提前删除
+        now = time.time()
+        os.utime(target, (now, now))
@@ -1,125 +1,207 @@
 import os
 import datetime
+import threading
+from xml.sax.saxutils import escape
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from inventory_manager import InventoryManager
 from audit_logger import AuditLogger
+from config import Config
+from report_cache import ReportCache, make_fingerprint
+from metrics import observe, REPORTS, REPORT_SECONDS, REPORT_CACHE_HITS
+
+# 交易报表每个表格片段的行数（约一页）
+TRANSACTION_ROWS_PER_TABLE = 40
+# 从数据库分批读取的记录数
+TRANSACTION_FETCH_SIZE = 500
+
+# 不嵌入字体时使用的CID字体（由PDF阅读器提供字形）
+CID_FONT_NAME = 'STSong-Light'
+
+_resource_lock = threading.Lock()
+_report_font_name = None
+_report_styles = None
+
+
+def _register_chinese_font():
+    """
+    注册中文字体
+    TrueType字体只会按实际用到的字形子集嵌入PDF；
+    Config.REPORT_EMBED_FONT 为False时使用不嵌入的CID字体，报表体积最小
+    :return: 注册的字体名称
+    """
+    if not Config.REPORT_EMBED_FONT:
+        pdfmetrics.registerFont(UnicodeCIDFont(CID_FONT_NAME))
+        return CID_FONT_NAME
+
+    # 使用相对路径确保字体文件位置正确
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    font_dir = os.path.join(base_dir, 'resources', 'fonts')
+    candidates = [
+        (os.path.join(font_dir, 'SimHei.ttf'), 0, "黑体"),
+        (os.path.join(font_dir, 'simsun.ttc'), 0, "宋体"),
+        ('/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf', 0, "Linux系统字体"),
+    ]
+    if Config.REPORT_FONT_PATH:
+        candidates.insert(0, (Config.REPORT_FONT_PATH, 0, "自定义字体"))
+
+    for font_path, subfont_index, label in candidates:
+        if not os.path.exists(font_path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont('ChineseFont', font_path, subfontIndex=subfont_index))
+            print(f"使用{label}: {font_path}")
+            return 'ChineseFont'
+        except Exception as e:
+            print(f"字体注册失败: {font_path}: {e}")
+
+    # 最终回退：不嵌入字体，由阅读器的中文字体显示
+    print(f"警告: 无可用中文字体文件，使用{CID_FONT_NAME}（不嵌入字体）")
+    pdfmetrics.registerFont(UnicodeCIDFont(CID_FONT_NAME))
+    return CID_FONT_NAME
+
+
+def _build_styles(font_name):
+    """创建报表样式表"""
+    styles = getSampleStyleSheet()
+
+    # 添加自定义样式
+    styles.add(ParagraphStyle(
+        name='TableHeader',
+        fontName=font_name,
+        fontSize=10,
+        alignment=1,
+        textColor=colors.white,
+        spaceBefore=6,
+        spaceAfter=6
+    ))
+    styles.add(ParagraphStyle(
+        name='TableCell',
+        fontName=font_name,
+        fontSize=9,
+        spaceBefore=3,
+        spaceAfter=3
+    ))
+    styles.add(ParagraphStyle(
+        name='ChineseTitle',
+        fontName=font_name,
+        fontSize=18,
+        alignment=1,  # 居中
+        spaceAfter=12
+    ))
+    styles.add(ParagraphStyle(
+        name='ChineseHeading1',
+        fontName=font_name,
+        fontSize=14,
+        alignment=0,  # 左对齐
+        spaceBefore=12,
+        spaceAfter=6
+    ))
+    styles.add(ParagraphStyle(
+        name='ChineseNormal',
+        fontName=font_name,
+        fontSize=10,
+        spaceBefore=6,
+        spaceAfter=6
+    ))
+
+    # 显式覆盖默认样式的中文字体设置
+    for style in ['Title', 'Heading1', 'Normal', 'Heading2', 'Heading3']:
+        styles[style].fontName = font_name
+    return styles
+
+
+def get_report_resources():
+    """
+    获取进程内共享的报表字体和样式表
+    字体文件解析和样式创建只在首次调用时执行，之后的报表直接复用
+    :return: (字体名称, 样式表)
+    """
+    global _report_font_name, _report_styles
+    with _resource_lock:
+        if _report_styles is None:
+            _report_font_name = _register_chinese_font()
+            _report_styles = _build_styles(_report_font_name)
+    return _report_font_name, _report_styles
+
+
+class _StreamingStory(list):
+    """
+    按需从生成器补充内容的story列表
+    reportlab 排版时会从列表头部逐个取出并删除流式对象，
+    因此已排版的对象会被及时释放，内存占用与报表总行数无关
+    """
+    def __init__(self, head, source, low_water=2):
+        super().__init__(head)
+        self._source = iter(source)
+        self._low_water = low_water
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._low_water:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
 
 class ReportGenerator:
-    def __init__(self, output_dir):
+    def __init__(self, output_dir, db_path='inventory.db', read_only=False):
         """
         初始化报表生成器
         :param output_dir: 报表输出目录
+        :param db_path: 数据库文件路径
+        :param read_only: 只读模式，只读取数据库，不写入审计日志（由调用方负责记录）
         """
         self.output_dir = output_dir
+        self.db_path = db_path
+        self.read_only = read_only
         os.makedirs(output_dir, exist_ok=True)
 
-        # 创建样式表
-        self.styles = getSampleStyleSheet()
-
-        # 注册中文字体（必须在创建样式前调用）
-        self._register_chinese_fonts()
-
-        # 添加自定义样式，避免KeyError
-        self._add_style_safe('TableHeader', ParagraphStyle(
-            name='TableHeader',
-            fontName='ChineseFont',
-            fontSize=10,
-            alignment=1,
-            textColor=colors.white,
-            spaceBefore=6,
-            spaceAfter=6
-        ))
-        self._add_style_safe('TableCell', ParagraphStyle(
-            name='TableCell',
-            fontName='ChineseFont',
-            fontSize=9,
-            spaceBefore=3,
-            spaceAfter=3
-        ))
-        self._add_style_safe('ChineseTitle', ParagraphStyle(
-            name='ChineseTitle',
-            fontName='ChineseFont',
-            fontSize=18,
-            alignment=1,  # 居中
-            spaceAfter=12
-        ))
-        self._add_style_safe('ChineseHeading1', ParagraphStyle(
-            name='ChineseHeading1',
-            fontName='ChineseFont',
-            fontSize=14,
-            alignment=0,  # 左对齐
-            spaceBefore=12,
-            spaceAfter=6
-        ))
-        self._add_style_safe('ChineseNormal', ParagraphStyle(
-            name='ChineseNormal',
-            fontName='ChineseFont',
-            fontSize=10,
-            spaceBefore=6,
-            spaceAfter=6
-        ))
-        # 覆盖默认样式
-        self._override_default_styles()
-
-    def _register_chinese_fonts(self):
-        """确保中文字体100%生效的终极方案"""
-        try:
-            # 使用相对路径确保字体文件位置正确
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            font_dir = os.path.join(base_dir, 'resources', 'fonts')
-            font_path = os.path.join(font_dir, 'SimHei.ttf')
-            if os.path.exists(font_path):
-                pdfmetrics.registerFont(TTFont('ChineseFont', font_path))
-                print(f"使用黑体字体: {font_path}")
-                return
-            font_path = os.path.join(font_dir, 'simsun.ttc')
-            if os.path.exists(font_path):
-                pdfmetrics.registerFont(TTFont('ChineseFont', font_path, subfontIndex=0))
-                print(f"使用宋体字体: {font_path} (索引0)")
-                return
-            linux_font = '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf'
-            if os.path.exists(linux_font):
-                pdfmetrics.registerFont(TTFont('ChineseFont', linux_font))
-                print(f"使用Linux系统字体: {linux_font}")
-                return
-            raise FileNotFoundError("无可用中文字体文件")
-        except Exception as e:
-            print(f"字体注册失败: {str(e)}")
-            # 最终回退（可能显示方块）
-            pdfmetrics.registerFont(TTFont('ChineseFont', 'Helvetica'))
-            print("警告: 使用Helvetica字体，中文可能显示为方块")
-
-    def _add_style_safe(self, style_name, style_obj):
-        """安全地添加样式，避免重复"""
-        if style_name not in self.styles:
-            self.styles.add(style_obj)
-
-    def _override_default_styles(self):
-        """显式覆盖默认样式的中文字体设置"""
-        base_styles = ['Title', 'Heading1', 'Normal', 'Heading2', 'Heading3']
-        for style in base_styles:
-            if style in self.styles:
-                self.styles[style].fontName = 'ChineseFont'
-
-    def generate_inventory_report(self, operator_id, products=None, start_date=None, end_date=None):
+        # 报表缓存：数据未变化时复用已生成的PDF
+        self.cache = ReportCache(os.path.join(output_dir, '.cache')) if Config.REPORT_CACHE_ENABLED else None
+
+        # 字体和样式表在进程内只初始化一次
+        self.font_name, self.styles = get_report_resources()
+
+    @observe(REPORT_SECONDS, REPORTS, report_type='inventory')
+    def generate_inventory_report(self, operator_id, products=None, start_date=None, end_date=None,
+                                  progress_callback=None):
         """
         生成库存报表（已支持中文）
         :param operator_id: 操作员ID
         :param products: 商品列表
         :param start_date: 开始日期
         :param end_date: 结束日期
+        :param progress_callback: 进度回调函数，参数为 (已处理商品数, 商品总数)
         :return: 生成的报表文件路径
         """
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         filename = f"inventory_report_{timestamp}.pdf"
         filepath = os.path.join(self.output_dir, filename)
 
+        # 数据未变化时直接复用之前生成的报表
+        fingerprint = None
+        if products is None:
+            fingerprint = self._data_fingerprint("inventory", operator_id=operator_id,
+                                                 start_date=start_date, end_date=end_date)
+        if self._fetch_cached(fingerprint, filepath, progress_callback):
+            self._log_report(operator_id, "生成库存报表", filename)
+            return filepath
+
         doc = SimpleDocTemplate(filepath, pagesize=letter)
         story = []
 
@@ -139,7 +221,7 @@ class ReportGenerator:
             story.append(Paragraph(info, self.styles['Normal']))
         story.append(Spacer(1, 0.25*inch))
 
-        with InventoryManager() as manager:
+        with InventoryManager(self.db_path, read_only=self.read_only) as manager:
             if products is None:
                 products = manager.search_products()
             table_data = [
@@ -153,7 +235,9 @@ class ReportGenerator:
                     Paragraph("状态", self.styles['TableHeader'])
                 ]
             ]
-            for product in products:
+            for index, product in enumerate(products, 1):
+                if progress_callback and index % 200 == 0:
+                    progress_callback(index, len(products))
                 status = "正常" if product['stock'] > product['min_stock'] else "低库存"
                 table_data.append([
                     Paragraph(str(product['id']), self.styles['TableCell']),
@@ -169,7 +253,7 @@ class ReportGenerator:
                 ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'ChineseFont'),
+                ('FONTNAME', (0, 0), (-1, -1), self.font_name),
                 ('FONTSIZE', (0, 0), (-1, 0), 10),
                 ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
                 ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
@@ -192,37 +276,48 @@ class ReportGenerator:
             stats_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
                 ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'ChineseFont'),
+                ('FONTNAME', (0, 0), (-1, -1), self.font_name),
                 ('GRID', (0, 0), (-1, -1), 1, colors.black),
             ]))
             story.append(stats_table)
 
         doc.build(story)
+        if progress_callback:
+            progress_callback(len(products), len(products))
 
         # 记录审计日志
-        logger = AuditLogger()
-        logger.log_action(
-            operator_id,
-            "生成库存报表",
-            details=f"报表文件: {filename}",
-            ip_address="N/A"
-        )
+        if self.cache:
+            self.cache.store(fingerprint, filepath)
+        self._log_report(operator_id, "生成库存报表", filename)
 
         return filepath
 
-    def generate_transaction_report(self, operator_id, transactions=None, start_date=None, end_date=None):
+    @observe(REPORT_SECONDS, REPORTS, report_type='history')
+    def generate_transaction_report(self, operator_id, transactions=None, start_date=None, end_date=None,
+                                    progress_callback=None):
         """
         生成交易记录报表（已支持中文）
+        记录按批读取并分片排版，生成时间随记录数线性增长，内存占用保持稳定
         :param operator_id: 操作员ID
         :param transactions: 交易记录列表
         :param start_date: 开始日期
         :param end_date: 结束日期
+        :param progress_callback: 进度回调函数，参数为 (已处理记录数, 记录总数)
         :return: 生成的报表文件路径
         """
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         filename = f"transaction_report_{timestamp}.pdf"
         filepath = os.path.join(self.output_dir, filename)
 
+        # 数据未变化时直接复用之前生成的报表
+        fingerprint = None
+        if transactions is None:
+            fingerprint = self._data_fingerprint("history", operator_id=operator_id,
+                                                 start_date=start_date, end_date=end_date)
+        if self._fetch_cached(fingerprint, filepath, progress_callback):
+            self._log_report(operator_id, "生成交易记录报表", filename)
+            return filepath
+
         doc = SimpleDocTemplate(filepath, pagesize=letter)
         story = []
 
@@ -240,57 +335,128 @@ class ReportGenerator:
             story.append(Paragraph(info, self.styles['Normal']))
         story.append(Spacer(1, 0.25*inch))
 
-        with InventoryManager() as manager:
+        with InventoryManager(self.db_path, read_only=self.read_only) as manager:
             if transactions is None:
-                transactions = manager.get_inventory_history(
+                total = manager.count_inventory_history(
                     start_date=start_date,
                     end_date=end_date
                 )
-            table_data = [
-                [
-                    Paragraph("交易ID", self.styles['TableHeader']),
-                    Paragraph("商品ID", self.styles['TableHeader']),
-                    Paragraph("商品名称", self.styles['TableHeader']),
-                    Paragraph("操作类型", self.styles['TableHeader']),
-                    Paragraph("变动数量", self.styles['TableHeader']),
-                    Paragraph("操作员", self.styles['TableHeader']),
-                    Paragraph("操作时间", self.styles['TableHeader']),
-                    Paragraph("备注", self.styles['TableHeader'])
-                ]
-            ]
-            for transaction in transactions:
-                op_type = "入库" if transaction['operation_type'] == 'in' else "出库"
-                table_data.append([
-                    Paragraph(str(transaction['id']), self.styles['TableCell']),
-                    Paragraph(str(transaction['product_id']), self.styles['TableCell']),
-                    Paragraph(transaction['product_name'], self.styles['TableCell']),
-                    Paragraph(op_type, self.styles['TableCell']),
-                    Paragraph(str(transaction['change_amount']), self.styles['TableCell']),
-                    Paragraph(transaction['operator_name'], self.styles['TableCell']),
-                    Paragraph(transaction['operation_time'], self.styles['TableCell']),
-                    Paragraph(transaction['notes'] or "", self.styles['TableCell'])
-                ])
-            table = Table(table_data, colWidths=[0.7*inch, 0.7*inch, 1.5*inch, 0.8*inch, 0.8*inch, 1*inch, 1.5*inch, 1.5*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'ChineseFont'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            story.append(table)
+                transactions = manager.iter_inventory_history(
+                    start_date=start_date,
+                    end_date=end_date,
+                    chunk_size=TRANSACTION_FETCH_SIZE
+                )
+            else:
+                total = len(transactions)
 
-        doc.build(story)
+            # 表格分片随排版进度逐个生成，数据库记录也按需分批读取
+            fragments = self._transaction_table_fragments(transactions, total, progress_callback)
+            try:
+                doc.build(_StreamingStory(story, fragments))
+            finally:
+                # 中途取消时及时释放数据库游标
+                if hasattr(transactions, 'close'):
+                    transactions.close()
 
-        logger = AuditLogger()
-        logger.log_action(
-            operator_id,
-            "生成交易记录报表",
-            details=f"报表文件: {filename}",
-            ip_address="N/A"
-        )
+        if self.cache:
+            self.cache.store(fingerprint, filepath)
+        self._log_report(operator_id, "生成交易记录报表", filename)
 
-        return filepath
\ No newline at end of file
+        return filepath
+
+    def _data_fingerprint(self, report_type, **params):
+        """
+        计算报表数据指纹（商品/用户变更计数、最大库存历史ID和报表参数）
+        :return: 指纹字符串，未启用缓存或无法获取数据版本时返回None
+        """
+        if not self.cache:
+            return None
+        with InventoryManager(self.db_path, read_only=self.read_only) as manager:
+            return make_fingerprint(report_type, manager.get_data_versions(), **params)
+
+    def _fetch_cached(self, fingerprint, filepath, progress_callback=None):
+        """
+        命中缓存时将已有报表复制到新的文件路径
+        注意：复用的报表中生成日期为首次生成的时间
+        :return: 命中缓存返回True
+        """
+        if not self.cache or not self.cache.fetch(fingerprint, filepath):
+            return False
+        REPORT_CACHE_HITS.inc()
+        if progress_callback:
+            progress_callback(1, 1)
+        return True
+
+    def _log_report(self, operator_id, action, filename):
+        """记录报表生成的审计日志（只读模式下跳过）"""
+        if self.read_only:
+            return
+        with AuditLogger(self.db_path) as logger:
+            logger.log_action(
+                operator_id,
+                action,
+                details=f"报表文件: {filename}",
+                ip_address="N/A"
+            )
+
+    def _transaction_table_fragments(self, transactions, total, progress_callback=None):
+        """
+        将交易记录切分为约一页大小的表格片段
+        :param transactions: 交易记录可迭代对象
+        :param total: 记录总数（用于进度回调）
+        :param progress_callback: 进度回调函数
+        :return: 逐个产出 LongTable 的生成器
+        """
+        header = ["交易ID", "商品ID", "商品名称", "操作类型", "变动数量", "操作员", "操作时间", "备注"]
+        col_widths = [0.7*inch, 0.7*inch, 1.5*inch, 0.8*inch, 0.8*inch, 1*inch, 1.5*inch, 1.5*inch]
+        table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, -1), self.font_name),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ])
+
+        def make_table(rows):
+            return LongTable([header] + rows, colWidths=col_widths, repeatRows=1, style=table_style)
+
+        rows = []
+        done = 0
+        for transaction in transactions:
+            op_type = "入库" if transaction['operation_type'] == 'in' else "出库"
+            rows.append([
+                str(transaction['id']),
+                str(transaction['product_id']),
+                self._table_text(transaction['product_name'], 8),
+                op_type,
+                str(transaction['change_amount']),
+                self._table_text(transaction['operator_name'], 5),
+                str(transaction['operation_time']),
+                self._table_text(transaction['notes'], 8)
+            ])
+            done += 1
+            if len(rows) >= TRANSACTION_ROWS_PER_TABLE:
+                yield make_table(rows)
+                rows = []
+                if progress_callback:
+                    progress_callback(done, total)
+        if rows or done == 0:
+            yield make_table(rows)
+        if progress_callback:
+            progress_callback(done, total)
+
+    def _table_text(self, text, max_plain_chars):
+        """
+        表格单元格内容：短文本直接使用字符串，只有需要换行的长文本才创建 Paragraph
+        :param text: 单元格文本
+        :param max_plain_chars: 不需要换行的最大字符数
+        """
+        text = "" if text is None else str(text)
+        if len(text) <= max_plain_chars:
+            return text
+        return Paragraph(escape(text), self.styles['TableCell'])
@@ -0,0 +1,292 @@
+import os
+import uuid
+import logging
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from config import Config
+from audit_logger import AuditLogger
+from inventory_manager import InventoryManager
+from diagnostics import record_timing
+from metrics import REPORTS, REPORT_SECONDS
+
+# 报表类型 -> (生成方法名, 审计日志操作描述)
+# export_ 开头的类型由 DataExporter 处理，其余由 ReportGenerator 处理
+REPORT_TYPES = {
+    "inventory": ("generate_inventory_report", "生成库存报表"),
+    "history": ("generate_transaction_report", "生成交易记录报表"),
+    "export_products": ("export_products", "导出商品数据"),
+    "export_history": ("export_inventory_history", "导出库存历史数据"),
+    "export_audit": ("export_audit_logs", "导出审计日志"),
+}
+
+# 任务状态
+STATUS_NAMES = {
+    "pending": "排队中",
+    "running": "生成中",
+    "finished": "已完成",
+    "failed": "失败",
+    "cancelled": "已取消",
+}
+
+
+class ReportCancelled(Exception):
+    """报表任务被用户取消"""
+
+
+class ReportJob:
+    def __init__(self, job_id, report_type, operator_id, params):
+        """
+        报表任务
+        :param job_id: 任务ID
+        :param report_type: 报表类型（见 REPORT_TYPES）
+        :param operator_id: 操作员ID
+        :param params: 传给报表生成方法的参数
+        """
+        self.job_id = job_id
+        self.report_type = report_type
+        self.operator_id = operator_id
+        self.params = params
+        self.status = "pending"
+        self.done = 0
+        self.total = 0
+        self.file_path = None
+        self.error = None
+        self.submitted_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def progress(self):
+        """完成比例（0~1）"""
+        if self.status == "finished":
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def duration(self):
+        """生成耗时（秒），未结束返回None"""
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+    def is_active(self):
+        return self.status in ("pending", "running")
+
+
+def _init_report_worker():
+    """子进程启动时预先加载报表字体和样式，后续任务直接复用"""
+    from report_generator import get_report_resources
+    get_report_resources()
+
+
+def _run_report_job(job_id, report_type, operator_id, params, db_path, output_dir,
+                    progress_queue, cancel_flags):
+    """
+    在子进程中生成报表（每个子进程使用独立的只读数据库连接）
+    :return: 生成的报表文件路径
+    """
+    from report_generator import ReportGenerator
+    from exporters import DataExporter
+
+    if cancel_flags.get(job_id):
+        raise ReportCancelled()
+    progress_queue.put((job_id, "running", 0, 0))
+
+    def on_progress(done, total):
+        if cancel_flags.get(job_id):
+            raise ReportCancelled()
+        progress_queue.put((job_id, "progress", done, total))
+
+    if report_type.startswith("export_"):
+        generator = DataExporter(output_dir, db_path=db_path, read_only=True)
+    else:
+        generator = ReportGenerator(output_dir, db_path=db_path, read_only=True)
+    method = getattr(generator, REPORT_TYPES[report_type][0])
+    return method(operator_id=operator_id, progress_callback=on_progress, **params)
+
+
+class ReportJobManager:
+    def __init__(self, db_path='inventory.db', output_dir=None, max_workers=None):
+        """
+        后台报表任务管理器：报表在进程池中并行生成，不占用界面线程
+        :param db_path: 数据库文件路径
+        :param output_dir: 报表输出目录，默认 Config.REPORT_DIR
+        :param max_workers: 最大并行进程数，默认 Config.REPORT_MAX_WORKERS
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.output_dir = os.path.abspath(output_dir or Config.REPORT_DIR)
+        self.max_workers = max_workers or Config.REPORT_MAX_WORKERS
+        self.logger = logging.getLogger('report_jobs')
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.jobs = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._executor = None
+        self._mp_manager = None
+        self._progress_queue = None
+        self._cancel_flags = None
+        self._progress_thread = None
+
+    def _ensure_started(self):
+        """按需启动进程池（首次提交任务时才创建子进程）"""
+        if self._executor is not None:
+            return
+        # 子进程以只读方式访问数据库，表结构升级需在主进程中完成
+        InventoryManager(self.db_path).close()
+        self._mp_manager = multiprocessing.Manager()
+        self._progress_queue = self._mp_manager.Queue()
+        self._cancel_flags = self._mp_manager.dict()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             initializer=_init_report_worker)
+        self._progress_thread = threading.Thread(target=self._progress_loop,
+                                                 name="report-progress", daemon=True)
+        self._progress_thread.start()
+
+    def add_listener(self, callback):
+        """
+        注册任务状态变化回调
+        注意：回调在后台线程中调用，界面代码需自行切换到主线程
+        :param callback: 回调函数，参数为 ReportJob
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, job):
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception as e:
+                self.logger.error(f"报表任务回调失败: {e}")
+
+    def submit(self, report_type, operator_id, **params):
+        """
+        提交报表任务
+        :param report_type: 报表类型（见 REPORT_TYPES）
+        :param operator_id: 操作员ID
+        :param params: 报表参数（如 start_date、end_date；导出任务还可指定 fmt、compress）
+        :return: ReportJob 对象
+        """
+        if report_type not in REPORT_TYPES:
+            raise ValueError(f"未知的报表类型: {report_type}")
+
+        self._ensure_started()
+        job = ReportJob(uuid.uuid4().hex[:8], report_type, operator_id, params)
+        with self._lock:
+            self.jobs[job.job_id] = job
+
+        job.future = self._executor.submit(
+            _run_report_job, job.job_id, report_type, operator_id, params,
+            self.db_path, self.output_dir, self._progress_queue, self._cancel_flags
+        )
+        job.future.add_done_callback(lambda future, job=job: self._on_done(job, future))
+        self._notify(job)
+        return job
+
+    def cancel(self, job_id):
+        """
+        取消任务：排队中的任务直接取消，生成中的任务在下次进度回报时中止
+        :return: 任务仍处于活动状态并已发出取消请求返回True
+        """
+        job = self.jobs.get(job_id)
+        if job is None or not job.is_active():
+            return False
+        self._cancel_flags[job_id] = True
+        job.future.cancel()
+        return True
+
+    def _progress_loop(self):
+        while True:
+            try:
+                message = self._progress_queue.get()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+
+            job_id, kind, done, total = message
+            job = self.jobs.get(job_id)
+            if job is None or not job.is_active():
+                continue
+            if kind == "running":
+                job.status = "running"
+                job.started_at = datetime.now()
+            else:
+                job.done, job.total = done, total
+            self._notify(job)
+
+    def _on_done(self, job, future):
+        job.finished_at = datetime.now()
+        if job.started_at is None:
+            job.started_at = job.finished_at
+        try:
+            job.file_path = future.result()
+            job.status = "finished"
+            record_timing('report', REPORT_TYPES[job.report_type][1], job.duration)
+            # 子进程中记录的指标无法导出，由主进程统计
+            REPORTS.inc(report_type=job.report_type, result='ok')
+            REPORT_SECONDS.observe(job.duration, report_type=job.report_type)
+            self._log_report(job)
+        except (CancelledError, ReportCancelled):
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            REPORTS.inc(report_type=job.report_type, result='failed')
+            self.logger.error(f"报表任务 {job.job_id} 生成失败: {e}")
+        self._notify(job)
+
+    def _log_report(self, job):
+        """子进程只读访问数据库，审计日志由主进程统一记录"""
+        try:
+            with AuditLogger(self.db_path) as logger:
+                logger.log_action(
+                    job.operator_id,
+                    REPORT_TYPES[job.report_type][1],
+                    details=f"报表文件: {os.path.basename(job.file_path)}",
+                    ip_address="N/A"
+                )
+        except Exception as e:
+            self.logger.error(f"记录报表审计日志失败: {e}")
+
+    def active_jobs(self):
+        """获取未结束的任务列表"""
+        return [job for job in self.jobs.values() if job.is_active()]
+
+    def shutdown(self, cancel_pending=True):
+        """
+        关闭进程池
+        :param cancel_pending: 是否取消所有未结束的任务
+        """
+        if self._executor is None:
+            return
+        if cancel_pending:
+            for job in self.active_jobs():
+                self.cancel(job.job_id)
+        self._executor.shutdown(wait=True)
+        self._progress_queue.put(None)
+        self._progress_thread.join(timeout=5)
+        self._mp_manager.shutdown()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+
+if __name__ == "__main__":
+    # 测试代码
+    import time
+    logging.basicConfig(level=logging.INFO)
+
+    with ReportJobManager() as manager:
+        manager.add_listener(lambda job: print(
+            f"[{job.job_id}] {STATUS_NAMES[job.status]} {job.progress:.0%} {job.file_path or ''}"))
+        manager.submit("inventory", operator_id=1)
+        manager.submit("history", operator_id=1, start_date="2025-01-01", end_date="2025-12-31")
+        while manager.active_jobs():
+            time.sleep(0.5)
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+from config import Config
+from audit_logger import AuditLogger
+from inventory_manager import InventoryManager
+
+# 调度周期 -> 时长
+PERIODS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(days=7),
+}
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class ReportScheduler:
+    def __init__(self, jobs=None, db_path='inventory.db', output_dir=None, state_file=None):
+        """
+        定时报表调度器：在非营业时间自动生成配置好的报表
+        :param jobs: 任务配置列表，默认 Config.REPORT_SCHEDULE
+        :param db_path: 数据库文件路径
+        :param output_dir: 报表输出根目录，默认 Config.REPORT_DIR/scheduled
+        :param state_file: 运行状态文件，默认保存在输出根目录下
+        """
+        self.jobs = jobs if jobs is not None else Config.REPORT_SCHEDULE
+        self.db_path = db_path
+        self.output_dir = output_dir or os.path.join(Config.REPORT_DIR, 'scheduled')
+        self.state_file = state_file or os.path.join(self.output_dir, 'schedule_state.json')
+        self.logger = logging.getLogger('report_scheduler')
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.state = self._load_state()
+        # 报表以只读方式访问数据库，启动时先完成表结构升级
+        InventoryManager(self.db_path).close()
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.error(f"读取调度状态失败: {e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    @staticmethod
+    def last_slot(job, now):
+        """
+        计算不晚于当前时间的最近一次计划执行时间
+        :param job: 任务配置
+        :param now: 当前时间
+        """
+        hour, minute = map(int, job.get('at', '02:00').split(':'))
+        slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if job['every'] == 'weekly':
+            slot -= timedelta(days=(slot.weekday() - job.get('weekday', 0)) % 7)
+        if slot > now:
+            slot -= PERIODS[job['every']]
+        return slot
+
+    def due_jobs(self, now=None):
+        """
+        获取到期的任务
+        首次发现的任务和错过执行窗口（超过 Config.REPORT_SCHEDULE_GRACE_HOURS）的任务
+        只记录时间不补跑，避免在营业时间生成报表
+        :return: [(任务配置, 计划执行时间)]
+        """
+        now = now or datetime.now()
+        grace = timedelta(hours=Config.REPORT_SCHEDULE_GRACE_HOURS)
+        due = []
+        for job in self.jobs:
+            slot = self.last_slot(job, now)
+            job_state = self.state.setdefault(job['name'], {})
+            last_slot = job_state.get('last_slot')
+            if last_slot and datetime.strptime(last_slot, TIME_FORMAT) >= slot:
+                continue
+            if last_slot is None or now - slot > grace:
+                self.logger.info(f"跳过定时报表 {job['name']} 的执行时间 {slot}")
+                job_state['last_slot'] = slot.strftime(TIME_FORMAT)
+                continue
+            due.append((job, slot))
+        self._save_state()
+        return due
+
+    def run_pending(self, now=None):
+        """
+        执行所有到期的任务
+        :return: 生成的文件路径列表
+        """
+        files = []
+        for job, slot in self.due_jobs(now):
+            file_path = self.run_job(job, slot)
+            if file_path:
+                files.append(file_path)
+        return files
+
+    def run_job(self, job, slot=None):
+        """
+        执行单个定时任务：生成报表、清理过期文件并记录审计日志
+        交易报表使用增量日期范围，从上次结束时间的下一秒开始（查询两端都包含，时间戳精确到秒）
+        :param job: 任务配置
+        :param slot: 计划执行时间，默认当前时间
+        :return: 生成的文件路径，失败返回None
+        """
+        from report_generator import ReportGenerator
+
+        slot = slot or datetime.now()
+        if job['report_type'] == 'snapshot':
+            self.run_snapshot_job(job, slot)
+            return None
+        job_state = self.state.setdefault(job['name'], {})
+        job_dir = os.path.join(self.output_dir, job['name'])
+
+        params = {}
+        if job['report_type'] == 'history':
+            if job_state.get('last_end'):
+                # 上次报表已包含结束时间那一秒的记录
+                start = datetime.strptime(job_state['last_end'], TIME_FORMAT) + timedelta(seconds=1)
+            else:
+                start = slot - PERIODS[job['every']]
+            params = {'start_date': start.strftime(TIME_FORMAT), 'end_date': slot.strftime(TIME_FORMAT)}
+
+        started = time.perf_counter()
+        file_path = None
+        try:
+            # 审计日志由调度器统一记录，每次执行一条
+            generator = ReportGenerator(job_dir, db_path=self.db_path, read_only=True)
+            if job['report_type'] == 'history':
+                file_path = generator.generate_transaction_report(Config.SCHEDULER_OPERATOR_ID, **params)
+                job_state['last_end'] = params['end_date']
+            else:
+                file_path = generator.generate_inventory_report(Config.SCHEDULER_OPERATOR_ID)
+            status = f"报表文件: {os.path.basename(file_path)}"
+        except Exception as e:
+            self.logger.error(f"定时报表 {job['name']} 生成失败: {e}")
+            status = f"失败: {e}"
+
+        removed = self.apply_retention(job_dir, job.get('keep_days'))
+        elapsed = time.perf_counter() - started
+        job_state['last_slot'] = slot.strftime(TIME_FORMAT)
+        job_state['last_run'] = datetime.now().strftime(TIME_FORMAT)
+        self._save_state()
+
+        details = f"{status}, 耗时: {elapsed:.1f}秒, 清理过期文件: {removed}"
+        if params:
+            details += f", 范围: {params['start_date']} ~ {params['end_date']}"
+        with AuditLogger(self.db_path) as logger:
+            logger.log_action(Config.SCHEDULER_OPERATOR_ID, f"定时报表: {job['name']}",
+                              details=details, ip_address="N/A")
+        return file_path
+
+    def run_snapshot_job(self, job, slot):
+        """
+        记录库存快照并清理过期的每日快照
+        :param job: 任务配置
+        :param slot: 计划执行时间
+        :return: 快照ID，失败返回None
+        """
+        kind = 'monthly' if slot.day == 1 else 'daily'
+        with InventoryManager(self.db_path) as manager:
+            snapshot_id = manager.take_stock_snapshot(kind)
+            removed = manager.prune_stock_snapshots(job['keep_days']) if job.get('keep_days') else 0
+
+        job_state = self.state.setdefault(job['name'], {})
+        job_state['last_slot'] = slot.strftime(TIME_FORMAT)
+        job_state['last_run'] = datetime.now().strftime(TIME_FORMAT)
+        self._save_state()
+
+        status = f"快照ID: {snapshot_id}" if snapshot_id else "失败"
+        with AuditLogger(self.db_path) as logger:
+            logger.log_action(Config.SCHEDULER_OPERATOR_ID, f"库存快照: {job['name']}",
+                              details=f"{status}, 类型: {kind}, 清理过期快照: {removed}", ip_address="N/A")
+        return snapshot_id
+
+    def apply_retention(self, job_dir, keep_days):
+        """
+        删除超过保留天数的报表文件
+        :param job_dir: 任务输出目录
+        :param keep_days: 保留天数，None表示永久保留
+        :return: 删除的文件数
+        """
+        if not keep_days or not os.path.isdir(job_dir):
+            return 0
+        cutoff = time.time() - keep_days * 86400
+        removed = 0
+        for name in os.listdir(job_dir):
+            path = os.path.join(job_dir, name)
+            if name.endswith('.pdf') and os.path.getmtime(path) < cutoff:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError as e:
+                    self.logger.error(f"删除过期报表失败: {e}")
+        return removed
+
+    def run_forever(self, poll_seconds=60):
+        """持续运行，定期检查到期任务"""
+        self.logger.info(f"定时报表服务已启动，共 {len(self.jobs)} 个任务")
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                self.logger.error(f"定时报表检查失败: {e}")
+            time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="定时报表生成服务")
+    parser.add_argument('--db', default='inventory.db', help="数据库文件路径")
+    parser.add_argument('--loop', action='store_true', help="持续运行（否则检查一次后退出）")
+    parser.add_argument('--run', metavar='JOB', help="立即执行指定任务")
+    parser.add_argument('--poll', type=int, default=60, help="持续运行时的检查间隔（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    scheduler = ReportScheduler(db_path=args.db)
+
+    if args.run:
+        jobs = [job for job in scheduler.jobs if job['name'] == args.run]
+        if not jobs:
+            parser.error(f"未找到任务: {args.run}")
+        print(scheduler.run_job(jobs[0]))
+    elif args.loop:
+        scheduler.run_forever(args.poll)
+    else:
+        for file_path in scheduler.run_pending():
+            print(file_path)
+
+
+if __name__ == "__main__":
+    main()
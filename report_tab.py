@@ -1,14 +1,26 @@
+import os
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QComboBox, QLabel, QDateEdit, QGroupBox, QMessageBox)
+                             QComboBox, QLabel, QDateEdit, QGroupBox, QMessageBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QProgressBar,
+                             QCheckBox)
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import QDate, Qt
-from report_generator import ReportGenerator
-from charts import InventoryChart
+from PyQt5.QtCore import QDate, Qt, QObject, pyqtSignal
+from report_jobs import ReportJobManager, REPORT_TYPES, STATUS_NAMES
+from charts import AsyncInventoryChart
 from config import Config
 
+class ReportJobSignals(QObject):
+    """将后台线程中的任务状态变化转发到界面线程"""
+    job_updated = pyqtSignal(object)
+
 class ReportTab(QWidget):
     def __init__(self):
         super().__init__()
+        self.job_rows = {}
+        self.job_signals = ReportJobSignals()
+        self.job_signals.job_updated.connect(self.update_job_row)
+        self.job_manager = ReportJobManager()
+        self.job_manager.add_listener(self.job_signals.job_updated.emit)
         self.setup_ui()
     
     def setup_ui(self):
@@ -58,9 +70,53 @@ class ReportTab(QWidget):
         generate_btn.setStyleSheet("background-color: #4CAF50; color: white;")
         generate_btn.clicked.connect(self.generate_report)
         
+        # 后台报表任务列表
+        self.job_table = QTableWidget()
+        self.job_table.setColumnCount(5)
+        self.job_table.setHorizontalHeaderLabels(["任务", "报表类型", "状态", "进度", "文件"])
+        self.job_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.job_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.job_table.setSelectionMode(QTableWidget.SingleSelection)
+        self.job_table.setMaximumHeight(150)
+        
+        cancel_btn = QPushButton("取消任务")
+        cancel_btn.clicked.connect(self.cancel_selected_job)
+        
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        btn_layout.addWidget(cancel_btn)
+        btn_layout.addWidget(generate_btn)
+        
+        # 数据导出（CSV / XLSX / JSONL）
+        export_layout = QHBoxLayout()
+        export_layout.addWidget(QLabel("导出数据:"))
+        
+        self.export_combo = QComboBox()
+        self.export_combo.addItem("商品数据", "export_products")
+        self.export_combo.addItem("库存历史", "export_history")
+        self.export_combo.addItem("审计日志", "export_audit")
+        
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("CSV", "csv")
+        self.format_combo.addItem("Excel (XLSX)", "xlsx")
+        self.format_combo.addItem("JSON Lines", "jsonl")
+        
+        self.compress_check = QCheckBox("gzip压缩")
+        
+        export_btn = QPushButton("导出")
+        export_btn.clicked.connect(self.export_data)
+        
+        export_layout.addWidget(self.export_combo)
+        export_layout.addWidget(self.format_combo)
+        export_layout.addWidget(self.compress_check)
+        export_layout.addWidget(export_btn)
+        export_layout.addStretch()
+        
         report_layout.addLayout(type_layout)
         report_layout.addWidget(self.date_range_container)
-        report_layout.addWidget(generate_btn, alignment=Qt.AlignRight)
+        report_layout.addLayout(btn_layout)
+        report_layout.addLayout(export_layout)
+        report_layout.addWidget(self.job_table)
         report_group.setLayout(report_layout)
         
         # 图表区域
@@ -76,6 +132,7 @@ class ReportTab(QWidget):
         self.chart_combo.addItem("类别分布", "category_distribution")
         self.chart_combo.addItem("库存总量分布", "stock_by_category")
         self.chart_combo.addItem("出入库趋势", "in_out_trend")
+        self.chart_combo.currentIndexChanged.connect(self.refresh_chart)
         
         refresh_btn = QPushButton("刷新图表")
         refresh_btn.clicked.connect(self.refresh_chart)
@@ -84,8 +141,8 @@ class ReportTab(QWidget):
         chart_type_layout.addWidget(refresh_btn)
         chart_type_layout.addStretch()
         
-        # 图表显示区域
-        self.chart = InventoryChart(self, width=10, height=6)
+        # 图表显示区域（后台渲染，切换图表时自动取消未完成的请求）
+        self.chart = AsyncInventoryChart(self, width=10, height=6)
         
         chart_layout.addLayout(chart_type_layout)
         chart_layout.addWidget(self.chart)
@@ -104,36 +161,70 @@ class ReportTab(QWidget):
         self.date_range_container.setVisible(report_type == "history")
     
     def generate_report(self):
+        """提交后台报表任务，生成期间界面可继续操作"""
         report_type = self.report_combo.currentData()
-        generator = ReportGenerator(Config.REPORT_DIR)
-        
-        if report_type == "inventory":
-            # 使用当前操作员ID（这里假设从Config获取）
-            operator_id = getattr(Config, 'CURRENT_USER', 'admin')
-            file_path = generator.generate_inventory_report(
-                operator_id=operator_id
-            )
-            QMessageBox.information(self, "成功", f"库存总览报告已生成: {file_path}")
-        elif report_type == "history":
-            start_date = self.start_date.date().toString("yyyy-MM-dd")
-            end_date = self.end_date.date().toString("yyyy-MM-dd")
-            # 使用当前操作员ID（这里假设从Config获取）
-            operator_id = getattr(Config, 'CURRENT_USER', 'admin')
-            file_path = generator.generate_transaction_report(
-                operator_id=operator_id,
-                start_date=start_date,
-                end_date=end_date
+        # 使用当前操作员ID（这里假设从Config获取）
+        operator_id = getattr(Config, 'CURRENT_USER', 'admin')
+        
+        params = {}
+        if report_type == "history":
+            params['start_date'] = self.start_date.date().toString("yyyy-MM-dd")
+            params['end_date'] = self.end_date.date().toString("yyyy-MM-dd")
+        
+        try:
+            self.job_manager.submit(report_type, operator_id, **params)
+        except Exception as e:
+            QMessageBox.warning(self, "失败", f"提交报表任务失败: {e}")
+    
+    def export_data(self):
+        """提交后台导出任务"""
+        operator_id = getattr(Config, 'CURRENT_USER', 'admin')
+        try:
+            self.job_manager.submit(
+                self.export_combo.currentData(),
+                operator_id,
+                fmt=self.format_combo.currentData(),
+                compress=self.compress_check.isChecked()
             )
-            QMessageBox.information(self, "成功", f"库存历史报告已生成: {file_path}")
+        except Exception as e:
+            QMessageBox.warning(self, "失败", f"提交导出任务失败: {e}")
+    
+    def cancel_selected_job(self):
+        row = self.job_table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "错误", "请先选择一个报表任务")
+            return
+        
+        job_id = self.job_table.item(row, 0).text()
+        if not self.job_manager.cancel(job_id):
+            QMessageBox.information(self, "提示", "该任务已结束，无法取消")
+    
+    def update_job_row(self, job):
+        """在界面线程中刷新任务状态"""
+        row = self.job_rows.get(job.job_id)
+        if row is None:
+            row = self.job_table.rowCount()
+            self.job_rows[job.job_id] = row
+            self.job_table.insertRow(row)
+            self.job_table.setItem(row, 0, QTableWidgetItem(job.job_id))
+            self.job_table.setItem(row, 1, QTableWidgetItem(REPORT_TYPES[job.report_type][1]))
+            self.job_table.setCellWidget(row, 3, QProgressBar())
+        
+        self.job_table.setItem(row, 2, QTableWidgetItem(STATUS_NAMES[job.status]))
+        self.job_table.cellWidget(row, 3).setValue(int(job.progress * 100))
+        self.job_table.setItem(row, 4, QTableWidgetItem(
+            os.path.basename(job.file_path) if job.file_path else (job.error or "")))
+        
+        if job.status == "finished":
+            QMessageBox.information(self, "成功", f"文件已生成: {job.file_path}")
+        elif job.status == "failed":
+            QMessageBox.warning(self, "失败", f"任务执行失败: {job.error}")
+    
+    def shutdown(self):
+        """关闭后台报表任务和图表渲染线程"""
+        self.chart.shutdown()
+        self.job_manager.shutdown()
     
     def refresh_chart(self):
         chart_type = self.chart_combo.currentData()
-        
-        if chart_type == "stock_levels":
-            self.chart.plot_stock_levels()
-        elif chart_type == "category_distribution":
-            self.chart.plot_category_distribution()
-        elif chart_type == "stock_by_category":
-            self.chart.plot_stock_value_by_category()
-        elif chart_type == "in_out_trend":
-            self.chart.plot_in_out_trend()
\ No newline at end of file
+        self.chart.request_chart(chart_type)
\ No newline at end of file
@@ -0,0 +1,214 @@
+import os
+import random
+import sqlite3
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+
+# 与正式数据库一致的原始表结构，打开 InventoryManager 时会自动升级到最新结构
+SCHEMA = [
+    '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT CHECK(role IN ('admin', 'sales')) NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        specification TEXT,
+        supplier TEXT,
+        location TEXT,
+        barcode TEXT UNIQUE,
+        image_path TEXT,
+        stock INTEGER DEFAULT 0,
+        min_stock INTEGER DEFAULT 5
+    )
+    ''',
+    '''
+    CREATE TABLE inventory_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL,
+        change_amount INTEGER NOT NULL,
+        operation_type TEXT CHECK(operation_type IN ('in', 'out')) NOT NULL,
+        operator_id INTEGER NOT NULL,
+        operation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP, notes TEXT,
+        FOREIGN KEY (product_id) REFERENCES products(id),
+        FOREIGN KEY (operator_id) REFERENCES users(id)
+    )
+    ''',
+    '''
+    CREATE TABLE audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        details TEXT, ip_address TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+]
+
+CATEGORIES = ["非处方", "OTC甲类", "OTC乙类", "处方药", "中成药", "保健品", "医疗器械", "个人护理",
+              "日用百货", "食品饮料", "母婴用品", "消毒用品", "中药饮片", "营养补充", "眼部护理"]
+BRANDS = ["同仁", "九芝", "华润", "白云", "康恩", "仁和", "修正", "哈药", "云南", "广誉", "葵花", "太极",
+          "江中", "汤臣", "东阿", "以岭", "天士", "步长", "马应龙", "片仔"]
+PRODUCT_TYPES = ["感冒灵颗粒", "板蓝根颗粒", "维生素C片", "阿莫西林胶囊", "布洛芬缓释胶囊", "蒲地蓝消炎片",
+                 "健胃消食片", "藿香正气水", "复方甘草片", "六味地黄丸", "钙片", "鱼油软胶囊", "医用口罩",
+                 "创可贴", "碘伏消毒液", "电子体温计", "润喉糖", "眼药水", "护手霜", "蛋白粉"]
+SPECIFICATIONS = ["10g*10袋", "24粒", "60片", "100ml", "0.3g*36粒", "12袋", "200g", "50只/盒", "1支", "30粒*2瓶"]
+CITIES = ["北京", "上海", "广州", "成都", "武汉", "杭州", "兰州", "锦州", "苏州", "哈尔滨"]
+COMPANY_SUFFIXES = ["制药股份有限公司", "医药有限公司", "药业有限公司", "健康科技有限公司", "生物制品有限公司"]
+
+
+def _zipf_weights(count, exponent=1.1):
+    """长尾分布权重：少数类别/位置/商品占大部分数据"""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def _ean13(number):
+    digits = f"69{number:010d}"
+    checksum = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(checksum)
+
+
+def generate_database(db_path, products=1000, history=20000, audit=None, days=365,
+                      seed=42, users=10, overwrite=False):
+    """
+    生成测试数据库（同一组参数和随机种子总是生成相同的数据）
+    :param db_path: 数据库文件路径
+    :param products: 商品数量
+    :param history: 库存历史记录数量
+    :param audit: 审计日志数量，默认与库存历史数量相同
+    :param days: 历史记录覆盖的天数（截止到当前时间）
+    :param seed: 随机种子
+    :param users: 操作员数量
+    :param overwrite: 文件已存在时是否覆盖
+    :return: 数据库文件路径
+    """
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise FileExistsError(db_path)
+        os.remove(db_path)
+    rng = random.Random(seed)
+    audit = history if audit is None else audit
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    cursor.execute("INSERT INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
+    cursor.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, 'sales')",
+                       [(f"clerk{i:02d}", "sales123") for i in range(1, users)])
+
+    # 商品：类别和库存位置呈长尾分布
+    locations = [f"{zone}-{shelf:03d}" for zone in "ABCDEFGH" for shelf in range(1, 26)]
+    suppliers = [f"{rng.choice(CITIES)}{rng.choice(BRANDS)}{rng.choice(COMPANY_SUFFIXES)}" for _ in range(60)]
+    category_weights = _zipf_weights(len(CATEGORIES))
+    location_weights = _zipf_weights(len(locations), 0.8)
+    supplier_weights = _zipf_weights(len(suppliers), 0.9)
+    categories = rng.choices(CATEGORIES, category_weights, k=products)
+    product_suppliers = rng.choices(suppliers, supplier_weights, k=products)
+    product_locations = rng.choices(locations, location_weights, k=products)
+    product_rows = []
+    for i in range(1, products + 1):
+        name = f"{rng.choice(BRANDS)}{rng.choice(PRODUCT_TYPES)}"
+        if i > len(BRANDS) * len(PRODUCT_TYPES):
+            name += f"({i})"
+        product_rows.append((
+            name,
+            categories[i - 1],
+            rng.choice(SPECIFICATIONS),
+            product_suppliers[i - 1],
+            product_locations[i - 1],
+            _ean13(i),
+            rng.choice([5, 10, 20, 50]),
+        ))
+    cursor.executemany('''
+    INSERT INTO products (name, category, specification, supplier, location, barcode, min_stock)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', product_rows)
+
+    # 库存历史：按时间顺序生成，热门商品变动更频繁，出库数量不超过当前库存
+    stock = [0] * (products + 1)
+    product_ids = list(range(1, products + 1))
+    picks = rng.choices(product_ids, _zipf_weights(products, 0.9), k=history)
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / max(history, 1)
+    history_rows = []
+    for i, product_id in enumerate(picks):
+        operation_time = start + timedelta(seconds=i * step + rng.random() * step)
+        if stock[product_id] > 0 and rng.random() < 0.6:
+            amount, operation_type = rng.randint(1, min(stock[product_id], 40)), 'out'
+            stock[product_id] -= amount
+        else:
+            amount, operation_type = rng.randint(5, 50), 'in'
+            stock[product_id] += amount
+        history_rows.append((product_id, amount, operation_type, rng.randint(1, users),
+                             operation_time.strftime('%Y-%m-%d %H:%M:%S'), None))
+    cursor.executemany('''
+    INSERT INTO inventory_history (product_id, change_amount, operation_type, operator_id, operation_time, notes)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', history_rows)
+    cursor.executemany("UPDATE products SET stock = ? WHERE id = ?",
+                       [(stock[product_id], product_id) for product_id in product_ids])
+
+    # 审计日志：timestamp 为UTC时间，与 CURRENT_TIMESTAMP 一致
+    actions = ["入库 商品", "出库 商品", "更新商品", "登录系统", "生成库存报表", "添加商品"]
+    step = days * 86400 / max(audit, 1)
+    audit_actions = rng.choices(actions, [40, 35, 10, 10, 3, 2], k=audit)
+    audit_rows = []
+    for i, action in enumerate(audit_actions):
+        timestamp = (start + timedelta(seconds=i * step)).astimezone(timezone.utc)
+        audit_rows.append((rng.randint(1, users), f"{action}，商品ID: {rng.randint(1, products)}",
+                           timestamp.strftime('%Y-%m-%d %H:%M:%S'), "N/A"))
+    cursor.executemany("INSERT INTO audit_log (user_id, action, timestamp, ip_address) VALUES (?, ?, ?, ?)",
+                       audit_rows)
+    conn.commit()
+    conn.close()
+
+    # 升级到最新表结构（字典表、整数时间戳、索引、触发器等）
+    from inventory_manager import InventoryManager
+    InventoryManager(db_path).close()
+    return db_path
+
+
+def copy_database(source, target):
+    """
+    复制数据库（使用SQLite在线备份，WAL模式下尚未写回主文件的内容也会复制）
+    :param source: 源数据库路径
+    :param target: 目标数据库路径
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成测试数据库")
+    parser.add_argument('db', help="输出的数据库文件路径")
+    parser.add_argument('--products', type=int, default=1000, help="商品数量")
+    parser.add_argument('--history', type=int, default=20000, help="库存历史记录数量")
+    parser.add_argument('--audit', type=int, default=None, help="审计日志数量（默认与库存历史相同）")
+    parser.add_argument('--days', type=int, default=365, help="历史记录覆盖的天数")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--force', action='store_true', help="覆盖已存在的文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    generate_database(args.db, args.products, args.history, args.audit, args.days,
+                      args.seed, overwrite=args.force)
+    print(f"已生成测试数据库: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import time
+from PyQt5.QtWidgets import QTableWidgetItem, QMessageBox
+from PyQt5.QtGui import QColor
+from PyQt5.QtCore import QObject, QEvent, Qt, pyqtSignal
+from inventory_manager import InventoryManager
+from config import Config
+
+
+class ScannerInputFilter(QObject):
+    """
+    扫码枪输入识别：USB扫码枪模拟键盘快速输入条形码并以回车结束
+    根据按键间隔区分扫码和人工输入，识别到扫码时发出 barcode_scanned 信号并吞掉回车，
+    人工输入的回车照常传递给输入框
+    """
+    barcode_scanned = pyqtSignal(str)
+
+    def __init__(self, line_edit, max_interval_ms=None, min_length=None):
+        """
+        :param line_edit: 需要监听的输入框
+        :param max_interval_ms: 扫码时相邻按键的最大间隔（毫秒），默认 Config.SCANNER_WEDGE_MAX_INTERVAL_MS
+        :param min_length: 条形码最短长度，默认 Config.SCANNER_WEDGE_MIN_LENGTH
+        """
+        super().__init__(line_edit)
+        self.line_edit = line_edit
+        self.max_interval = (max_interval_ms or Config.SCANNER_WEDGE_MAX_INTERVAL_MS) / 1000
+        self.min_length = min_length or Config.SCANNER_WEDGE_MIN_LENGTH
+        self._buffer = []
+        self._last_key_time = 0.0
+        line_edit.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if obj is not self.line_edit or event.type() != QEvent.KeyPress:
+            return False
+
+        now = time.perf_counter()
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            barcode = "".join(self._buffer)
+            is_scan = len(barcode) >= self.min_length and now - self._last_key_time <= self.max_interval
+            self._buffer = []
+            if is_scan:
+                # 清除扫码枪输入到输入框中的字符
+                text = self.line_edit.text()
+                if text.endswith(barcode):
+                    self.line_edit.setText(text[:-len(barcode)])
+                self.barcode_scanned.emit(barcode)
+                return True
+            return False
+
+        char = event.text()
+        if char and char.isprintable():
+            # 间隔过长说明是人工输入，重新开始累计
+            if now - self._last_key_time > self.max_interval:
+                self._buffer = []
+            self._buffer.append(char)
+            self._last_key_time = now
+        return False
+
+
+class ProductPickerMixin:
+    """
+    出入库页面共用的商品表格操作：填充商品行、按扫码结果选中商品
+    使用方需提供 table、quantity_input 和 product_selected(row, column)
+    """
+
+    def fill_row(self, row, product):
+        # 状态判断
+        status = "正常" if product['stock'] > product['min_stock'] else "低库存"
+        status_color = Config.NORMAL_STOCK_COLOR if status == "正常" else Config.LOW_STOCK_COLOR
+
+        # 填充数据
+        self.table.setItem(row, 0, QTableWidgetItem(str(product['id'])))
+        self.table.setItem(row, 1, QTableWidgetItem(product['name']))
+        self.table.setItem(row, 2, QTableWidgetItem(product['category']))
+        self.table.setItem(row, 3, QTableWidgetItem(product['location']))
+        self.table.setItem(row, 4, QTableWidgetItem(str(product['stock'])))
+        self.table.setItem(row, 5, QTableWidgetItem(str(product['min_stock'])))
+
+        status_item = QTableWidgetItem(status)
+        status_item.setForeground(QColor(status_color))
+        self.table.setItem(row, 6, status_item)
+
+    def select_product_by_barcode(self, barcode):
+        """扫码枪输入：按条形码精确查找商品，选中后直接进入数量输入"""
+        with InventoryManager() as manager:
+            product = manager.get_product_by_barcode(barcode)
+        if product is None:
+            QMessageBox.warning(self, "未找到", f"未找到条形码为 {barcode} 的商品")
+            return
+
+        # 商品在当前列表中则直接选中，否则只显示该商品
+        target_row = None
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item and int(item.text()) == product['id']:
+                target_row = row
+                break
+        if target_row is None:
+            self.table.setRowCount(1)
+            target_row = 0
+        self.fill_row(target_row, product)
+
+        self.table.selectRow(target_row)
+        self.table.scrollToItem(self.table.item(target_row, 0))
+        self.product_selected(target_row, 0)
+        self.quantity_input.setFocus()
+        self.quantity_input.selectAll()
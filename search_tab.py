@@ -5,6 +5,7 @@ from PyQt5.QtGui import QColor, QIcon
 from PyQt5.QtCore import Qt
 from inventory_manager import InventoryManager
 from config import Config
+from diagnostics import timed
 
 class SearchTab(QWidget):
     def __init__(self):
@@ -70,6 +71,7 @@ class SearchTab(QWidget):
         
         self.setLayout(main_layout)
     
+    @timed('load_data')
     def load_data(self):
         name = self.name_input.text().strip()
         category = self.category_combo.currentData()
@@ -0,0 +1,328 @@
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from config import Config
+
+# 每条语句保留的耗时样本数（用于计算百分位），超出后循环覆盖
+SAMPLE_SIZE = 1000
+
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+_WHITESPACE = re.compile(r'\s+')
+
+
+def is_enabled():
+    """是否启用SQL跟踪：Config.SQL_TRACE_ENABLED 或环境变量 INVENTORY_SQL_TRACE=1"""
+    return Config.SQL_TRACE_ENABLED or os.environ.get('INVENTORY_SQL_TRACE') == '1'
+
+
+def normalize_sql(sql):
+    """合并空白字符，使同一语句的不同排版归为一类"""
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _caller():
+    """
+    查找发出语句的调用方法（跳过本模块的帧）
+    :return: 形如 InventoryManager.search_products 的名称
+    """
+    frame = sys._getframe(2)
+    while frame and os.path.normcase(os.path.abspath(frame.f_code.co_filename)) == _THIS_FILE:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    code = frame.f_code
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+class StatementStats:
+    def __init__(self, sql, caller):
+        """单条语句（按语句文本和调用方法区分）的统计信息"""
+        self.sql = sql
+        self.caller = caller
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = []
+        self._next_slot = 0
+
+    def add_sample(self, elapsed):
+        """
+        记录一次执行
+        :return: 样本位置，读取结果的耗时会累加到该位置
+        """
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(elapsed)
+            return len(self.samples) - 1
+        slot = self._next_slot
+        self.samples[slot] = elapsed
+        self._next_slot = (slot + 1) % SAMPLE_SIZE
+        return slot
+
+    def add_fetch(self, slot, elapsed, rows):
+        self.total += elapsed
+        self.rows += rows
+        self.samples[slot] += elapsed
+        self.max = max(self.max, self.samples[slot])
+        return self.samples[slot]
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def to_dict(self):
+        return {
+            'sql': self.sql,
+            'caller': self.caller,
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.50) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'rows': self.rows,
+        }
+
+
+class SQLTracer:
+    def __init__(self, slow_ms=None, log_file=None):
+        """
+        SQL跟踪器：汇总各语句的执行次数、耗时和返回行数，慢查询写入日志文件
+        :param slow_ms: 慢查询阈值（毫秒），默认 Config.SQL_SLOW_QUERY_MS
+        :param log_file: 慢查询日志文件，默认 Config.LOG_FILE
+        """
+        self.slow_ms = slow_ms if slow_ms is not None else Config.SQL_SLOW_QUERY_MS
+        self.log_file = log_file or Config.LOG_FILE
+        self.stats = {}
+        self.slow_count = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._slow_logger = None
+
+    @property
+    def slow_logger(self):
+        """慢查询日志（首次记录时才创建日志文件）"""
+        if self._slow_logger is None:
+            logger = logging.getLogger('sql_trace')
+            if not any(isinstance(handler, logging.FileHandler) and handler.baseFilename == os.path.abspath(self.log_file)
+                       for handler in logger.handlers):
+                handler = logging.FileHandler(self.log_file, encoding='utf-8')
+                handler.setFormatter(logging.Formatter(Config.LOG_FORMAT))
+                logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            self._slow_logger = logger
+        return self._slow_logger
+
+    def record(self, sql, caller, elapsed):
+        """
+        记录一次语句执行
+        :return: (统计对象, 样本位置)
+        """
+        key = (sql, caller)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = StatementStats(normalize_sql(sql), caller)
+            slot = stats.add_sample(elapsed)
+        if elapsed * 1000 >= self.slow_ms:
+            self._log_slow(stats, elapsed)
+        return stats, slot
+
+    def record_fetch(self, stats, slot, elapsed, rows):
+        """将读取结果的耗时和行数计入对应的执行记录"""
+        with self._lock:
+            before = stats.samples[slot]
+            after = stats.add_fetch(slot, elapsed, rows)
+        # 执行和读取分开计时，累计耗时首次超过阈值时记录一次
+        if before * 1000 < self.slow_ms <= after * 1000:
+            self._log_slow(stats, after)
+
+    def _log_slow(self, stats, elapsed):
+        with self._lock:
+            self.slow_count += 1
+        self.slow_logger.warning(f"慢查询 {elapsed * 1000:.1f} ms [{stats.caller}] {stats.sql}")
+
+    def summary(self, top=20, sort='total_ms'):
+        """
+        获取统计汇总
+        :param top: 返回的语句数量，None表示全部
+        :param sort: 排序字段（total_ms / count / p95_ms / max_ms / rows）
+        :return: 语句统计字典列表，按排序字段降序
+        """
+        with self._lock:
+            items = [stats.to_dict() for stats in self.stats.values()]
+        items.sort(key=lambda item: item[sort], reverse=True)
+        return items[:top] if top else items
+
+    def format_summary(self, top=20, sort='total_ms'):
+        """生成文本格式的统计汇总"""
+        lines = [f"SQL统计（{time.strftime('%Y-%m-%d %H:%M:%S')}，共 {len(self.stats)} 条语句，"
+                 f"慢查询 {self.slow_count} 次）",
+                 f"{'次数':>8}{'总计(ms)':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'最大(ms)':>10}{'行数':>10}  调用方法 / 语句"]
+        for item in self.summary(top, sort):
+            lines.append(f"{item['count']:>8}{item['total_ms']:>12.1f}{item['p50_ms']:>10.2f}{item['p95_ms']:>10.2f}"
+                         f"{item['max_ms']:>10.2f}{item['rows']:>10}  {item['caller']}")
+            lines.append(f"{'':>60}  {item['sql'][:200]}")
+        return "\n".join(lines)
+
+    def dump(self, file_path=None, top=None):
+        """
+        输出统计汇总：指定文件时写入JSON，否则写入日志文件
+        :param file_path: JSON文件路径
+        :param top: 输出的语句数量，None表示全部
+        """
+        if file_path:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({'started_at': self.started_at, 'slow_ms': self.slow_ms,
+                           'slow_count': self.slow_count, 'statements': self.summary(top)},
+                          f, ensure_ascii=False, indent=2)
+        elif self.stats:
+            self.slow_logger.info(self.format_summary(top or 50))
+
+    def reset(self):
+        """清空统计信息"""
+        with self._lock:
+            self.stats.clear()
+            self.slow_count = 0
+            self.started_at = time.time()
+
+
+class TracingCursor(sqlite3.Cursor):
+    """
+    记录每条语句执行及读取结果耗时的游标
+    在Python层计时：executescript 整个脚本计为一条，触发器中的语句计入触发它的语句
+    """
+
+    _trace = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._trace = tracer.record(sql, _caller(), time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._trace = tracer.record(sql, _caller(), time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._trace = tracer.record(sql_script, _caller(), time.perf_counter() - started)
+
+    def _record_fetch(self, started, rows):
+        if self._trace is not None:
+            tracer.record_fetch(*self._trace, time.perf_counter() - started, rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._record_fetch(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._record_fetch(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._record_fetch(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._record_fetch(started, 0)
+            raise
+        self._record_fetch(started, 1)
+        return row
+
+
+class TracingConnection(sqlite3.Connection):
+    """默认使用 TracingCursor 的连接，提交耗时也计入统计"""
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            tracer.record("COMMIT", _caller(), time.perf_counter() - started)
+
+
+def read_only_uri(db_path):
+    """
+    生成只读打开数据库的URI（路径中的空格、#、?、% 等字符需要转义）
+    :param db_path: 数据库文件路径
+    """
+    return Path(db_path).resolve().as_uri() + "?mode=ro"
+
+
+def connect(db_path, read_only=False):
+    """
+    打开数据库连接，启用SQL跟踪时返回带计时的连接
+    :param db_path: 数据库文件路径
+    :param read_only: 是否以只读方式打开
+    :return: sqlite3 连接
+    """
+    factory = TracingConnection if is_enabled() else sqlite3.Connection
+    timeout = Config.DB_BUSY_TIMEOUT_MS / 1000
+    if read_only:
+        return sqlite3.connect(read_only_uri(db_path), uri=True, timeout=timeout, factory=factory)
+    return sqlite3.connect(db_path, timeout=timeout, factory=factory)
+
+
+# 进程内共享的跟踪器，启用跟踪时退出前将统计汇总写入日志文件
+tracer = SQLTracer()
+if is_enabled():
+    atexit.register(tracer.dump)
+
+
+if __name__ == "__main__":
+    # 测试代码
+    logging.basicConfig(level=logging.INFO)
+    Config.SQL_TRACE_ENABLED = True
+    # 以脚本方式运行时，管理类使用的是 sql_trace 模块中的跟踪器
+    import sql_trace
+    from inventory_manager import InventoryManager
+
+    with InventoryManager() as manager:
+        manager.search_products()
+        manager.get_low_stock_products()
+        manager.get_inventory_history(start_date='2025-01-01')
+    print(sql_trace.tracer.format_summary(top=10))
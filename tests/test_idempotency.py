@@ -0,0 +1,97 @@
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+from db_retry import retry_stats
+from sample_data import generate_database
+from inventory_manager import InventoryManager
+
+
+class IdempotencyKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'inventory.db')
+        # 回滚日志模式下读事务会阻止提交，用于模拟锁等待超时（需在建库前设置）
+        for name, value in (('DB_JOURNAL_MODE', "DELETE"), ('DB_BUSY_TIMEOUT_MS', 20),
+                            ('DB_RETRY_ATTEMPTS', 50), ('DB_RETRY_BASE_MS', 10), ('DB_RETRY_MAX_MS', 50),
+                            ('WRITE_COORDINATOR_ENABLED', False)):
+            patcher = mock.patch.object(Config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        generate_database(self.db_path, products=5, history=0, audit=0, users=2)
+        self.manager = InventoryManager(self.db_path)
+        self.addCleanup(self.manager.close)
+        self.stock = self._stock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _stock(self):
+        return dict(self.manager.conn.execute("SELECT id, stock FROM products").fetchall())
+
+    def _history(self):
+        return self.manager.conn.execute(
+            "SELECT product_id, change_amount, idempotency_key FROM inventory_history ORDER BY id").fetchall()
+
+    def _lock_database(self):
+        """打开一个持有共享锁的读事务，返回释放锁的函数"""
+        reader = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(reader.close)
+        reader.execute("BEGIN")
+        reader.execute("SELECT COUNT(*) FROM products").fetchone()
+        return lambda: reader.execute("COMMIT")
+
+    def test_update_stock_replay_applies_once(self):
+        self.assertTrue(self.manager.update_stock(1, 1, 3, 'in', idempotency_key="op-1"))
+        self.assertTrue(self.manager.update_stock(1, 1, 3, 'in', idempotency_key="op-1"))
+        self.assertEqual(self._stock()[1], self.stock[1] + 3)
+        self.assertEqual(self._history(), [(1, 3, "op-1")])
+
+        # 不同标识的相同操作正常生效
+        self.assertTrue(self.manager.update_stock(1, 1, 3, 'in', idempotency_key="op-2"))
+        self.assertEqual(self._stock()[1], self.stock[1] + 6)
+
+    def test_update_stock_batch_replay_applies_once(self):
+        changes = {2: 1, 3: 2}
+        self.assertTrue(self.manager.update_stock_batch(1, changes, 'in', idempotency_key="batch-1"))
+        self.assertTrue(self.manager.update_stock_batch(1, changes, 'in', idempotency_key="batch-1"))
+        stock = self._stock()
+        self.assertEqual(stock[2], self.stock[2] + 1)
+        self.assertEqual(stock[3], self.stock[3] + 2)
+        self.assertEqual(self._history(), [(2, 1, "batch-1:2"), (3, 2, "batch-1:3")])
+
+    def test_busy_retry_does_not_double_apply(self):
+        retry_stats.reset()
+        release = threading.Timer(0.3, self._lock_database())
+        self.addCleanup(release.cancel)
+        release.start()
+        self.assertTrue(self.manager.update_stock(1, 4, 2, 'in', idempotency_key="busy-1"))
+        self.assertGreaterEqual(retry_stats.snapshot()['inventory_manager']['recovered'], 1)
+        self.assertEqual(self._stock()[4], self.stock[4] + 2)
+        self.assertEqual(self._history(), [(4, 2, "busy-1")])
+
+    def test_resubmit_after_busy_failure_applies_once(self):
+        release = self._lock_database()
+        with mock.patch.object(Config, 'DB_RETRY_ATTEMPTS', 2):
+            # 重试用尽，操作整体回滚
+            self.assertFalse(self.manager.update_stock_batch(1, {5: 4}, 'in', idempotency_key="resubmit-1"))
+        self.assertEqual(self._history(), [])
+        release()
+
+        self.assertTrue(self.manager.update_stock_batch(1, {5: 4}, 'in', idempotency_key="resubmit-1"))
+        self.assertTrue(self.manager.update_stock_batch(1, {5: 4}, 'in', idempotency_key="resubmit-1"))
+        self.assertEqual(self._stock()[5], self.stock[5] + 4)
+        self.assertEqual(self._history(), [(5, 4, "resubmit-1:5")])
+
+
+if __name__ == '__main__':
+    unittest.main()
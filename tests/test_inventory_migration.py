@@ -0,0 +1,85 @@
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from inventory_manager import InventoryManager
+
+# 升级前的商品表结构（类别、库存位置、供应商以文本保存）
+BASELINE_PRODUCTS = '''
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    specification TEXT,
+    supplier TEXT,
+    location TEXT,
+    barcode TEXT UNIQUE,
+    image_path TEXT,
+    stock INTEGER DEFAULT 0,
+    min_stock INTEGER DEFAULT 5
+)
+'''
+
+
+class DimensionMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'inventory.db')
+        baseline = os.path.join(ROOT, 'inventory.db')
+        if os.path.exists(baseline):
+            # 使用随程序发布的数据库，只替换商品数据
+            shutil.copy(baseline, self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("DROP VIEW IF EXISTS product_details")
+        conn.execute("DROP TABLE IF EXISTS products")
+        conn.execute(BASELINE_PRODUCTS)
+        conn.executemany('''
+        INSERT INTO products (name, category, specification, supplier, location, barcode, stock)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            ("螺丝", "五金", "M4", "供应商A", "A-01", "1001", 10),
+            ("未分类商品", "", None, "", "", "1002", 3),
+            ("垫片", "五金", None, None, None, "1003", 0),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_migrates_empty_dimensions(self):
+        with InventoryManager(self.db_path) as manager:
+            columns = [row[1] for row in manager.conn.execute("PRAGMA table_info(products)")]
+            self.assertNotIn('category', columns)
+            self.assertIn('category_id', columns)
+
+            products = {product['barcode']: product for product in manager.search_products()}
+            self.assertEqual(len(products), 3)
+            self.assertEqual(products['1001']['category'], "五金")
+            self.assertEqual(products['1001']['location'], "A-01")
+            self.assertEqual(products['1002']['category'], "")
+            self.assertEqual(products['1002']['location'], "")
+            self.assertEqual(products['1003']['stock'], 0)
+            self.assertEqual(manager.get_all_categories(), ["五金"])
+
+    def test_add_product_after_migration(self):
+        with InventoryManager(self.db_path) as manager:
+            first = manager.add_product(1, "新商品", "新类别", "", "", "", barcode="2001")
+            second = manager.add_product(1, "新商品2", "新类别", "", "", "", barcode="2002")
+            self.assertIsInstance(first, int)
+            self.assertIsInstance(second, int)
+            self.assertEqual(manager.get_product_by_id(second)['category'], "新类别")
+            count = manager.conn.execute(
+                "SELECT COUNT(*) FROM categories WHERE name = ?", ("新类别",)).fetchone()[0]
+            self.assertEqual(count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+from db_retry import retry_stats
+from sample_data import generate_database
+from write_coordinator import WriteCoordinator
+
+
+class WriteCoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'inventory.db')
+        # 回滚日志模式下读事务会阻止提交，用于模拟提交时的锁等待（需在建库前设置）
+        for name, value in (('DB_JOURNAL_MODE', "DELETE"), ('DB_BUSY_TIMEOUT_MS', 20),
+                            ('DB_RETRY_ATTEMPTS', 50), ('DB_RETRY_BASE_MS', 10), ('DB_RETRY_MAX_MS', 50)):
+            patcher = mock.patch.object(Config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        generate_database(self.db_path, products=5, history=0, audit=0, users=2)
+        self.coordinator = WriteCoordinator(self.db_path, max_batch=10, max_delay_ms=300)
+        self.addCleanup(self.coordinator.stop)
+        self.stock = self._query("SELECT id, stock FROM products")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _query(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return dict(conn.execute(sql, params).fetchall())
+        finally:
+            conn.close()
+
+    def _history_count(self):
+        return self._query("SELECT 0, COUNT(*) FROM inventory_history")[0]
+
+    def test_failed_operation_rolls_back_only_its_savepoint(self):
+        futures = [
+            self.coordinator.update_stock(1, 1, 5, 'in'),
+            # 出库数量超过库存：该操作回滚到自己的保存点并返回False
+            self.coordinator.update_stock(1, 2, self.stock[2] + 1, 'out'),
+            # 参数错误：方法抛出异常，异常传给对应的Future
+            self.coordinator.update_stock(1, 3),
+            self.coordinator.update_stock_batch(1, {4: 2, 5: 3}, 'in'),
+        ]
+        self.assertTrue(futures[0].result(timeout=10))
+        self.assertFalse(futures[1].result(timeout=10))
+        self.assertIsInstance(futures[2].exception(timeout=10), TypeError)
+        self.assertTrue(futures[3].result(timeout=10))
+
+        stock = self._query("SELECT id, stock FROM products")
+        self.assertEqual(stock[1], self.stock[1] + 5)
+        self.assertEqual(stock[2], self.stock[2])
+        self.assertEqual(stock[3], self.stock[3])
+        self.assertEqual(stock[4], self.stock[4] + 2)
+        self.assertEqual(stock[5], self.stock[5] + 3)
+        self.assertEqual(self._history_count(), 3)
+
+        stats = self.coordinator.stats()
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['operations'], 4)
+        self.assertEqual(stats['failed_operations'], 1)
+        self.assertEqual(stats['failed_batches'], 0)
+
+    def test_busy_commit_is_retried_without_losing_the_batch(self):
+        retry_stats.reset()
+        reader = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(reader.close)
+        # 读事务持有共享锁，写入线程提交时遇到锁等待超时
+        reader.execute("BEGIN")
+        reader.execute("SELECT COUNT(*) FROM products").fetchone()
+        release = threading.Timer(0.8, reader.execute, ("COMMIT",))
+        self.addCleanup(release.cancel)
+
+        futures = [self.coordinator.update_stock(1, product_id, 1, 'in') for product_id in (1, 2, 3)]
+        release.start()
+        self.assertEqual([future.result(timeout=10) for future in futures], [True, True, True])
+
+        stock = self._query("SELECT id, stock FROM products")
+        for product_id in (1, 2, 3):
+            self.assertEqual(stock[product_id], self.stock[product_id] + 1)
+        self.assertEqual(self._history_count(), 3)
+        self.assertGreaterEqual(retry_stats.snapshot()['write_coordinator']['recovered'], 1)
+        self.assertEqual(self.coordinator.stats()['failed_batches'], 0)
+
+    def test_replayed_idempotency_key_is_applied_once(self):
+        first = self.coordinator.update_stock(1, 1, 4, 'in', idempotency_key="scan-1")
+        second = self.coordinator.update_stock(1, 1, 4, 'in', idempotency_key="scan-1")
+        self.assertTrue(first.result(timeout=10))
+        self.assertTrue(second.result(timeout=10))
+        self.assertEqual(self._query("SELECT id, stock FROM products")[1], self.stock[1] + 4)
+        self.assertEqual(self._history_count(), 1)
+
+    def test_stop_finishes_queued_operations(self):
+        futures = [self.coordinator.update_stock(1, 1, 1, 'in') for _ in range(3)]
+        self.coordinator.stop()
+        self.assertTrue(all(future.done() and future.result() for future in futures))
+        with self.assertRaises(RuntimeError):
+            self.coordinator.update_stock(1, 1, 1, 'in')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import time
+from datetime import datetime, date, timedelta
+
+
+def now_epoch():
+    """当前时间的Unix时间戳（秒）"""
+    return int(time.time())
+
+
+def to_epoch(value, end_of_day=False):
+    """
+    将时间转换为Unix时间戳（秒），用于按整数时间列进行范围查询
+    :param value: datetime / date / 'YYYY-MM-DD[ HH:MM:SS]' 字符串 / 时间戳数字；
+                  不带时区的时间按本地时间处理，与界面显示一致
+    :param end_of_day: 只有日期时是否取当天最后一秒（作为区间结束时间时包含当天）
+    :return: 整数时间戳，value为空时返回None
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        value = date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+
+    if end_of_day:
+        return int(datetime.combine(value + timedelta(days=1), datetime.min.time()).timestamp()) - 1
+    return int(datetime.combine(value, datetime.min.time()).timestamp())
+
+
+def from_epoch(epoch):
+    """将Unix时间戳转换为本地时间的 datetime"""
+    return datetime.fromtimestamp(epoch) if epoch is not None else None
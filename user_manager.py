@@ -6,6 +6,7 @@ from datetime import datetime
 
 # 导入动态路径获取函数
 from database import get_db_path
+from sql_trace import connect
 
 class UserManager:
     def __init__(self):
@@ -18,7 +19,7 @@ class UserManager:
         if not os.path.exists(self.db_path):
             self.logger.error(f"数据库文件不存在: {self.db_path}")
         
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = connect(self.db_path)
         self.cursor = self.conn.cursor()
         
         # 启用外键约束
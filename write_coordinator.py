@@ -0,0 +1,237 @@
+import os
+import time
+import queue
+import atexit
+import inspect
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from config import Config
+from sql_trace import connect
+from metrics import WRITE_BATCH_SIZE
+from db_retry import run_with_retry, commit_with_retry
+
+# 可提交的写操作：目标 -> 方法名
+WRITE_METHODS = {
+    'inventory': ('add_product', 'update_product', 'delete_product', 'update_stock', 'update_stock_batch'),
+    'audit': ('log_action',),
+}
+
+_coordinators = {}
+_coordinators_lock = threading.Lock()
+
+
+class _GroupConnection:
+    def __init__(self, conn):
+        """
+        写入线程使用的连接包装：批量提交期间，管理类自身的 commit 不生效、rollback 只回滚当前操作
+        :param conn: 数据库连接
+        """
+        self._conn = conn
+        self.in_group = False
+
+    def commit(self):
+        if not self.in_group:
+            self._conn.commit()
+
+    def rollback(self):
+        if self.in_group:
+            self._conn.execute("ROLLBACK TO write_op")
+        else:
+            self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _WriteOp:
+    __slots__ = ('target', 'method', 'args', 'kwargs', 'future')
+
+    def __init__(self, target, method, args, kwargs):
+        self.target = target
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class WriteCoordinator:
+    def __init__(self, db_path='inventory.db', max_batch=None, max_delay_ms=None):
+        """
+        写入协调器：同一进程内的写操作由一个写入线程串行执行，排队中的操作合并为一个事务提交
+        每个操作在独立的保存点中执行，失败只回滚该操作，不影响同批的其他操作
+        :param db_path: 数据库文件路径
+        :param max_batch: 每个事务最多合并的操作数，默认 Config.WRITE_BATCH_MAX
+        :param max_delay_ms: 收到第一个操作后等待后续操作的最长时间（毫秒），默认 Config.WRITE_BATCH_DELAY_MS
+        """
+        self.db_path = db_path
+        self.max_batch = max_batch or Config.WRITE_BATCH_MAX
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else Config.WRITE_BATCH_DELAY_MS) / 1000
+        self.logger = logging.getLogger('write_coordinator')
+        self._queue = queue.Queue()
+        self._stopping = False
+        self._stats_lock = threading.Lock()
+        self._stats = {'operations': 0, 'failed_operations': 0, 'batches': 0,
+                       'failed_batches': 0, 'max_batch': 0}
+        self._thread = threading.Thread(target=self._run, name="write-coordinator", daemon=True)
+        self._thread.start()
+
+    def submit(self, target, method, *args, **kwargs):
+        """
+        提交写操作
+        :param target: 'inventory'（InventoryManager）或 'audit'（AuditLogger）
+        :param method: 方法名（见 WRITE_METHODS）
+        :return: Future，事务提交后得到方法的返回值
+        """
+        if method not in WRITE_METHODS.get(target, ()):
+            raise ValueError(f"不支持的写操作: {target}.{method}")
+        if self._stopping:
+            raise RuntimeError("写入协调器已停止")
+        op = _WriteOp(target, method, args, kwargs)
+        self._queue.put(op)
+        return op.future
+
+    def add_product(self, *args, **kwargs):
+        return self.submit('inventory', 'add_product', *args, **kwargs)
+
+    def update_product(self, *args, **kwargs):
+        return self.submit('inventory', 'update_product', *args, **kwargs)
+
+    def delete_product(self, *args, **kwargs):
+        return self.submit('inventory', 'delete_product', *args, **kwargs)
+
+    def update_stock(self, *args, **kwargs):
+        return self.submit('inventory', 'update_stock', *args, **kwargs)
+
+    def update_stock_batch(self, *args, **kwargs):
+        return self.submit('inventory', 'update_stock_batch', *args, **kwargs)
+
+    def log_action(self, *args, **kwargs):
+        return self.submit('audit', 'log_action', *args, **kwargs)
+
+    def _next_batch(self):
+        """取出下一批操作：阻塞等待第一个，再在 max_delay 内收集后续操作"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                op = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if op is None:
+                # 停止标记：处理完当前批次后退出
+                self._queue.put(None)
+                break
+            batch.append(op)
+        return batch
+
+    def _run(self):
+        from inventory_manager import InventoryManager
+
+        conn = _GroupConnection(connect(self.db_path))
+        manager = InventoryManager(self.db_path, conn=conn)
+        targets = {'inventory': manager, 'audit': manager.audit_logger}
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._execute_batch(conn, targets, batch)
+        finally:
+            manager.close()
+
+    def _execute_batch(self, conn, targets, batch):
+        ops = [op for op in batch if op.future.set_running_or_notify_cancel()]
+        if not ops:
+            return
+        try:
+            run_with_retry(lambda: conn.execute("BEGIN IMMEDIATE"), conn, 'write_coordinator')
+        except sqlite3.Error as e:
+            self.logger.error(f"写入事务开始失败: {e}")
+            self._finish(ops, error=e)
+            return
+
+        outcomes = []
+        conn.in_group = True
+        try:
+            for op in ops:
+                # 调用未加指标统计的原方法，调用方已统计包括排队在内的耗时
+                method = inspect.unwrap(getattr(type(targets[op.target]), op.method))
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    outcomes.append((op, method(targets[op.target], *op.args, **op.kwargs), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    outcomes.append((op, None, e))
+                conn.execute("RELEASE write_op")
+            conn.in_group = False
+            # 提交时遇到锁等待超时只重试提交，不回滚整批操作
+            commit_with_retry(conn, 'write_coordinator')
+        except sqlite3.Error as e:
+            conn.in_group = False
+            self.logger.error(f"批量写入提交失败，共 {len(ops)} 个操作: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            self._finish(ops, error=e)
+            return
+
+        with self._stats_lock:
+            self._stats['operations'] += len(ops)
+            self._stats['failed_operations'] += sum(1 for _, _, error in outcomes if error)
+            self._stats['batches'] += 1
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(ops))
+        WRITE_BATCH_SIZE.observe(len(ops))
+        for op, value, error in outcomes:
+            if error is not None:
+                op.future.set_exception(error)
+            else:
+                op.future.set_result(value)
+
+    def _finish(self, ops, error):
+        with self._stats_lock:
+            self._stats['failed_batches'] += 1
+            self._stats['failed_operations'] += len(ops)
+        for op in ops:
+            op.future.set_exception(error)
+
+    def stats(self):
+        """
+        获取运行统计
+        :return: 操作数、批次数、失败数、最大/平均批次大小和排队中的操作数
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['avg_batch'] = round(stats['operations'] / stats['batches'], 2) if stats['batches'] else 0.0
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def stop(self, timeout=10):
+        """处理完已提交的操作后停止写入线程"""
+        if self._stopping:
+            return
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+def get_coordinator(db_path):
+    """
+    获取数据库对应的写入协调器（每个进程每个数据库一个，首次使用时启动）
+    :param db_path: 数据库文件路径
+    """
+    key = os.path.abspath(db_path)
+    with _coordinators_lock:
+        coordinator = _coordinators.get(key)
+        if coordinator is None:
+            coordinator = _coordinators[key] = WriteCoordinator(db_path)
+        return coordinator
+
+
+@atexit.register
+def _stop_all():
+    for coordinator in list(_coordinators.values()):
+        coordinator.stop()